@@ -0,0 +1,206 @@
+# backend/admission.py
+import math
+import os
+import time
+from collections import OrderedDict, defaultdict
+from anyio.to_thread import current_default_thread_limiter
+from fastapi import APIRouter
+from jose import JWTError, jwt
+from starlette.responses import JSONResponse
+from backend.auth import SECRET_KEY, ALGORITHM
+
+router = APIRouter()
+
+# Route class -> {key type: (tokens per second, burst)}. None means unlimited.
+ROUTE_LIMITS = {
+    "auth": {"ip": (0.5, 10), "user": None},  # every login runs bcrypt
+    "write": {"ip": (20, 60), "user": (10, 30)},
+    "report": {"ip": (10, 40), "user": (5, 20)},
+    "read": {"ip": (50, 200), "user": (25, 100)},
+}
+# RATE_LIMITS=0 turns rate limiting off (load shedding stays on), e.g. for a
+# replay target that sees every captured user arrive from one IP (see replay.py)
+RATE_LIMITS_ENABLED = os.getenv("RATE_LIMITS", "1") != "0"
+# Shed with 503 once this many requests are in flight or queued for the threadpool
+MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "200"))
+MAX_QUEUE_DEPTH = int(os.getenv("ADMISSION_MAX_QUEUE_DEPTH", "100"))
+SHED_RETRY_AFTER = 1  # seconds
+MAX_BUCKETS = 100_000
+# Peers whose X-Forwarded-For is believed: the Streamlit server, which forwards
+# each browser's address (frontend/app_frontend.py). Their own address stands
+# for every user behind them, so requests from them without the header only
+# get user limits.
+TRUSTED_PROXIES = {h.strip() for h in os.getenv("TRUSTED_PROXIES", "127.0.0.1,::1").split(",") if h.strip()}
+EXEMPT_PATHS = ("/", "/metrics/admission")
+
+
+# -----------------------
+# Token buckets
+# -----------------------
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Consume one token; returns 0 on success, else seconds until one is available."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+def classify(method: str, path: str) -> str:
+    if path.startswith("/auth/"):
+        return "auth"
+    if method in ("POST", "PUT", "PATCH", "DELETE"):
+        return "write"
+    if path.startswith("/reports/"):
+        return "report"
+    return "read"
+
+
+def client_ip(scope):
+    """The caller's address: the peer, or for a trusted proxy the nearest untrusted X-Forwarded-For hop."""
+    if not scope.get("client"):
+        return None
+    peer = scope["client"][0]
+    if peer not in TRUSTED_PROXIES:
+        return peer
+    forwarded = dict(scope["headers"]).get(b"x-forwarded-for", b"").decode("latin-1")
+    for hop in reversed([h.strip() for h in forwarded.split(",") if h.strip()]):
+        if hop not in TRUSTED_PROXIES:
+            return hop
+    return None
+
+
+def token_subject(headers):
+    """Identify the caller from a valid bearer token; unauthenticated callers only get IP limits."""
+    auth = headers.get(b"authorization", b"").decode("latin-1")
+    if not auth.lower().startswith("bearer "):
+        return None
+    try:
+        return jwt.decode(auth[7:], SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
+
+# -----------------------
+# Middleware
+# -----------------------
+class AdmissionMiddleware:
+    """Per-user rate limiting by route class (per-IP for anonymous callers), plus load shedding under overload.
+
+    Runs on the event loop, so its state needs no locking. Limits are per process.
+    """
+
+    def __init__(self, app, limits=None, max_in_flight=MAX_IN_FLIGHT, max_queue_depth=MAX_QUEUE_DEPTH):
+        self.app = app
+        if limits is None:
+            limits = ROUTE_LIMITS if RATE_LIMITS_ENABLED else {}
+        self.limits = limits
+        self.max_in_flight = max_in_flight
+        self.max_queue_depth = max_queue_depth
+        self.in_flight = 0
+        self.buckets = OrderedDict()
+        stats.middleware = self
+
+    def _bucket(self, key, rate, burst, now):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(rate, burst, now)
+            if len(self.buckets) > MAX_BUCKETS:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        return bucket
+
+    def _rate_limited(self, route_class, scope, now):
+        limits = self.limits.get(route_class, {})
+        # an authenticated caller is limited as a user; the IP is the fallback
+        # (and the only key for route classes without user limits, e.g. logins)
+        user = token_subject(dict(scope["headers"])) if limits.get("user") else None
+        if user:
+            kind, ident = "user", user
+        else:
+            kind, ident = "ip", client_ip(scope)
+        if not limits.get(kind) or ident is None:
+            return None
+        rate, burst = limits[kind]
+        wait = self._bucket((route_class, kind, ident), rate, burst, now).take(now)
+        return (kind, wait) if wait else None
+
+    def _overloaded(self):
+        if self.in_flight >= self.max_in_flight:
+            return "in_flight"
+        if current_default_thread_limiter().statistics().tasks_waiting >= self.max_queue_depth:
+            return "queue_depth"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or scope["path"] in EXEMPT_PATHS:
+            return await self.app(scope, receive, send)
+
+        route_class = classify(scope["method"], scope["path"])
+        reason = self._overloaded()
+        if reason:
+            stats.record(route_class, "shed", reason)
+            response = JSONResponse(
+                {"detail": "Server is busy, please retry shortly"},
+                status_code=503,
+                headers={"Retry-After": str(SHED_RETRY_AFTER)},
+            )
+            return await response(scope, receive, send)
+
+        limited = self._rate_limited(route_class, scope, time.monotonic())
+        if limited:
+            kind, wait = limited
+            stats.record(route_class, "rate_limited", kind)
+            response = JSONResponse(
+                {"detail": "Too many requests"},
+                status_code=429,
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
+            )
+            return await response(scope, receive, send)
+
+        stats.record(route_class, "admitted")
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+
+
+# -----------------------
+# Counters
+# -----------------------
+class AdmissionStats:
+    def __init__(self):
+        self.counters = defaultdict(int)
+        self.middleware = None
+
+    def record(self, route_class, outcome, reason=None):
+        self.counters[(route_class, outcome, reason)] += 1
+
+    def snapshot(self):
+        out = {"in_flight": 0, "threadpool_queue_depth": 0, "counters": []}
+        if self.middleware is not None:
+            out["in_flight"] = self.middleware.in_flight
+            out["threadpool_queue_depth"] = current_default_thread_limiter().statistics().tasks_waiting
+        for (route_class, outcome, reason), count in sorted(self.counters.items(), key=str):
+            out["counters"].append({"route_class": route_class, "outcome": outcome, "reason": reason, "count": count})
+        return out
+
+
+stats = AdmissionStats()
+
+
+@router.get("/metrics/admission")
+async def get_admission_metrics():
+    return stats.snapshot()
@@ -0,0 +1,146 @@
+# backend/analytics.py
+from datetime import date, timedelta
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from backend import crud
+from backend.database import get_db
+from backend.report_cache import report_cache
+
+router = APIRouter()
+
+DEFAULT_WINDOWS = "7,30,90"
+MAX_WINDOW_DAYS = 366
+
+
+# -----------------------
+# Helpers
+# -----------------------
+def _parse_windows(windows: str):
+    try:
+        sizes = sorted({int(w) for w in windows.split(",") if w.strip()})
+    except ValueError:
+        raise HTTPException(status_code=400, detail="windows must be a comma-separated list of day counts")
+    if not sizes or sizes[0] < 1 or sizes[-1] > MAX_WINDOW_DAYS:
+        raise HTTPException(status_code=400, detail=f"window sizes must be between 1 and {MAX_WINDOW_DAYS} days")
+    return sizes
+
+
+def _change(current: float, previous: Optional[float]):
+    if previous is None:
+        return None, None
+    delta = current - previous
+    pct = round(delta / previous * 100, 2) if previous else None
+    return round(delta, 2), pct
+
+
+# -----------------------
+# Rolling windows
+# -----------------------
+@router.get("/rolling/{user_id}")
+def get_rolling_spending(
+    user_id: int,
+    windows: str = DEFAULT_WINDOWS,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_db),
+    cached=Depends(report_cache),
+):
+    sizes = _parse_windows(windows)
+    return cached(lambda: rolling_spending(db, user_id, sizes, start, end), tabular=True)
+
+
+def rolling_spending(db: Session, user_id: int, sizes, start: Optional[date], end: Optional[date]):
+    """Daily totals with moving sums/averages for every window, in one windowed query."""
+    # pull in enough history for the widest window to be complete on `start`
+    rows = crud.rolling_spending(
+        db, user_id, sizes,
+        start=start - timedelta(days=sizes[-1] - 1) if start else None,
+        end=end + timedelta(days=1) if end else None,
+    )
+
+    out = []
+    for r in rows:
+        # DATE() comes back as a date on MySQL, as an ISO string on SQLite
+        day = r.day if isinstance(r.day, date) else date.fromisoformat(r.day)
+        if start and day < start:
+            continue
+        item = {"date": day.isoformat(), "total": float(r.total or 0)}
+        for w in sizes:
+            window_sum = float(getattr(r, f"sum_{w}d") or 0)
+            item[f"sum_{w}d"] = window_sum
+            item[f"avg_{w}d"] = round(window_sum / w, 2)
+        out.append(item)
+    return out
+
+
+# -----------------------
+# Month-over-month / Year-over-year
+# -----------------------
+@router.get("/period-over-period/{user_id}")
+def get_period_over_period(user_id: int, db: Session = Depends(get_db), cached=Depends(report_cache)):
+    return cached(lambda: period_over_period(db, user_id), tabular=True)
+
+
+def period_over_period(db: Session, user_id: int):
+    """Monthly totals with MoM and YoY deltas, using calendar-exact RANGE windows."""
+    rows = crud.period_over_period(db, user_id)
+
+    out = []
+    for r in rows:
+        idx = int(r.month_idx)
+        total = float(r.total or 0)
+        prev_m = float(r.prev_month) if r.prev_month is not None else None
+        prev_y = float(r.prev_year) if r.prev_year is not None else None
+        mom, mom_pct = _change(total, prev_m)
+        yoy, yoy_pct = _change(total, prev_y)
+        out.append({
+            "month": f"{idx // 12}-{idx % 12 + 1:02d}",
+            "total": total,
+            "prev_month_total": prev_m,
+            "mom_change": mom,
+            "mom_pct": mom_pct,
+            "prev_year_total": prev_y,
+            "yoy_change": yoy,
+            "yoy_pct": yoy_pct,
+        })
+    return out
+
+
+# -----------------------
+# Cumulative spend per budget period
+# -----------------------
+@router.get("/budget-progress/{user_id}")
+def get_budget_progress(user_id: int, db: Session = Depends(get_db), cached=Depends(report_cache)):
+    return cached(lambda: budget_progress(db, user_id))
+
+
+def budget_progress(db: Session, user_id: int):
+    """Running spend inside each budget's period, one joined + windowed query for all budgets.
+
+    Archived days contribute one point per day (their rollup) instead of one per expense.
+    """
+    rows = crud.budget_progress(db, user_id)
+
+    budgets = {}
+    for r in rows:
+        item = budgets.get(r.budget_ID)
+        if item is None:
+            item = budgets[r.budget_ID] = {
+                "budget_ID": r.budget_ID,
+                "category_ID": r.category_ID,
+                "amount_limit": float(r.amount_limit or 0),
+                "start_date": r.start_date,
+                "end_date": r.end_date,
+                "spent": 0.0,
+                "series": [],
+            }
+        if r.amount is not None:
+            item["spent"] = float(r.cumulative)
+            item["series"].append({"date": r.date, "amount": float(r.amount), "cumulative": float(r.cumulative)})
+
+    for item in budgets.values():
+        limit = item["amount_limit"]
+        item["remaining"] = round(limit - item["spent"], 2)
+        item["pct_used"] = round(item["spent"] / limit * 100, 2) if limit else None
+    return list(budgets.values())
@@ -0,0 +1,250 @@
+# backend/anomalies.py
+"""Nightly spending anomaly detection.
+
+For every user and category the job compares one month's spend against the
+HISTORY_MONTHS before it. The baseline is the larger of the history median and
+the same month last year, so spending that recurs every year (insurance,
+December) isn't flagged. The score is a robust z-score:
+(spend - baseline) / (1.4826 * MAD), with the scale floored so flat histories
+don't turn every rupee into an outlier.
+
+Monthly totals (hot expenses + archived rollups) are loaded for CHUNK_USERS
+users per query and scored as one NumPy matrix per chunk; there is no
+per-user Python loop. Flagged rows replace the month's previous flags and are
+served at /reports/anomalies/{user_id}. The current month is scored
+month-to-date, so a spike shows up the night after it happens. Run from cron:
+
+    python -m backend.anomalies [YYYY-MM]
+
+bench_anomalies.py measures the job's throughput in users/second.
+"""
+import os
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import Integer, delete, extract, func, insert, literal, select, union_all
+from sqlalchemy.orm import Session
+from backend import crud, models
+from backend.database import get_db, shard_router, user_data_engines
+from backend.report_cache import report_cache
+from backend.versioning import versioned_transaction
+
+router = APIRouter()
+
+HISTORY_MONTHS = 12  # must be >= 12 for the seasonal baseline
+CHUNK_USERS = int(os.getenv("ANOMALY_CHUNK_USERS", "5000"))
+Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "3.5"))
+MIN_RATIO = 2.0  # spend must also be at least 2x the baseline
+MIN_AMOUNT = float(os.getenv("ANOMALY_MIN_AMOUNT", "500"))
+MIN_ACTIVE_MONTHS = 3  # history months with any spend in the category
+MIN_SCALE = 50.0  # floor on the z-score denominator, in currency units
+MIN_SCALE_RATIO = 0.1  # ... and as a fraction of the baseline
+MAD_TO_SIGMA = 1.4826
+
+expenses = models.Expense.__table__
+rollups = models.ExpenseRollup.__table__
+anomalies = models.SpendingAnomaly.__table__
+
+
+# -----------------------
+# Months
+# -----------------------
+def month_number(month: str) -> int:
+    """'YYYY-MM' -> months since year 0, so consecutive months differ by 1."""
+    try:
+        year, mon = (int(part) for part in month.split("-"))
+    except ValueError:
+        raise ValueError(f"month must be YYYY-MM, got {month!r}")
+    if not 1 <= mon <= 12:
+        raise ValueError(f"month must be YYYY-MM, got {month!r}")
+    return year * 12 + mon - 1
+
+
+def month_start(number: int) -> datetime:
+    return datetime(number // 12, number % 12 + 1, 1)
+
+
+def month_label(number: int) -> str:
+    return f"{number // 12:04d}-{number % 12 + 1:02d}"
+
+
+# -----------------------
+# Loading
+# -----------------------
+def _user_ids(conn, start, end):
+    """Users with any spending in [start, end), ascending."""
+    hot = select(expenses.c.user_ID).where(expenses.c.date >= start, expenses.c.date < end)
+    cold = select(rollups.c.user_ID).where(rollups.c.day >= start, rollups.c.day < end)
+    return sorted(set(conn.execute(hot.distinct()).scalars()) | set(conn.execute(cold.distinct()).scalars()))
+
+
+def _monthly_totals(conn, first_user, last_user, start, end):
+    """Per (user, category, month) spend of a range of users, as parallel arrays.
+
+    The all-users counterpart of archive.spending_source: hot rows and rollups,
+    grouped in the database so only one row per series-month is transferred.
+    """
+    hot = select(
+        expenses.c.user_ID, expenses.c.category_ID, expenses.c.date, expenses.c.amount,
+    ).where(expenses.c.user_ID.between(first_user, last_user), expenses.c.date >= start, expenses.c.date < end)
+    cold = select(
+        rollups.c.user_ID, rollups.c.category_ID, rollups.c.day.label("date"), rollups.c.total.label("amount"),
+    ).where(rollups.c.user_ID.between(first_user, last_user), rollups.c.day >= start, rollups.c.day < end)
+    spending = union_all(hot, cold).subquery("spending")
+    # EXTRACT compiles on MySQL and SQLite
+    month = (extract("year", spending.c.date) * 12 + extract("month", spending.c.date) - literal(1, Integer)).label("month_no")
+    rows = conn.execute(
+        select(spending.c.user_ID, spending.c.category_ID, month, func.sum(spending.c.amount))
+        .group_by(spending.c.user_ID, spending.c.category_ID, month)
+    ).all()
+    if not rows:
+        return None
+    users, categories, months, totals = zip(*rows)
+    return (
+        np.array(users, dtype=np.int64),
+        np.array(categories, dtype=np.int64),
+        np.array(months, dtype=np.int64),
+        np.array([float(t or 0) for t in totals]),
+    )
+
+
+def build_matrix(users, categories, months, totals, first_month):
+    """Dense (series x HISTORY_MONTHS + 1) spend matrix; one series per (user, category).
+
+    Months without spending are zeros. Returns (series keys as an (n, 2) array, matrix).
+    """
+    keys, series = np.unique(np.stack([users, categories], axis=1), axis=0, return_inverse=True)
+    matrix = np.zeros((len(keys), HISTORY_MONTHS + 1))
+    np.add.at(matrix, (series.ravel(), months - first_month), totals)
+    return keys, matrix
+
+
+# -----------------------
+# Scoring
+# -----------------------
+def score_matrix(matrix):
+    """Score the last column of every row against the columns before it.
+
+    Returns (baseline, z-score, flagged mask), one entry per row.
+    """
+    history, current = matrix[:, :-1], matrix[:, -1]
+    median = np.median(history, axis=1)
+    mad = np.median(np.abs(history - median[:, None]), axis=1)
+    seasonal = history[:, -12]  # same month last year
+    baseline = np.maximum(median, seasonal)
+    scale = np.maximum(np.maximum(MAD_TO_SIGMA * mad, MIN_SCALE_RATIO * baseline), MIN_SCALE)
+    z = (current - baseline) / scale
+    active = np.count_nonzero(history, axis=1)
+    flagged = (
+        (z >= Z_THRESHOLD)
+        & (current >= MIN_RATIO * baseline)
+        & (current >= MIN_AMOUNT)
+        & (active >= MIN_ACTIVE_MONTHS)
+    )
+    return baseline, z, flagged
+
+
+# -----------------------
+# Job
+# -----------------------
+def _store(bind, month: str, first_user, last_user, rows):
+    """Replace the month's flags for a range of users; bumps the versions of users whose flags changed."""
+    with versioned_transaction(bind) as (conn, touched):
+        in_range = (anomalies.c.user_ID.between(first_user, last_user), anomalies.c.month == month)
+        touched.update(conn.execute(select(anomalies.c.user_ID).where(*in_range).distinct()).scalars())
+        conn.execute(delete(anomalies).where(*in_range))
+        if rows:
+            conn.execute(insert(anomalies), rows)
+            touched.update(r["user_ID"] for r in rows)
+
+
+def detect_anomalies(bind, month: str, chunk_users: int = CHUNK_USERS):
+    """Score `month` for every user on `bind`; returns (users scored, anomalies flagged)."""
+    target = month_number(month)
+    first_month = target - HISTORY_MONTHS
+    start, end = month_start(first_month), month_start(target + 1)
+    with bind.connect() as conn:
+        user_ids = _user_ids(conn, start, end)
+
+    now = datetime.utcnow()
+    flagged_total = 0
+    for i in range(0, len(user_ids), chunk_users):
+        first_user, last_user = user_ids[i], user_ids[min(i + chunk_users, len(user_ids)) - 1]
+        with bind.connect() as conn:
+            loaded = _monthly_totals(conn, first_user, last_user, start, end)
+        rows = []
+        if loaded is not None:
+            keys, matrix = build_matrix(*loaded, first_month)
+            baseline, z, flagged = score_matrix(matrix)
+            for k in np.flatnonzero(flagged):
+                user_id, category_id = int(keys[k, 0]), int(keys[k, 1])
+                if shard_router is not None and shard_router.lookup(user_id)[1] == "moving":
+                    continue  # picked up on the next run
+                rows.append({
+                    "user_ID": user_id,
+                    "category_ID": category_id,
+                    "month": month,
+                    "amount": Decimal(f"{matrix[k, -1]:.2f}"),
+                    "baseline": Decimal(f"{baseline[k]:.2f}"),
+                    "score": round(float(z[k]), 2),
+                    "detected_at": now,
+                })
+        _store(bind, month, first_user, last_user, rows)
+        flagged_total += len(rows)
+    return len(user_ids), flagged_total
+
+
+# -----------------------
+# Endpoint
+# -----------------------
+@router.get("/anomalies/{user_id}")
+def get_anomalies(user_id: int, month: str = None, db: Session = Depends(get_db), cached=Depends(report_cache)):
+    if month:
+        try:
+            month_number(month)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+    return cached(lambda: list_anomalies(db, user_id, month), tabular=True)
+
+
+def list_anomalies(db: Session, user_id: int, month: str = None):
+    """Flagged category spends, newest month first, most unusual first."""
+    return [
+        {
+            "month": r.month,
+            "category_ID": r.category_ID,
+            "category_name": r.category_name,
+            "amount": float(r.amount),
+            "baseline": float(r.baseline),
+            "ratio": round(float(r.amount / r.baseline), 2) if r.baseline else None,
+            "score": r.score,
+            "detected_at": r.detected_at,
+        }
+        for r in crud.list_anomalies(db, user_id, month or None)
+    ]
+
+
+# -----------------------
+# CLI
+# -----------------------
+def main(argv):
+    from backend.database import engine
+
+    month = argv[0] if argv else f"{datetime.utcnow():%Y-%m}"
+    models.Base.metadata.create_all(bind=engine)
+    if shard_router:
+        shard_router.setup(models.Base.metadata)
+    for bind in user_data_engines():
+        start = time.perf_counter()
+        users, flagged = detect_anomalies(bind, month)
+        elapsed = time.perf_counter() - start
+        rate = users / elapsed if elapsed else 0
+        print(f"✅ {bind.url.database}: scored {users} users for {month} in {elapsed:.1f}s ({rate:,.0f} users/s), flagged {flagged}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,215 +1,317 @@
-from fastapi import FastAPI, Depends, HTTPException, status
-from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from backend import models, schemas
-from backend.database import engine, get_db
-from backend.auth import router as auth_router
-
-# create tables (if not already)
-models.Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="Expense Tracker API", version="3.1")
-
-# CORS - allow your Streamlit frontend
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
-        "http://localhost:8501",
-        "http://127.0.0.1:8501",
-    ],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# include authentication router
-app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
-
-# -----------------------
-# Categories & Payments
-# -----------------------
-@app.get("/categories", tags=["Categories"])
-def get_categories(db: Session = Depends(get_db)):
-    return db.query(models.Category).all()
-
-@app.get("/payment-methods", tags=["Payments"])
-def get_payment_methods(db: Session = Depends(get_db)):
-    return db.query(models.PaymentMethod).all()
-
-# -----------------------
-# Budgets (user-specific)
-# -----------------------
-@app.get("/budgets/{user_id}", tags=["Budgets"])
-def get_user_budgets(user_id: int, db: Session = Depends(get_db)):
-    return db.query(models.Budget).filter(models.Budget.user_ID == user_id).all()
-
-@app.post("/budgets/add", status_code=status.HTTP_201_CREATED, tags=["Budgets"])
-def add_budget(budget: schemas.BudgetCreate, db: Session = Depends(get_db)):
-    new_budget = models.Budget(**budget.dict())
-    db.add(new_budget)
-    db.commit()
-    db.refresh(new_budget)
-    return {"message": "Budget created successfully", "budget": new_budget}
-
-@app.put("/budgets/{budget_id}", tags=["Budgets"])
-def update_budget(budget_id: int, update: schemas.BudgetUpdate, db: Session = Depends(get_db)):
-    budget = db.query(models.Budget).filter(models.Budget.budget_ID == budget_id).first()
-    if not budget:
-        raise HTTPException(status_code=404, detail="Budget not found")
-    for k, v in update.dict(exclude_unset=True).items():
-        setattr(budget, k, v)
-    db.commit()
-    db.refresh(budget)
-    return {"message": "Budget updated", "budget": budget}
-
-@app.delete("/budgets/{budget_id}", tags=["Budgets"])
-def delete_budget(budget_id: int, db: Session = Depends(get_db)):
-    budget = db.query(models.Budget).filter(models.Budget.budget_ID == budget_id).first()
-    if not budget:
-        raise HTTPException(status_code=404, detail="Budget not found")
-    db.delete(budget)
-    db.commit()
-    return {"message": "Budget deleted successfully"}
-
-# -----------------------
-# Expenses (user-specific)
-# -----------------------
-@app.get("/expenses/{user_id}", tags=["Expenses"])
-def get_user_expenses(user_id: int, db: Session = Depends(get_db)):
-    return db.query(models.Expense).filter(models.Expense.user_ID == user_id).all()
-
-@app.post("/expenses/add", status_code=status.HTTP_201_CREATED, tags=["Expenses"])
-def add_expense(expense: schemas.ExpenseCreate, db: Session = Depends(get_db)):
-    new_expense = models.Expense(**expense.dict())
-    db.add(new_expense)
-    db.commit()
-    db.refresh(new_expense)
-    return {"message": "Expense added successfully", "expense": new_expense}
-
-@app.put("/expenses/{expense_id}", tags=["Expenses"])
-def update_expense(expense_id: int, update: schemas.ExpenseUpdate, db: Session = Depends(get_db)):
-    exp = db.query(models.Expense).filter(models.Expense.expense_ID == expense_id).first()
-    if not exp:
-        raise HTTPException(status_code=404, detail="Expense not found")
-    for k, v in update.dict(exclude_unset=True).items():
-        setattr(exp, k, v)
-    db.commit()
-    db.refresh(exp)
-    return {"message": "Expense updated", "expense": exp}
-
-@app.delete("/expenses/{expense_id}", tags=["Expenses"])
-def delete_expense(expense_id: int, db: Session = Depends(get_db)):
-    exp = db.query(models.Expense).filter(models.Expense.expense_ID == expense_id).first()
-    if not exp:
-        raise HTTPException(status_code=404, detail="Expense not found")
-    db.delete(exp)
-    db.commit()
-    return {"message": "Expense deleted successfully"}
-
-# -----------------------
-# Reports (user-specific)
-# -----------------------
-@app.get("/reports/spending-by-category/{user_id}", tags=["Reports"])
-def get_spending_by_category(user_id: int, db: Session = Depends(get_db)):
-    results = (
-        db.query(
-            models.Category.category_name,
-            func.sum(models.Expense.amount).label("total_spent")
-        )
-        .join(models.Expense, models.Category.category_ID == models.Expense.category_ID)
-        .filter(models.Expense.user_ID == user_id)
-        .group_by(models.Category.category_name)
-        .all()
-    )
-    return [{"category_name": r[0], "total": float(r[1] or 0)} for r in results]
-
-@app.get("/reports/total-spending/{user_id}", tags=["Reports"])
-def get_total_spending(user_id: int, db: Session = Depends(get_db)):
-    total = db.query(func.sum(models.Expense.amount)).filter(models.Expense.user_ID == user_id).scalar()
-    return {"user_id": user_id, "total_spending": float(total or 0.0)}
-
-from sqlalchemy import func
-
-from sqlalchemy import func, extract
-
-from sqlalchemy import extract, func
-
-from sqlalchemy import func
-
-from sqlalchemy import func, extract
-
-from sqlalchemy import func
-
-from sqlalchemy import func
-
-from sqlalchemy import func, cast, String
-
-from sqlalchemy import func
-
-from sqlalchemy import func
-
-@app.get("/reports/monthly-spending/{user_id}", tags=["Reports"])
-def get_monthly_spending(user_id: int, db: Session = Depends(get_db)):
-    results = (
-        db.query(
-            func.year(models.Expense.date).label("year"),
-            func.month(models.Expense.date).label("month_num"),
-            func.min(
-                func.concat(
-                    func.year(models.Expense.date), "-",
-                    func.lpad(func.month(models.Expense.date), 2, "0")
-                )
-            ).label("month"),  # ✅ fixed for only_full_group_by
-            func.sum(models.Expense.amount).label("total")
-        )
-        .filter(models.Expense.user_ID == user_id)
-        .group_by(func.year(models.Expense.date), func.month(models.Expense.date))
-        .order_by(func.year(models.Expense.date), func.month(models.Expense.date))
-        .all()
-    )
-
-    return [{"month": r.month, "total": float(r.total or 0)} for r in results]
-
-
-
-
-
-# -----------------------
-# Delete user (account removal)
-# -----------------------
-@app.delete("/users/{user_id}", tags=["Users"])
-def delete_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.user_ID == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    db.query(models.Expense).filter(models.Expense.user_ID == user_id).delete()
-    db.query(models.Budget).filter(models.Budget.user_ID == user_id).delete()
-    db.delete(user)
-    db.commit()
-    return {"message": "User and related data deleted successfully"}
-
-# -----------------------
-# Utility: seed default categories/payment methods
-# -----------------------
-@app.post("/seed-data", tags=["Utility"])
-def seed_initial_data(db: Session = Depends(get_db)):
-    default_categories = ["Food", "Transport", "Entertainment", "Bills", "Health", "Shopping", "Education"]
-    for name in default_categories:
-        if not db.query(models.Category).filter(models.Category.category_name == name).first():
-            db.add(models.Category(category_name=name))
-
-    default_methods = ["Cash", "Credit Card", "Debit Card", "UPI", "Net Banking"]
-    for m in default_methods:
-        if not db.query(models.PaymentMethod).filter(models.PaymentMethod.payment_type == m).first():
-            db.add(models.PaymentMethod(payment_type=m))
-
-    db.commit()
-    return {"message": "✅ Default data seeded successfully."}
-
-# -----------------------
-# Root
-# -----------------------
-@app.get("/")
-def root():
-    return {"message": "Expense Tracker API is running 🚀"}
+from fastapi import FastAPI, Depends, HTTPException, Header, Query, Response, status
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import Optional
+from datetime import datetime
+from contextlib import asynccontextmanager
+from backend import models, schemas, writes, archive, crud
+from backend.versioning import bump_data_version, user_etag
+from backend.database import engine, get_db, shard_router, user_connection, user_data_engines
+from backend.auth import router as auth_router
+from backend.analytics import router as analytics_router
+from backend.anomalies import router as anomalies_router
+from backend.search import router as search_router, setup_search_index
+from backend.sync import router as sync_router
+from backend.archive import router as archive_router
+from backend.batch import router as batch_router
+from backend.receipts import router as receipts_router, shutdown_thumbnails
+from backend.recurring import router as recurring_router, start_scheduler
+from backend.admission import AdmissionMiddleware, router as admission_router
+from backend.profiling import ProfilerMiddleware, router as profiling_router
+from backend.report_cache import report_cache, router as report_cache_router
+from backend.columnar import columns_of, tabular
+from backend.traffic import TrafficCaptureMiddleware
+from backend.sharding import ShardMovingError
+
+# create tables (if not already)
+models.Base.metadata.create_all(bind=engine)
+if shard_router:
+    shard_router.setup(models.Base.metadata)
+for user_engine in user_data_engines():
+    setup_search_index(user_engine)
+
+try:
+    from brotli_asgi import BrotliMiddleware  # optional: pip install brotli-asgi
+except ImportError:
+    BrotliMiddleware = None
+
+# responses smaller than this aren't worth compressing
+COMPRESS_MIN_BYTES = 1024
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # materialize recurring expenses in the background (RECURRING_TICK_SECONDS=0 disables)
+    stop = start_scheduler()
+    yield
+    if stop is not None:
+        stop.set()
+    shutdown_thumbnails()
+
+app = FastAPI(title="Expense Tracker API", version="3.1", lifespan=lifespan)
+
+# Compress large list/report responses (brotli when available, else gzip)
+if BrotliMiddleware is not None:
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESS_MIN_BYTES, gzip_fallback=True)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_BYTES)
+
+# CORS - allow your Streamlit frontend
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=[
+        "http://localhost:8501",
+        "http://127.0.0.1:8501",
+    ],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# Opt-in profiling (X-Profile header or PROFILE_SAMPLE_RATE); tags queries with their route
+app.add_middleware(ProfilerMiddleware)
+
+# Opt-in anonymized traffic capture for replay.py (TRAFFIC_CAPTURE_PATH)
+app.add_middleware(TrafficCaptureMiddleware)
+
+# Outermost: rate-limit and shed load before any other work is done
+app.add_middleware(AdmissionMiddleware)
+
+# A user being moved between shards is read-only for a few seconds
+@app.exception_handler(ShardMovingError)
+def shard_moving_handler(request, exc):
+    return JSONResponse({"detail": "Your data is being moved, please retry shortly"}, status_code=503, headers={"Retry-After": "5"})
+
+# include authentication router
+app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
+# user-scoped GETs answer If-None-Match from the user's data version (see versioning.py)
+app.include_router(analytics_router, prefix="/reports", tags=["Reports"], dependencies=[Depends(user_etag)])
+app.include_router(anomalies_router, prefix="/reports", tags=["Reports"], dependencies=[Depends(user_etag)])
+app.include_router(search_router, tags=["Expenses"], dependencies=[Depends(user_etag)])
+app.include_router(sync_router, tags=["Sync"], dependencies=[Depends(user_etag)])
+app.include_router(archive_router, tags=["Expenses"], dependencies=[Depends(user_etag)])
+app.include_router(recurring_router, tags=["Recurring"])
+app.include_router(batch_router, tags=["Batch"])
+app.include_router(receipts_router, tags=["Receipts"])
+app.include_router(admission_router, tags=["Metrics"])
+app.include_router(profiling_router, tags=["Metrics"])
+app.include_router(report_cache_router, tags=["Metrics"])
+
+# -----------------------
+# Categories & Payments
+# -----------------------
+@app.get("/categories", tags=["Categories"])
+def get_categories(db: Session = Depends(get_db)):
+    return crud.list_categories(db)
+
+@app.get("/payment-methods", tags=["Payments"])
+def get_payment_methods(db: Session = Depends(get_db)):
+    return crud.list_payment_methods(db)
+
+# -----------------------
+# Budgets (user-specific)
+# -----------------------
+BUDGET_COLUMNS = columns_of(schemas.BudgetOut)
+
+@app.get("/budgets/{user_id}", tags=["Budgets"], dependencies=[Depends(user_etag)])
+def get_user_budgets(user_id: int, db: Session = Depends(get_db), tabular=Depends(tabular)):
+    return tabular(crud.list_budgets_by_user(db, user_id), BUDGET_COLUMNS)
+
+@app.post("/budgets/add", status_code=status.HTTP_201_CREATED, tags=["Budgets"])
+def add_budget(budget: schemas.BudgetCreate, db: Session = Depends(get_db)):
+    new_budget = crud.create_budget(db, budget, budget.user_ID)
+    return {"message": "Budget created successfully", "budget": new_budget}
+
+@app.put("/budgets/{budget_id}", tags=["Budgets"])
+def update_budget(budget_id: int, update: schemas.BudgetUpdate, db: Session = Depends(get_db)):
+    budget = crud.get_budget(db, budget_id)
+    if not budget:
+        raise HTTPException(status_code=404, detail="Budget not found")
+    crud.update_row(db, budget, update.dict(exclude_unset=True))
+    return {"message": "Budget updated", "budget": budget}
+
+@app.delete("/budgets/{budget_id}", tags=["Budgets"])
+def delete_budget(budget_id: int, db: Session = Depends(get_db)):
+    budget = crud.get_budget(db, budget_id)
+    if not budget:
+        raise HTTPException(status_code=404, detail="Budget not found")
+    crud.delete_budget(db, budget)
+    return {"message": "Budget deleted successfully"}
+
+# -----------------------
+# Expenses (user-specific)
+# -----------------------
+# page cursors are "<date>|<expense_ID>" of the last row served
+def _parse_cursor(cursor: str):
+    try:
+        date, expense_id = cursor.rsplit("|", 1)
+        return datetime.fromisoformat(date), int(expense_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# rows go straight to pydantic's JSON serializer through the response model,
+# or to an Arrow/msgpack encoder when the client asks for one (see columnar.py)
+EXPENSE_COLUMNS = columns_of(schemas.ExpenseRow)
+
+@app.get("/expenses/{user_id}", tags=["Expenses"], dependencies=[Depends(user_etag)], response_model=list[schemas.ExpenseRow])
+def get_user_expenses(
+    user_id: int,
+    response: Response,
+    include_archived: bool = False,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    after: Optional[str] = None,
+    db: Session = Depends(get_db),
+    tabular=Depends(tabular),
+):
+    if limit is not None:
+        # paged, newest first; X-Next-Cursor is absent on the last page
+        if include_archived:
+            raise HTTPException(status_code=400, detail="include_archived can't be paged")
+        page = crud.page_expense_rows(db, user_id, limit, _parse_cursor(after) if after else None)
+        if len(page) == limit:
+            response.headers["X-Next-Cursor"] = f"{page[-1].date.isoformat()}|{page[-1].expense_ID}"
+        return tabular(page, EXPENSE_COLUMNS)
+    expenses = crud.list_expense_rows(db, user_id)
+    if include_archived:
+        # cold rows are decompressed on demand (see archive.py); their names are looked up here
+        cold = archive.archived_expenses(db, user_id)
+        if cold:
+            categories = {c.category_ID: c.category_name for c in crud.list_categories(db)}
+            methods = {p.payment_ID: p.payment_type for p in crud.list_payment_methods(db)}
+            for row in cold:
+                row["category_name"] = categories.get(row["category_ID"])
+                row["payment_name"] = methods.get(row["payment_ID"])
+        return tabular(cold + expenses, EXPENSE_COLUMNS)
+    return tabular(expenses, EXPENSE_COLUMNS)
+
+@app.post("/expenses/add", status_code=status.HTTP_201_CREATED, tags=["Expenses"])
+def add_expense(
+    expense: schemas.ExpenseCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    values = expense.dict()
+
+    def create():
+        if writes.GROUP_COMMIT_ENABLED:
+            expense_id = writes.group_committer.submit(values).result(timeout=writes.GROUP_COMMIT_TIMEOUT)
+        else:
+            expense_id = writes.insert_expenses(user_connection(db, expense.user_ID), [values])[0]
+            bump_data_version(db, [expense.user_ID])
+            db.commit()
+        # id comes back from RETURNING/lastrowid - no refresh SELECT
+        return {"message": "Expense added successfully", "expense": {"expense_ID": expense_id, **values}}
+
+    key = f"{expense.user_ID}:{idempotency_key}" if idempotency_key else None
+    result, replayed = writes.run_idempotent(key, values, create)
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+@app.put("/expenses/{expense_id}", tags=["Expenses"])
+def update_expense(expense_id: int, update: schemas.ExpenseUpdate, db: Session = Depends(get_db)):
+    exp = crud.get_expense(db, expense_id)
+    if not exp:
+        raise HTTPException(status_code=404, detail="Expense not found")
+    crud.update_row(db, exp, update.dict(exclude_unset=True))
+    return {"message": "Expense updated", "expense": exp}
+
+@app.delete("/expenses/{expense_id}", tags=["Expenses"])
+def delete_expense(expense_id: int, db: Session = Depends(get_db)):
+    exp = crud.get_expense(db, expense_id)
+    if not exp:
+        raise HTTPException(status_code=404, detail="Expense not found")
+    crud.delete_expense(db, exp)
+    return {"message": "Expense deleted successfully"}
+
+# -----------------------
+# Reports (user-specific)
+# -----------------------
+# report results are cached per user data version (see report_cache.py)
+@app.get("/reports/spending-by-category/{user_id}", tags=["Reports"], dependencies=[Depends(user_etag)])
+def get_spending_by_category(user_id: int, db: Session = Depends(get_db), cached=Depends(report_cache)):
+    def build():
+        results = crud.spending_by_category(db, user_id)
+        return [{"category_name": r[0], "total": float(r[1] or 0)} for r in results]
+    return cached(build, tabular=True)
+
+@app.get("/reports/total-spending/{user_id}", tags=["Reports"], dependencies=[Depends(user_etag)])
+def get_total_spending(user_id: int, db: Session = Depends(get_db), cached=Depends(report_cache)):
+    def build():
+        total = crud.total_spending(db, user_id)
+        return {"user_id": user_id, "total_spending": float(total or 0.0)}
+    return cached(build)
+
+from sqlalchemy import func
+
+from sqlalchemy import func, extract
+
+from sqlalchemy import extract, func
+
+from sqlalchemy import func
+
+from sqlalchemy import func, extract
+
+from sqlalchemy import func
+
+from sqlalchemy import func
+
+from sqlalchemy import func, cast, String
+
+from sqlalchemy import func
+
+from sqlalchemy import func
+
+@app.get("/reports/monthly-spending/{user_id}", tags=["Reports"], dependencies=[Depends(user_etag)])
+def get_monthly_spending(user_id: int, db: Session = Depends(get_db), cached=Depends(report_cache)):
+    def build():
+        results = crud.monthly_spending(db, user_id)
+        return [{"month": f"{int(r.year)}-{int(r.month_num):02d}", "total": float(r.total or 0)} for r in results]
+    return cached(build, tabular=True)
+
+
+
+
+
+# -----------------------
+# Delete user (account removal)
+# -----------------------
+@app.delete("/users/{user_id}", tags=["Users"])
+def delete_user(user_id: int, db: Session = Depends(get_db)):
+    user = crud.get_user(db, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    crud.delete_user(db, user)
+    if shard_router:
+        shard_router.forget(user_id)
+    return {"message": "User and related data deleted successfully"}
+
+# -----------------------
+# Utility: seed default categories/payment methods
+# -----------------------
+@app.post("/seed-data", tags=["Utility"])
+def seed_initial_data(db: Session = Depends(get_db)):
+    default_categories = ["Food", "Transport", "Entertainment", "Bills", "Health", "Shopping", "Education"]
+    for name in default_categories:
+        if not crud.get_category_by_name(db, name):
+            db.add(models.Category(category_name=name))
+
+    default_methods = ["Cash", "Credit Card", "Debit Card", "UPI", "Net Banking"]
+    for m in default_methods:
+        if not crud.get_payment_method_by_type(db, m):
+            db.add(models.PaymentMethod(payment_type=m))
+
+    db.commit()
+    if shard_router:
+        shard_router.replicate_reference_tables(models.Base.metadata)
+    return {"message": "✅ Default data seeded successfully."}
+
+# -----------------------
+# Root
+# -----------------------
+@app.get("/")
+def root():
+    return {"message": "Expense Tracker API is running 🚀"}
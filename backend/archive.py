@@ -0,0 +1,235 @@
+# backend/archive.py
+"""Hot/cold tiering for expenses.
+
+Expenses older than ARCHIVE_AFTER_DAYS (rounded down to whole months) leave
+the hot `expense` table and are kept as:
+
+- expense_rollup: daily per-category totals, which every report reads
+  alongside the hot rows (see spending_source), so totals never change
+- expense_archive: one zlib-compressed JSON chunk per user and month, fetched
+  on demand by /expenses/{user_id}/archive/{month} or ?include_archived=true
+
+Archived rows are read-only and leave /sync like deleted ones (tombstones),
+so synced clients mirror the hot listing. Run from cron:
+
+    python -m backend.archive [days]
+"""
+import json
+import os
+import sys
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import Integer, bindparam, delete, insert, literal, select, union_all, update
+from sqlalchemy.orm import Session
+from backend import models
+from backend.database import get_db, shard_router, user_data_engines
+from backend.versioning import versioned_transaction
+
+router = APIRouter()
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+DELETE_CHUNK = 500  # ids per DELETE ... IN (...)
+
+expenses = models.Expense.__table__
+rollups = models.ExpenseRollup.__table__
+chunks = models.ExpenseArchive.__table__
+tombstones = models.Tombstone.__table__
+
+
+# -----------------------
+# Hot + cold spending
+# -----------------------
+def spending_source(user_id: int, start=None, end=None):
+    """One user's spending as (expense_ID, user_ID, date, category_ID, amount) rows.
+
+    Hot expenses UNION ALL archived daily rollups (whose expense_ID is NULL).
+    Reports aggregate over this instead of the expense table.
+    """
+    hot = select(
+        expenses.c.expense_ID, expenses.c.user_ID, expenses.c.date, expenses.c.category_ID, expenses.c.amount,
+    ).where(expenses.c.user_ID == user_id)
+    cold = select(
+        literal(None, Integer).label("expense_ID"), rollups.c.user_ID, rollups.c.day.label("date"),
+        rollups.c.category_ID, rollups.c.total.label("amount"),
+    ).where(rollups.c.user_ID == user_id)
+    if start is not None:
+        hot, cold = hot.where(expenses.c.date >= start), cold.where(rollups.c.day >= start)
+    if end is not None:
+        hot, cold = hot.where(expenses.c.date < end), cold.where(rollups.c.day < end)
+    return union_all(hot, cold).subquery("spending")
+
+
+# -----------------------
+# Compressed chunks
+# -----------------------
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"cannot archive {type(value).__name__}")
+
+
+def _pack(rows):
+    return zlib.compress(json.dumps([dict(r) for r in rows], default=_encode, separators=(",", ":")).encode(), 6)
+
+
+def _unpack(payload):
+    rows = json.loads(zlib.decompress(payload))
+    for r in rows:
+        r["amount"] = float(r["amount"]) if r["amount"] is not None else None
+        r["archived"] = True
+    return rows
+
+
+def remap_recurring_ids(payload, template_ids):
+    """A chunk with its rows' recurring_ID mapped through {old: new} (for sharding.move_user)."""
+    rows = json.loads(zlib.decompress(payload))
+    for r in rows:
+        r["recurring_ID"] = template_ids.get(r.get("recurring_ID"), r.get("recurring_ID"))
+    return zlib.compress(json.dumps(rows, separators=(",", ":")).encode(), 6)
+
+
+def archived_expenses(db: Session, user_id: int, month: str = None):
+    """Decompress a user's archived expenses (one month, or all of them)."""
+    from backend import crud  # crud builds its report statements from spending_source
+
+    rows = [r for payload in crud.list_archive_chunks(db, user_id, month or None) for r in _unpack(payload)]
+    rows.sort(key=lambda r: (r["date"] or "", r["expense_ID"]))
+    return rows
+
+
+# -----------------------
+# Archival job
+# -----------------------
+def archive_cutoff(now=None, days=ARCHIVE_AFTER_DAYS):
+    """First day of the month `days` ago; only whole months are archived."""
+    d = (now or datetime.utcnow()) - timedelta(days=days)
+    return datetime(d.year, d.month, 1)
+
+
+def archive_user(bind, user_id: int, cutoff: datetime) -> int:
+    """Move one user's expenses dated before `cutoff` to cold storage, in one transaction."""
+    if shard_router is not None and shard_router.lookup(user_id)[1] == "moving":
+        return 0  # picked up on the next run
+    with versioned_transaction(bind) as (conn, touched):
+        rows = conn.execute(
+            select(expenses)
+            .where(expenses.c.user_ID == user_id, expenses.c.date < cutoff)
+            .order_by(expenses.c.date, expenses.c.expense_ID)
+            .with_for_update()
+        ).mappings().all()
+        if not rows:
+            return 0
+
+        now = datetime.utcnow()
+        by_month, by_day = defaultdict(list), defaultdict(lambda: [Decimal(0), 0])
+        for r in rows:
+            by_month[r["date"].strftime("%Y-%m")].append(r)
+            day = by_day[(datetime(r["date"].year, r["date"].month, r["date"].day), r["category_ID"])]
+            day[0] += r["amount"] or 0
+            day[1] += 1
+
+        # a month archived before can gain a chunk if rows were backdated into it
+        conn.execute(insert(chunks), [
+            {
+                "user_ID": user_id,
+                "month": month,
+                "row_count": len(month_rows),
+                "total": sum((r["amount"] or 0 for r in month_rows), Decimal(0)),
+                "payload": _pack(month_rows),
+                "archived_at": now,
+            }
+            for month, month_rows in by_month.items()
+        ])
+
+        existing = {
+            (r.day, r.category_ID): r.rollup_ID
+            for r in conn.execute(
+                select(rollups.c.rollup_ID, rollups.c.day, rollups.c.category_ID)
+                .where(rollups.c.user_ID == user_id, rollups.c.day >= min(day for day, _ in by_day), rollups.c.day < cutoff)
+            )
+        }
+        merges, new = [], []
+        for (day, category_id), (total, count) in by_day.items():
+            if (day, category_id) in existing:
+                merges.append({"r_id": existing[(day, category_id)], "add_total": total, "add_count": count})
+            else:
+                new.append({"user_ID": user_id, "day": day, "category_ID": category_id, "total": total, "count": count})
+        if merges:
+            conn.execute(
+                update(rollups)
+                .where(rollups.c.rollup_ID == bindparam("r_id"))
+                .values(total=rollups.c.total + bindparam("add_total"), count=rollups.c.count + bindparam("add_count")),
+                merges,
+            )
+        if new:
+            conn.execute(insert(rollups), new)
+
+        ids = [r["expense_ID"] for r in rows]
+        for i in range(0, len(ids), DELETE_CHUNK):
+            conn.execute(delete(expenses).where(expenses.c.expense_ID.in_(ids[i:i + DELETE_CHUNK])))
+        conn.execute(insert(tombstones), [
+            {"user_ID": user_id, "entity": "expense", "entity_ID": expense_id, "deleted_at": now} for expense_id in ids
+        ])
+        touched.add(user_id)
+    return len(rows)
+
+
+def archive_expenses(bind, cutoff: datetime):
+    """Archive every user on `bind`; returns (users archived, rows archived)."""
+    with bind.connect() as conn:
+        # served by ix_expense_user_date (skip scan on MySQL 8)
+        user_ids = conn.execute(select(expenses.c.user_ID).where(expenses.c.date < cutoff).distinct()).scalars().all()
+    users, archived = 0, 0
+    for user_id in user_ids:
+        n = archive_user(bind, user_id, cutoff)
+        users += bool(n)
+        archived += n
+    return users, archived
+
+
+# -----------------------
+# Cold storage endpoints
+# -----------------------
+@router.get("/expenses/{user_id}/archive")
+def get_archive_summary(user_id: int, db: Session = Depends(get_db)):
+    """Archived months with their expense counts and totals."""
+    from backend import crud
+
+    return [
+        {"month": r.month, "count": int(r.count), "total": float(r.total or 0)}
+        for r in crud.archive_summary(db, user_id)
+    ]
+
+
+@router.get("/expenses/{user_id}/archive/{month}")
+def get_archived_month(user_id: int, month: str, db: Session = Depends(get_db)):
+    rows = archived_expenses(db, user_id, month)
+    if not rows:
+        raise HTTPException(status_code=404, detail="No archived expenses for that month")
+    return rows
+
+
+# -----------------------
+# CLI
+# -----------------------
+def main(argv):
+    from backend.database import engine
+
+    days = int(argv[0]) if argv else ARCHIVE_AFTER_DAYS
+    models.Base.metadata.create_all(bind=engine)
+    if shard_router:
+        shard_router.setup(models.Base.metadata)
+    cutoff = archive_cutoff(days=days)
+    for bind in user_data_engines():
+        users, rows = archive_expenses(bind, cutoff)
+        print(f"✅ {bind.url.database}: archived {rows} expenses of {users} users dated before {cutoff:%Y-%m-%d}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,167 @@
+# backend/batch.py
+"""POST /batch: many expense/budget creates, updates and deletes in one transaction.
+
+Every operation is validated with the schemas.py model its single-row route
+uses before anything is written. The batch then runs as one transaction on the
+user's database: one existence check per entity, one multi-row INSERT per
+entity, one executemany UPDATE per entity and set of changed fields, and one
+DELETE per entity. Any failure rolls the whole batch back.
+
+Because statements are grouped, operations are not applied in request order
+(creates, then updates, then deletes). So that the order can't matter, a row
+may be the target of only one update or delete per batch.
+"""
+import logging
+from collections import defaultdict
+from fastapi import APIRouter, HTTPException
+from pydantic import ValidationError
+from sqlalchemy import bindparam, delete, select, update
+from sqlalchemy.exc import IntegrityError
+from backend import models, schemas, sync
+from backend.database import engine_for_user
+from backend.receipts import detach_receipts, release_blobs
+from backend.versioning import versioned_transaction
+from backend.writes import insert_rows
+
+router = APIRouter()
+log = logging.getLogger(__name__)
+
+# entity -> (table, primary key column name, create schema, update schema)
+ENTITIES = {
+    "expense": (models.Expense.__table__, "expense_ID", schemas.ExpenseCreate, schemas.ExpenseUpdate),
+    "budget": (models.Budget.__table__, "budget_ID", schemas.BudgetCreate, schemas.BudgetUpdate),
+}
+
+
+class BatchPlan:
+    """Validated operations grouped by kind and entity, keeping each one's index in the request."""
+
+    def __init__(self):
+        self.creates = defaultdict(list)  # entity -> [(index, values)]
+        self.updates = defaultdict(list)  # entity -> [(index, id, changes)]
+        self.deletes = defaultdict(list)  # entity -> [(index, id)]
+        self.errors = {}  # index -> error
+
+
+def _not_applied(status_code, operations, errors, message):
+    """Reject the batch, reporting every operation's outcome."""
+    results = [
+        {"index": i, "status": "failed", "error": errors[i]} if i in errors else {"index": i, "status": "not_applied"}
+        for i in range(len(operations))
+    ]
+    raise HTTPException(status_code=status_code, detail={"message": message, "results": results})
+
+
+def plan_batch(batch: schemas.BatchRequest) -> BatchPlan:
+    plan = BatchPlan()
+    targeted = {}  # (entity, id) -> index of the operation that updates/deletes it
+    for i, op in enumerate(batch.operations):
+        _, _, create_schema, update_schema = ENTITIES[op.entity]
+        try:
+            if op.op == "create":
+                data = {"user_ID": batch.user_ID, **op.data}
+                if data["user_ID"] != batch.user_ID:
+                    raise ValueError("user_ID must be the batch's user_ID")
+                plan.creates[op.entity].append((i, create_schema(**data).dict()))
+            elif op.id is None:
+                raise ValueError(f"{op.op} needs an id")
+            elif (op.entity, op.id) in targeted:
+                raise ValueError(
+                    f"{op.entity} {op.id} is already changed by operation {targeted[op.entity, op.id]}; "
+                    "send at most one update or delete per row"
+                )
+            elif op.op == "update":
+                changes = update_schema(**op.data).dict(exclude_unset=True)
+                if not changes:
+                    raise ValueError("update has no fields to change")
+                plan.updates[op.entity].append((i, op.id, changes))
+            else:
+                plan.deletes[op.entity].append((i, op.id))
+            if op.op != "create":
+                targeted[op.entity, op.id] = i
+        except ValidationError as exc:
+            plan.errors[i] = exc.errors(include_url=False, include_context=False)
+        except ValueError as exc:
+            plan.errors[i] = str(exc)
+    return plan
+
+
+def _check_targets(conn, plan, user_id):
+    """Every update/delete must name an existing row of this user; locks them for the batch."""
+    missing = {}
+    for entity in {*plan.updates, *plan.deletes}:
+        table, pk, _, _ = ENTITIES[entity]
+        targets = [(i, row_id) for i, row_id, _ in plan.updates.get(entity, [])] + plan.deletes.get(entity, [])
+        ids = {row_id for _, row_id in targets}
+        found = set(conn.execute(
+            select(table.c[pk]).where(table.c[pk].in_(ids), table.c.user_ID == user_id).with_for_update()
+        ).scalars())
+        missing.update({i: f"{entity} {row_id} not found" for i, row_id in targets if row_id not in found})
+    return missing
+
+
+def apply_batch(conn, plan, user_id):
+    """Run the planned statements on `conn`; returns {index: result}."""
+    results = {}
+    for entity, creates in plan.creates.items():
+        table, pk, _, _ = ENTITIES[entity]
+        ids = insert_rows(conn, table, [values for _, values in creates])
+        for (i, _), row_id in zip(creates, ids):
+            results[i] = {"index": i, "status": "created", "id": row_id}
+
+    for entity, updates in plan.updates.items():
+        table, pk, _, _ = ENTITIES[entity]
+        by_fields = defaultdict(list)
+        for i, row_id, changes in updates:
+            by_fields[tuple(sorted(changes))].append((i, row_id, changes))
+        for fields, group in by_fields.items():
+            # one executemany per set of changed fields; updated_at is stamped by its onupdate
+            stmt = (
+                update(table)
+                .where(table.c[pk] == bindparam("row_id"), table.c.user_ID == user_id)
+                .values({**{field: bindparam(f"new_{field}") for field in fields}, "version": table.c.version + 1})
+            )
+            conn.execute(stmt, [
+                {"row_id": row_id, **{f"new_{field}": value for field, value in changes.items()}}
+                for _, row_id, changes in group
+            ])
+            for i, row_id, _ in group:
+                results[i] = {"index": i, "status": "updated", "id": row_id}
+
+    for entity, deletes in plan.deletes.items():
+        table, pk, _, _ = ENTITIES[entity]
+        ids = sorted({row_id for _, row_id in deletes})
+        conn.execute(delete(table).where(table.c[pk].in_(ids), table.c.user_ID == user_id))
+        sync.record_deletions(conn, entity, user_id, ids)
+        for i, row_id in deletes:
+            results[i] = {"index": i, "status": "deleted", "id": row_id}
+    return results
+
+
+@router.post("/batch")
+def run_batch(batch: schemas.BatchRequest):
+    """Apply every operation or none, answering one result per operation in request order.
+
+    Operations are applied grouped (creates, updates, deletes), not in request
+    order, so a batch that updates or deletes the same row twice is rejected
+    with 422; merge the changes into one update instead.
+    """
+    operations = batch.operations
+    plan = plan_batch(batch)
+    if plan.errors:
+        _not_applied(422, operations, plan.errors, "Batch not applied: invalid operations")
+
+    try:
+        with versioned_transaction(engine_for_user(batch.user_ID, for_write=True)) as (conn, touched):
+            missing = _check_targets(conn, plan, batch.user_ID)
+            if missing:
+                _not_applied(404, operations, missing, "Batch not applied: rows not found")
+            results = apply_batch(conn, plan, batch.user_ID)
+            released = detach_receipts(conn, batch.user_ID, [row_id for _, row_id in plan.deletes.get("expense", [])])
+            touched.add(batch.user_ID)
+    except IntegrityError:
+        # e.g. an unknown category_ID/payment_ID; the driver's message names tables and SQL, so it stays in the log
+        log.exception("batch for user %s not applied", batch.user_ID)
+        _not_applied(409, operations, {}, "Batch not applied: a referenced category or payment method does not exist")
+    release_blobs(released)
+    return {"results": [results[i] for i in range(len(operations))]}
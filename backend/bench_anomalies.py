@@ -0,0 +1,113 @@
+# backend/bench_anomalies.py
+"""Anomaly job throughput in users/second: vectorized scoring vs a per-user loop.
+
+Seeds users with HISTORY_MONTHS + 1 months of spending in a few categories and
+plants a spike in the last month for 1% of them, then times the whole job
+(load, score, store) and the scoring step alone against a plain-Python loop
+over the same series.
+
+Run from the repo root:  python -m backend.bench_anomalies [users]
+Uses a throwaway SQLite file unless DATABASE_URL is set.
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench_anomalies.db"
+
+from sqlalchemy import insert, select
+from backend import anomalies, models
+from backend.anomalies import HISTORY_MONTHS, month_number, month_start
+from backend.database import engine
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+CATEGORIES = 4
+SPIKE_EVERY = 100  # users
+MONTH = "2024-06"
+INSERT_BATCH = 50000
+
+
+def seed():
+    models.Base.metadata.create_all(bind=engine)
+    rng = random.Random(7)
+    target = month_number(MONTH)
+    rows, planted = [], set()
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [
+            {"user_name": f"u{i}", "password": "x", "user_email": f"u{i}@example.com", "contact_num_1": f"{i:010d}"}
+            for i in range(1, USERS + 1)
+        ])
+        for user_id in range(1, USERS + 1):
+            for category_id in range(1, CATEGORIES + 1):
+                typical = rng.uniform(500, 5000)
+                for n in range(target - HISTORY_MONTHS, target + 1):
+                    amount = typical * rng.uniform(0.8, 1.2)
+                    if n == target and user_id % SPIKE_EVERY == 0 and category_id == 1:
+                        amount = typical * 4
+                        planted.add(user_id)
+                    rows.append({
+                        "user_ID": user_id, "category_ID": category_id, "payment_ID": 1,
+                        "amount": round(amount, 2), "date": month_start(n).replace(day=rng.randint(1, 28)),
+                        "description": "bench",
+                    })
+            if len(rows) >= INSERT_BATCH:
+                conn.execute(insert(models.Expense.__table__), rows)
+                rows = []
+        if rows:
+            conn.execute(insert(models.Expense.__table__), rows)
+    return planted
+
+
+def loop_scores(matrix):
+    """The per-series Python version of anomalies.score_matrix, for comparison."""
+    flagged = []
+    for row in matrix.tolist():
+        history, current = row[:-1], row[-1]
+        median = statistics.median(history)
+        mad = statistics.median(abs(x - median) for x in history)
+        baseline = max(median, history[-12])
+        scale = max(anomalies.MAD_TO_SIGMA * mad, anomalies.MIN_SCALE_RATIO * baseline, anomalies.MIN_SCALE)
+        z = (current - baseline) / scale
+        active = sum(1 for x in history if x)
+        flagged.append(
+            z >= anomalies.Z_THRESHOLD and current >= anomalies.MIN_RATIO * baseline
+            and current >= anomalies.MIN_AMOUNT and active >= anomalies.MIN_ACTIVE_MONTHS
+        )
+    return flagged
+
+
+def main():
+    start = time.perf_counter()
+    planted = seed()
+    print(f"Seeded {USERS} users x {CATEGORIES} categories x {HISTORY_MONTHS + 1} months in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    users, flagged = anomalies.detect_anomalies(engine, MONTH)
+    elapsed = time.perf_counter() - start
+    print(f"  {'full job (load + score + store)':<34} {users / elapsed:>12,.0f} users/s   {elapsed:.2f}s")
+
+    with engine.connect() as conn:
+        found = set(conn.execute(select(models.SpendingAnomaly.user_ID).where(models.SpendingAnomaly.month == MONTH)).scalars())
+        first = month_number(MONTH) - HISTORY_MONTHS
+        loaded = anomalies._monthly_totals(conn, 1, USERS, month_start(first), month_start(month_number(MONTH) + 1))
+    keys, matrix = anomalies.build_matrix(*loaded, first)
+
+    start = time.perf_counter()
+    _, _, vectorized = anomalies.score_matrix(matrix)
+    vec_elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    looped = loop_scores(matrix)
+    loop_elapsed = time.perf_counter() - start
+    assert vectorized.tolist() == looped, "vectorized and loop scores disagree"
+    print(f"  {'scoring only, NumPy':<34} {USERS / vec_elapsed:>12,.0f} users/s   {vec_elapsed * 1000:.1f}ms")
+    print(f"  {'scoring only, per-user loop':<34} {USERS / loop_elapsed:>12,.0f} users/s   {loop_elapsed * 1000:.1f}ms")
+    print(f"Flagged {flagged} in {MONTH}; planted spikes found: {len(planted & found)}/{len(planted)}, "
+          f"others flagged: {len(found - planted)}")
+
+
+if __name__ == "__main__":
+    main()
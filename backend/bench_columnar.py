@@ -0,0 +1,123 @@
+# backend/bench_columnar.py
+"""DataFrame-bound responses as JSON vs Arrow IPC vs msgpack: bytes, encode and decode time.
+
+Encode is the server's work from query rows to body (JSON through the
+response model, as the routes do). Decode is the client's work from body to
+the DataFrame the dashboard draws from: JSON is parsed row by row and its
+columns converted (pd.to_datetime, astype(float)); Arrow hands pandas typed
+arrays; msgpack columns need one pd.to_datetime per datetime column. Sizes
+are shown raw and gzipped, since the API compresses large bodies.
+
+Run from the repo root:  python -m backend.bench_columnar [rows] [repeats]
+Uses a throwaway SQLite file unless DATABASE_URL is set. The msgpack rows are
+skipped when msgpack isn't installed.
+"""
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench_columnar.db"
+
+import pandas as pd
+import pyarrow as pa
+from pydantic import TypeAdapter
+from sqlalchemy import insert
+from backend import crud, models, schemas
+from backend.analytics import _parse_windows, DEFAULT_WINDOWS, rolling_spending
+from backend.columnar import ARROW, MSGPACK, columns_of, encode, msgpack
+from backend.database import engine, SessionLocal
+from backend.report_cache import _render
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+REPEATS = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+expense_rows = TypeAdapter(list[schemas.ExpenseRow])
+EXPENSE_COLUMNS = columns_of(schemas.ExpenseRow)
+
+
+def seed():
+    models.Base.metadata.create_all(bind=engine)
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__).values(
+            user_ID=1, user_name="bench", password="x", user_email="bench@example.com", contact_num_1="0",
+        ))
+        conn.execute(insert(models.Category.__table__), [{"category_name": f"Category {i}"} for i in range(1, 8)])
+        conn.execute(insert(models.PaymentMethod.__table__), [{"payment_type": f"Method {i}"} for i in range(1, 6)])
+        conn.execute(insert(models.Expense.__table__), [
+            {
+                "user_ID": 1, "category_ID": i % 7 + 1, "payment_ID": i % 5 + 1, "amount": 10 + i % 500,
+                "date": start + timedelta(hours=i), "description": f"expense {i}",
+            }
+            for i in range(ROWS)
+        ])
+
+
+# -----------------------
+# Client side: body -> DataFrame
+# -----------------------
+def from_json(body, datetimes, floats):
+    df = pd.DataFrame(json.loads(body))
+    for name in datetimes:
+        df[name] = pd.to_datetime(df[name])
+    return df.astype({name: float for name in floats})
+
+
+def from_arrow(body, datetimes, floats):
+    return pa.ipc.open_stream(body).read_pandas(date_as_object=False)
+
+
+def from_msgpack(body, datetimes, floats):
+    doc = msgpack.unpackb(body)
+    df = pd.DataFrame(doc["columns"])
+    for name, kind in doc["types"].items():
+        if kind in ("datetime", "date"):
+            df[name] = pd.to_datetime(df[name], unit="us")
+    return df
+
+
+def best(fn, *args):
+    elapsed = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn(*args)
+        elapsed = min(elapsed, time.perf_counter() - start)
+    return elapsed * 1000
+
+
+def compare(title, rows, to_json, datetimes, floats, columns=None):
+    print(f"\n{title}: {len(rows)} rows")
+    print(f"{'':<9} {'bytes':>10} {'gzipped':>10} {'encode ms':>10} {'decode ms':>10}")
+    formats = [("json", to_json, from_json), ("arrow", lambda r: encode(r, columns, ARROW), from_arrow)]
+    if msgpack is not None:
+        formats.append(("msgpack", lambda r: encode(r, columns, MSGPACK), from_msgpack))
+    for label, to_body, decode in formats:
+        body = to_body(rows)
+        print(
+            f"{label:<9} {len(body):>10} {len(gzip.compress(body)):>10} "
+            f"{best(to_body, rows):>10.2f} {best(decode, body, datetimes, floats):>10.2f}"
+        )
+
+
+def main():
+    seed()
+    print(f"{engine.dialect.name}, best of {REPEATS}")
+    with SessionLocal() as db:
+        expenses = crud.list_expense_rows(db, 1)
+        rolling = rolling_spending(db, 1, _parse_windows(DEFAULT_WINDOWS), None, None)
+    # what the route sends through its response model
+    compare(
+        "GET /expenses/{user_id}", expenses,
+        lambda rows: expense_rows.dump_json(expense_rows.validate_python(rows)),
+        datetimes=("date", "updated_at"), floats=("amount",), columns=EXPENSE_COLUMNS,
+    )
+    float_columns = [name for name in rolling[0] if name != "date"]
+    compare("GET /reports/rolling/{user_id}", rolling, _render, datetimes=("date",), floats=float_columns)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# backend/bench_inserts.py
+"""Expense insert throughput under concurrency: per-request commit vs group commit.
+
+Each method runs at every concurrency level. Group commit trades up to
+GROUP_COMMIT_WINDOW_MS of latency per insert for one commit per batch, so it
+loses with few concurrent writers and wins once commits (an fsync each on a
+disk-backed database) are the bottleneck. On a local SQLite file:
+
+    threads   core returning   group commit   (rows/s)
+          1              830            140
+          4              540            530
+         16              560           1660
+         64              530           4710
+
+Run from the repo root:  python -m backend.bench_inserts [threads,...] [inserts_per_thread]
+Uses a throwaway SQLite file (on disk, so commits pay for fsync) unless DATABASE_URL is set.
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench_inserts.db"
+
+from backend import models, writes
+from backend.database import engine, SessionLocal
+
+THREAD_COUNTS = [int(n) for n in (sys.argv[1] if len(sys.argv) > 1 else "1,4,16,64").split(",")]
+PER_THREAD = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+
+def _row(i):
+    return {
+        "user_ID": 1, "category_ID": 1, "payment_ID": 1, "amount": 9.99,
+        "date": datetime(2024, 1, 1), "description": f"bench {i}",
+    }
+
+
+def orm_refresh(i):
+    """The old path: add + commit + refresh SELECT per expense."""
+    db = SessionLocal()
+    try:
+        exp = models.Expense(**_row(i))
+        db.add(exp)
+        db.commit()
+        db.refresh(exp)
+        return exp.expense_ID
+    finally:
+        db.close()
+
+
+def core_returning(i):
+    """One INSERT ... RETURNING and one commit per expense."""
+    with engine.begin() as conn:
+        return writes.insert_expenses(conn, [_row(i)])[0]
+
+
+def group_commit(i):
+    return writes.group_committer.submit(_row(i)).result(timeout=30)
+
+
+def run(threads, fn):
+    """rows/s inserting PER_THREAD rows from each of `threads` threads."""
+    total = threads * PER_THREAD
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        ids = list(pool.map(fn, range(total)))
+    elapsed = time.perf_counter() - start
+    assert len(set(ids)) == total, "duplicate ids returned"
+    return total / elapsed
+
+
+if __name__ == "__main__":
+    models.Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        if not db.get(models.User, 1):
+            db.add(models.User(user_name="bench", password="x", user_email="bench@example.com", contact_num_1="0"))
+            db.add(models.Category(category_name="Bench"))
+            db.add(models.PaymentMethod(payment_type="Bench"))
+            db.commit()
+
+    methods = (("orm + refresh", orm_refresh), ("core returning", core_returning), ("group commit", group_commit))
+    print(f"{engine.dialect.name}, {PER_THREAD} inserts per thread, rows/s "
+          f"(group commit window {writes.GROUP_COMMIT_WINDOW_MS:g} ms)")
+    print(f"{'threads':>7} " + " ".join(f"{name:>15}" for name, _ in methods))
+    for threads in THREAD_COUNTS:
+        print(f"{threads:>7} " + " ".join(f"{run(threads, fn):>15.0f}" for _, fn in methods))
@@ -0,0 +1,112 @@
+# backend/bench_listing.py
+"""GET /expenses/{user_id} read path: ORM instances vs joined Core rows, per row.
+
+The old path loaded Expense instances into the session's identity map and
+serialized them with jsonable_encoder; the client then mapped category and
+payment ids to names itself. The new path selects plain rows with the names
+joined in and serializes them through the ExpenseRow response model.
+
+Run from the repo root:  python -m backend.bench_listing [rows] [repeats]
+Uses a throwaway SQLite file unless DATABASE_URL is set.
+"""
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench_listing.db"
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy import insert
+from backend import crud, models, schemas
+from backend.database import engine, SessionLocal
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+REPEATS = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+expense_rows = TypeAdapter(list[schemas.ExpenseRow])
+
+
+def seed():
+    models.Base.metadata.create_all(bind=engine)
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__).values(
+            user_ID=1, user_name="bench", password="x", user_email="bench@example.com", contact_num_1="0",
+        ))
+        conn.execute(insert(models.Category.__table__), [{"category_name": f"Category {i}"} for i in range(1, 8)])
+        conn.execute(insert(models.PaymentMethod.__table__), [{"payment_type": f"Method {i}"} for i in range(1, 6)])
+        conn.execute(insert(models.Expense.__table__), [
+            {
+                "user_ID": 1, "category_ID": i % 7 + 1, "payment_ID": i % 5 + 1, "amount": 10 + i % 500,
+                "date": start + timedelta(hours=i), "description": f"expense {i}",
+            }
+            for i in range(ROWS)
+        ])
+
+
+def orm_fetch(db):
+    return crud.list_expenses_by_user(db, 1)
+
+
+def orm_serialize(rows):
+    # what FastAPI did for a route without a response model
+    return json.dumps(jsonable_encoder(rows)).encode()
+
+
+def core_fetch(db):
+    return crud.list_expense_rows(db, 1)
+
+
+def core_serialize(rows):
+    # what FastAPI does with the response model: validate in pydantic-core, then dump straight to JSON
+    return expense_rows.dump_json(expense_rows.validate_python(rows))
+
+
+def cpu(fetch, serialize):
+    """µs per row to fetch and to serialize, best of REPEATS (a fresh session each time)."""
+    best_fetch = best_serialize = float("inf")
+    for _ in range(REPEATS):
+        with SessionLocal() as db:
+            start = time.perf_counter()
+            rows = fetch(db)
+            fetched = time.perf_counter()
+            serialize(rows)
+            done = time.perf_counter()
+        best_fetch = min(best_fetch, fetched - start)
+        best_serialize = min(best_serialize, done - fetched)
+    return best_fetch / ROWS * 1e6, best_serialize / ROWS * 1e6
+
+
+def memory(fetch):
+    """Bytes per row held by the fetched result (and the session), and peak while fetching."""
+    with SessionLocal() as db:
+        gc.collect()
+        tracemalloc.start()
+        rows = fetch(db)
+        held, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert len(rows) == ROWS
+    return held / ROWS, peak / ROWS
+
+
+def main():
+    seed()
+    print(f"{engine.dialect.name}, {ROWS} rows, best of {REPEATS}")
+    print(f"{'':<28} {'fetch µs/row':>13} {'json µs/row':>12} {'held B/row':>11} {'peak B/row':>11}")
+    for label, fetch, serialize in (
+        ("ORM + jsonable_encoder", orm_fetch, orm_serialize),
+        ("Core rows + response model", core_fetch, core_serialize),
+    ):
+        fetch_us, serialize_us = cpu(fetch, serialize)
+        held, peak = memory(fetch)
+        print(f"{label:<28} {fetch_us:>13.2f} {serialize_us:>12.2f} {held:>11.0f} {peak:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
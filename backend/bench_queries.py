@@ -0,0 +1,70 @@
+# backend/bench_queries.py
+"""Per-request query overhead: legacy db.query() vs 2.0 select() vs the prebuilt crud statements.
+
+Run from the repo root:  python -m backend.bench_queries [calls]
+Uses a throwaway SQLite file unless DATABASE_URL is set. The tables are tiny, so
+the numbers are mostly statement build/compile time, not query execution.
+"""
+import os
+import sys
+import tempfile
+import time
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench_queries.db"
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from backend import crud, models
+from backend.database import engine, SessionLocal
+from backend.versioning import get_data_version
+
+CALLS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+User, Expense = models.User, models.Expense
+users = User.__table__
+
+
+# -----------------------
+# The same three lookups, three ways: (name, user by name, user's expenses, data version)
+# -----------------------
+LEGACY = (
+    "db.query()",
+    lambda db, name: db.query(User).filter(User.user_name == name).first(),
+    lambda db, uid: db.query(Expense).filter(Expense.user_ID == uid).all(),
+    lambda db, uid: db.query(User.data_version).filter(User.user_ID == uid).scalar(),
+)
+SELECT = (
+    "select()",
+    lambda db, name: db.execute(select(User).where(User.user_name == name)).scalars().first(),
+    lambda db, uid: db.execute(select(Expense).where(Expense.user_ID == uid)).scalars().all(),
+    lambda db, uid: db.execute(select(users.c.data_version).where(users.c.user_ID == uid)).scalar(),
+)
+CRUD = ("crud (prebuilt statements)", crud.get_user_by_username, crud.list_expenses_by_user, get_data_version)
+
+
+def run(label, db, by_name, expenses, version):
+    start = time.perf_counter()
+    for i in range(CALLS):
+        by_name(db, "bench")
+        expenses(db, 1)
+        version(db, 1)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed / CALLS * 1e6:8.1f} µs per request (3 queries)")
+
+
+if __name__ == "__main__":
+    models.Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        if not crud.get_user_by_username(db, "bench"):
+            db.add(models.User(user_name="bench", password="x", user_email="bench@example.com", contact_num_1="0"))
+            db.add(models.Category(category_name="Bench"))
+            db.add(models.PaymentMethod(payment_type="Bench"))
+            db.commit()
+
+    print(f"{engine.dialect.name}, {CALLS} simulated requests")
+    # compiled_cache=None recompiles every statement: what caching saves
+    with Session(engine.execution_options(compiled_cache=None)) as db:
+        run("select(), no compiled cache", db, *SELECT[1:])
+    for name, *fns in (LEGACY, SELECT, CRUD):
+        with SessionLocal() as db:
+            run(name, db, *fns)
@@ -0,0 +1,213 @@
+# backend/columnar.py
+"""Columnar renderings of list responses that clients load straight into DataFrames.
+
+A client that sends one of these Accept types gets columns instead of JSON objects:
+
+- application/vnd.apache.arrow.stream   an Arrow IPC stream (pyarrow)
+- application/x-msgpack                 {"types": {name: kind}, "columns": {name: [values]}}
+                                        (pip install msgpack); datetimes as epoch microseconds
+
+Typed columns load without a per-row parse: pyarrow hands pandas whole arrays,
+and msgpack columns need one vectorized pd.to_datetime(unit="us") per datetime
+column. Columns are built straight from the query's rows. Without a matching
+Accept header, or without the library, routes answer JSON as before.
+
+Routes opt in with the `tabular` dependency and `return tabular(rows, columns)`.
+The column kinds come from a response model (columns_of) or, for report dicts,
+from the rows themselves.
+"""
+import typing
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from fastapi import Request, Response
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None  # optional: pip install pyarrow
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None  # optional: pip install msgpack
+
+ARROW = "application/vnd.apache.arrow.stream"
+MSGPACK = "application/x-msgpack"
+# short names for ETags (see versioning.py)
+FORMAT_TAGS = {ARROW: "arrow", MSGPACK: "msgpack"}
+
+EPOCH = datetime(1970, 1, 1)
+KINDS = {bool: "bool", int: "int", float: "float", Decimal: "float", str: "str", datetime: "datetime", date: "date"}
+
+
+def negotiate(request: Request):
+    """ARROW or MSGPACK when the client prefers one that can be produced here, else None (JSON)."""
+    accept = request.headers.get("accept")
+    if not accept:
+        return None
+    ranked = []
+    for i, part in enumerate(accept.split(",")):
+        media_type, *params = (p.strip() for p in part.split(";"))
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        ranked.append((-q, i, media_type.lower()))
+    for neg_q, _, media_type in sorted(ranked):
+        if neg_q >= 0:
+            break
+        if media_type == ARROW and pa is not None:
+            return ARROW
+        if media_type in (MSGPACK, "application/msgpack") and msgpack is not None:
+            return MSGPACK
+        if media_type in ("application/json", "application/*", "*/*"):
+            return None
+    return None
+
+
+# -----------------------
+# Columns
+# -----------------------
+def columns_of(model):
+    """{field: kind} of a pydantic response model, in field order."""
+    columns = {}
+    for name, field in model.model_fields.items():
+        annotation = field.annotation
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        if typing.get_origin(annotation) is typing.Union and len(args) == 1:
+            annotation = args[0]  # Optional[X]
+        columns[name] = KINDS[annotation]
+    return columns
+
+
+def _infer_columns(rows):
+    columns = {}
+    for row in rows:
+        for name, value in row.items():
+            if columns.get(name) is None:
+                columns[name] = KINDS.get(type(value)) if value is not None else None
+        if all(columns.values()):
+            break
+    return {name: kind or "null" for name, kind in columns.items()}
+
+
+def _transpose(rows, columns):
+    """{name: [values]} of result rows; absent fields are null (false for bools).
+
+    Core rows (the usual case) are transposed in one zip; dicts (report rows,
+    archived expenses) and ORM instances are read field by field.
+    """
+    if rows and all(hasattr(row, "_fields") for row in rows):
+        by_name = dict(zip(rows[0]._fields, zip(*rows)))
+        return {
+            name: list(by_name[name]) if name in by_name else [False if kind == "bool" else None] * len(rows)
+            for name, kind in columns.items()
+        }
+    data = {}
+    for name, kind in columns.items():
+        default = False if kind == "bool" else None
+        data[name] = [
+            row.get(name, default) if isinstance(row, dict)
+            else row._mapping.get(name, default) if hasattr(row, "_mapping")
+            else getattr(row, name, default)
+            for row in rows
+        ]
+    return data
+
+
+def _plain(value, kind):
+    """One value as its kind's Python type (archived rows carry dates as ISO strings)."""
+    if value is None:
+        return None
+    if kind == "float":
+        return float(value)
+    if kind in ("datetime", "date") and isinstance(value, str):
+        parsed = datetime.fromisoformat(value)
+        return parsed if kind == "datetime" else parsed.date()
+    return value
+
+
+# -----------------------
+# Encoders
+# -----------------------
+def _arrow_type(kind):
+    return {
+        "bool": pa.bool_(), "int": pa.int64(), "float": pa.float64(), "str": pa.string(),
+        "datetime": pa.timestamp("us"), "date": pa.date32(), "null": pa.null(),
+    }[kind]
+
+
+def _arrow_array(values, kind):
+    arrow_type = _arrow_type(kind)
+    try:
+        return pa.array(values, type=arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+    try:
+        # e.g. Decimal sums -> float64 in one cast
+        return pa.array(values).cast(arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return pa.array([_plain(v, kind) for v in values], type=arrow_type)
+
+
+def to_arrow(rows, columns):
+    data = _transpose(rows, columns)
+    table = pa.Table.from_arrays(
+        [_arrow_array(data[name], kind) for name, kind in columns.items()], names=list(columns)
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _msgpack_value(value, kind):
+    value = _plain(value, kind)
+    if value is None:
+        return None
+    if kind == "datetime":
+        return (value - EPOCH) // timedelta(microseconds=1)
+    if kind == "date":
+        return (datetime.combine(value, datetime.min.time()) - EPOCH) // timedelta(microseconds=1)
+    return value
+
+
+def to_msgpack(rows, columns):
+    data = _transpose(rows, columns)
+    return msgpack.packb({
+        "types": columns,
+        "columns": {
+            name: values if kind in ("int", "str", "bool", "null") else [_msgpack_value(v, kind) for v in values]
+            for (name, kind), values in zip(columns.items(), data.values())
+        },
+    }, use_bin_type=True)
+
+
+def encode(rows, columns, media_type):
+    columns = columns or _infer_columns(rows)
+    return to_arrow(rows, columns) if media_type == ARROW else to_msgpack(rows, columns)
+
+
+# -----------------------
+# Dependency
+# -----------------------
+def tabular(request: Request, response: Response):
+    """Dependency for DataFrame-bound list routes: `return tabular(rows, columns)`.
+
+    JSON clients get `rows` back unchanged (so a response model still applies);
+    columns=None infers the kinds from dict rows.
+    """
+    media_type = negotiate(request)
+
+    def render(rows, columns=None):
+        if media_type is None:
+            return rows
+        out = Response(encode(rows, columns, media_type), media_type=media_type)
+        # a returned Response doesn't pick up headers set by dependencies (ETag) or the route (X-Next-Cursor)
+        out.headers.raw.extend(response.headers.raw)
+        return out
+
+    return render
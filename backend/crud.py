@@ -1,115 +1,378 @@
-# backend/crud.py
-from sqlalchemy.orm import Session
-import models, schemas
-from sqlalchemy import func
-# IMPORTANT: Import the hash function for user creation
-from auth import hash_password 
-
-# ---------- USERS ----------
-def get_user_by_username(db: Session, username: str):
-    return db.query(models.User).filter(models.User.user_name == username).first()
-
-def get_user_by_email(db: Session, email: str):
-    # This function is used to check for duplicate emails during registration.
-    return db.query(models.User).filter(models.User.email == email).first()
-
-def create_user(db: Session, user: schemas.UserCreate):
-    # CRITICAL FIX: Hash the password before saving to the database
-    hashed_password = hash_password(user.password)
-    
-    new = models.User(
-        user_name=user.user_name,
-        email=user.email,
-        password=hashed_password # Store the HASHED password
-    )
-    db.add(new)
-    db.commit()
-    db.refresh(new)
-    return new
-
-# ---------- EXPENSE ----------
-def create_expense(db: Session, exp: schemas.ExpenseCreate, user_id: int):
-    new_exp = models.Expense(
-        user_ID=user_id,
-        category_ID=exp.category_ID,
-        payment_ID=exp.payment_ID,
-        amount=exp.amount,
-        description=exp.description
-    )
-    db.add(new_exp)
-    db.commit()
-    db.refresh(new_exp)
-    return new_exp
-
-def list_expenses_by_user(db: Session, user_id: int):
-    return db.query(models.Expense).filter(models.Expense.user_ID == user_id).order_by(models.Expense.created_at.desc()).all()
-
-def get_expense_by_id(db: Session, eid: int):
-    return db.query(models.Expense).filter(models.Expense.expense_ID == eid).first()
-
-def delete_expense(db: Session, eid: int):
-    exp = get_expense_by_id(db, eid)
-    if exp:
-        db.delete(exp)
-        db.commit()
-    return exp
-
-# ---------- CATEGORY ----------
-def create_category(db: Session, cname: str):
-    new = models.Category(category_name=cname)
-    db.add(new)
-    db.commit()
-    db.refresh(new)
-    return new
-
-def list_categories_global(db: Session):
-    return db.query(models.Category).order_by(models.Category.category_name).all()
-
-# ---------- PAYMENT METHOD ----------
-def create_payment_method(db: Session, ptype: str):
-    new = models.Payment(payment_type=ptype)
-    db.add(new)
-    db.commit()
-    db.refresh(new)
-    return new
-
-def list_payments_global(db: Session):
-    return db.query(models.Payment).order_by(models.Payment.payment_type).all()
-
-# ---------- BUDGET ----------
-def create_budget(db: Session, b: schemas.BudgetCreate, user_id: int):
-    new = models.Budget(user_ID=user_id, category_ID=b.category_ID, amount_limit=b.amount)
-    db.add(new)
-    db.commit()
-    db.refresh(new)
-    return new
-
-def list_budgets_by_user(db: Session, user_id: int):
-    return db.query(models.Budget).filter(models.Budget.user_ID == user_id).all()
-
-def get_budget_by_id(db: Session, bid: int):
-    return db.query(models.Budget).filter(models.Budget.budget_ID == bid).first()
-
-def delete_budget(db: Session, bid: int):
-    b = get_budget_by_id(db, bid)
-    if b:
-        db.delete(b)
-        db.commit()
-    return b
-
-# ---------- REPORTS ----------
-def total_expense_for_user(db: Session, user_id: int):
-    total = db.query(func.sum(models.Expense.amount)).filter(models.Expense.user_ID == user_id).scalar()
-    return total if total is not None else 0
-
-def spending_by_category_for_user(db: Session, user_id: int):
-    return db.query(
-        models.Category.category_name, 
-        func.sum(models.Expense.amount)
-    ).join(models.Expense).filter(
-        models.Expense.user_ID == user_id
-    ).group_by(
-        models.Category.category_name
-    ).order_by(
-        func.sum(models.Expense.amount).desc()
-    ).all()
+# backend/crud.py
+"""Shared query layer for app.py, auth.py, main.py and the feature routers.
+
+Every statement is a 2.0 select() built once at import with named bindparams
+and executed with per-request parameters. A prebuilt statement memoizes its
+cache key and hits the engine's compiled cache, so requests pay neither to
+build nor to compile SQL (see bench_queries.py). lambda_stmt measured slower
+than this for statements this small.
+"""
+from functools import lru_cache
+from sqlalchemy import DateTime, Integer, and_, bindparam, cast, delete, extract, func, literal_column, or_, select
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import Session
+from backend import models, schemas, sync, utils
+from backend.archive import spending_source
+from backend.database import shard_router, user_bind
+from backend.receipts import detach_receipts, release_blobs
+from backend.versioning import bump_data_version
+
+Expense, Budget, User = models.Expense, models.Budget, models.User
+Tombstone, Anomaly, Chunk = models.Tombstone, models.SpendingAnomaly, models.ExpenseArchive
+Recurring = models.RecurringExpense
+
+_user_by_name = select(User).where(User.user_name == bindparam("username"))
+_user_by_email = select(User).where(User.user_email == bindparam("email"))
+_categories = select(models.Category)
+_category_by_name = select(models.Category).where(models.Category.category_name == bindparam("name"))
+_payment_methods = select(models.PaymentMethod)
+_payment_method_by_type = select(models.PaymentMethod).where(models.PaymentMethod.payment_type == bindparam("payment_type"))
+_expenses_by_user = select(Expense).where(Expense.user_ID == bindparam("user_id"))
+# listings: plain rows with the category/payment names joined in, so nothing is
+# hydrated into the identity map just to be serialized (see bench_listing.py)
+_expense_rows = (
+    select(
+        *Expense.__table__.c,
+        models.Category.category_name,
+        models.PaymentMethod.payment_type.label("payment_name"),
+    )
+    .join_from(Expense, models.Category, isouter=True)
+    .join(models.PaymentMethod, isouter=True)
+    .where(Expense.user_ID == bindparam("user_id"))
+)
+# keyset pages, newest first, walking ix_expense_user_date
+_expense_page = (
+    _expense_rows.order_by(Expense.date.desc(), Expense.expense_ID.desc()).limit(bindparam("limit"))
+)
+_expense_page_after = _expense_page.where(or_(
+    Expense.date < bindparam("date"),
+    and_(Expense.date == bindparam("date"), Expense.expense_ID < bindparam("expense_id")),
+))
+_budgets_by_user = select(Budget).where(Budget.user_ID == bindparam("user_id"))
+_recurring_by_user = select(Recurring).where(Recurring.user_ID == bindparam("user_id"))
+
+# /sync deltas; tombstones are indexed on (user_ID, deleted_at)
+_expenses_changed = _expenses_by_user.where(Expense.updated_at >= bindparam("since"))
+_budgets_changed = _budgets_by_user.where(Budget.updated_at >= bindparam("since"))
+_deleted_since = select(Tombstone.entity, Tombstone.entity_ID).where(
+    Tombstone.user_ID == bindparam("user_id"),
+    Tombstone.deleted_at >= bindparam("since"),
+    Tombstone.entity.in_(bindparam("entities", expanding=True)),
+)
+_expire_tombstones = delete(Tombstone).where(
+    Tombstone.user_ID == bindparam("user_id"), Tombstone.deleted_at < bindparam("cutoff")
+).execution_options(synchronize_session=False)
+
+# full-text search, one statement per dialect; a None filter parameter matches everything
+_category_id, _payment_id = bindparam("category_id", type_=Integer), bindparam("payment_id", type_=Integer)
+_from, _before = bindparam("start", type_=DateTime), bindparam("end", type_=DateTime)
+_search_filters = (
+    Expense.user_ID == bindparam("user_id"),
+    or_(_category_id.is_(None), Expense.category_ID == _category_id),
+    or_(_payment_id.is_(None), Expense.payment_ID == _payment_id),
+    or_(_from.is_(None), Expense.date >= _from),
+    or_(_before.is_(None), Expense.date < _before),
+)
+fts = models.expense_fts
+_bm25 = (-func.bm25(literal_column(fts.name))).label("score")  # bm25: lower is better
+_fulltext = match(Expense.description, against=bindparam("terms")).in_boolean_mode()
+_search = {
+    "sqlite": (
+        select(Expense, _bm25)
+        .join(fts, fts.c.rowid == Expense.expense_ID)
+        .where(fts.c[fts.name].op("MATCH")(bindparam("terms")), *_search_filters)
+        .order_by(_bm25.desc(), Expense.date.desc())
+        .limit(bindparam("limit")).offset(bindparam("offset"))
+    ),
+    "mysql": (
+        select(Expense, _fulltext.label("score"))
+        .where(_fulltext, *_search_filters)
+        .order_by(_fulltext.label("score").desc(), Expense.date.desc())
+        .limit(bindparam("limit")).offset(bindparam("offset"))
+    ),
+}
+
+# cold storage
+_archive_chunks = select(Chunk.payload).where(Chunk.user_ID == bindparam("user_id")).order_by(Chunk.month)
+_archive_chunks_of_month = _archive_chunks.where(Chunk.month == bindparam("month"))
+_archive_summary = (
+    select(Chunk.month, func.sum(Chunk.row_count).label("count"), func.sum(Chunk.total).label("total"))
+    .where(Chunk.user_ID == bindparam("user_id"))
+    .group_by(Chunk.month)
+    .order_by(Chunk.month)
+)
+
+_anomalies = (
+    select(
+        Anomaly.month, Anomaly.category_ID, models.Category.category_name,
+        Anomaly.amount, Anomaly.baseline, Anomaly.score, Anomaly.detected_at,
+    )
+    .join(models.Category, models.Category.category_ID == Anomaly.category_ID)
+    .where(Anomaly.user_ID == bindparam("user_id"))
+    .order_by(Anomaly.month.desc(), Anomaly.score.desc())
+)
+_anomalies_of_month = _anomalies.where(Anomaly.month == bindparam("month"))
+
+# reports read hot expenses + archived rollups
+_spending = spending_source(bindparam("user_id"))
+_total_spending = select(func.sum(_spending.c.amount))
+_category_total = func.sum(_spending.c.amount)
+_spending_by_category = (
+    select(models.Category.category_name, _category_total)
+    .join(_spending, models.Category.category_ID == _spending.c.category_ID)
+    .group_by(models.Category.category_name)
+    .order_by(_category_total.desc())
+)
+# EXTRACT compiles on MySQL and SQLite
+_year = extract("year", _spending.c.date).label("year")
+_month = extract("month", _spending.c.date).label("month_num")
+_monthly_spending = (
+    select(_year, _month, func.sum(_spending.c.amount).label("total")).group_by(_year, _month).order_by(_year, _month)
+)
+
+# month-over-month / year-over-year: RANGE on a month index (not ROWS/LAG) so gaps in history yield NULL, not the wrong month
+_month_idx = (_year * 12 + _month - 1).label("month_idx")
+_monthly = select(_month_idx, func.sum(_spending.c.amount).label("total")).group_by(_month_idx).subquery()
+_period_over_period = select(
+    _monthly.c.month_idx,
+    _monthly.c.total,
+    func.sum(_monthly.c.total).over(order_by=_monthly.c.month_idx, range_=(-1, -1)).label("prev_month"),
+    func.sum(_monthly.c.total).over(order_by=_monthly.c.month_idx, range_=(-12, -12)).label("prev_year"),
+).order_by(_monthly.c.month_idx)
+
+# running spend inside each budget's period, every budget in one joined + windowed query
+_budget_progress = (
+    select(
+        Budget.budget_ID, Budget.category_ID, Budget.amount_limit, Budget.start_date, Budget.end_date,
+        _spending.c.date, _spending.c.amount,
+        func.sum(_spending.c.amount).over(
+            partition_by=Budget.budget_ID,
+            order_by=(_spending.c.date, _spending.c.expense_ID),
+            rows=(None, 0),
+        ).label("cumulative"),
+    )
+    .outerjoin(_spending, and_(
+        _spending.c.category_ID == Budget.category_ID,
+        _spending.c.date >= Budget.start_date,
+        func.date(_spending.c.date) <= func.date(Budget.end_date),
+    ))
+    .where(Budget.user_ID == bindparam("user_id"))
+    .order_by(Budget.budget_ID, _spending.c.date, _spending.c.expense_ID)
+)
+
+
+def _day_number(dialect, col):
+    """Integer day ordinal, so RANGE windows span calendar days instead of rows."""
+    if dialect == "sqlite":
+        return cast(func.julianday(func.date(col)), Integer)
+    return func.to_days(col)
+
+
+@lru_cache(maxsize=64)
+def _rolling_spending(dialect, sizes, bounded_start, bounded_end):
+    """Daily totals with a moving sum per window size, built once per dialect/windows/bounds."""
+    e = spending_source(
+        bindparam("user_id"),
+        start=bindparam("start") if bounded_start else None,
+        end=bindparam("end") if bounded_end else None,
+    ).c
+    day_no = _day_number(dialect, e.date).label("day_no")
+    daily = select(
+        day_no,
+        func.min(func.date(e.date)).label("day"),
+        func.sum(e.amount).label("total"),
+    ).group_by(day_no).subquery()
+    moving = [
+        func.sum(daily.c.total).over(order_by=daily.c.day_no, range_=(-(w - 1), 0)).label(f"sum_{w}d")
+        for w in sizes
+    ]
+    return select(daily.c.day, daily.c.total, *moving).order_by(daily.c.day_no)
+
+# ---------- USERS ----------
+def get_user(db: Session, user_id: int):
+    return db.get(User, user_id)
+
+def get_user_by_username(db: Session, username: str):
+    return db.execute(_user_by_name, {"username": username}).scalars().first()
+
+def get_user_by_email(db: Session, email: str):
+    # This function is used to check for duplicate emails during registration.
+    return db.execute(_user_by_email, {"email": email}).scalars().first()
+
+def create_user(db: Session, user: schemas.UserCreate):
+    new = models.User(
+        user_name=user.user_name,
+        password=utils.hash_password(user.password),  # never store the plain password
+        user_email=user.user_email,
+        contact_num_1=user.contact_num_1,
+        contact_num_2=user.contact_num_2,
+    )
+    db.add(new)
+    db.commit()
+    db.refresh(new)
+    if shard_router:
+        shard_router.pin(new.user_ID)
+    return new
+
+def delete_user(db: Session, user):
+    """Remove a user and everything they own."""
+    shas = detach_receipts(db, user.user_ID)
+    for model in (Expense, Budget, models.RecurringExpense, models.Tombstone, models.ExpenseRollup, models.ExpenseArchive, models.SpendingAnomaly):
+        db.execute(delete(model).where(model.user_ID == user.user_ID))
+    db.delete(user)
+    db.commit()
+    release_blobs(shas)
+
+# ---------- CATEGORY / PAYMENT METHOD ----------
+def list_categories(db: Session):
+    return db.execute(_categories).scalars().all()
+
+def get_category_by_name(db: Session, name: str):
+    return db.execute(_category_by_name, {"name": name}).scalars().first()
+
+def list_payment_methods(db: Session):
+    return db.execute(_payment_methods).scalars().all()
+
+def get_payment_method_by_type(db: Session, payment_type: str):
+    return db.execute(_payment_method_by_type, {"payment_type": payment_type}).scalars().first()
+
+# ---------- EXPENSE ----------
+def list_expenses_by_user(db: Session, user_id: int):
+    return db.execute(_expenses_by_user, {"user_id": user_id}).scalars().all()
+
+def list_expense_rows(db: Session, user_id: int):
+    """A user's expenses as read-only rows with category_name/payment_name inline."""
+    return db.execute(_expense_rows, {"user_id": user_id}).all()
+
+def page_expense_rows(db: Session, user_id: int, limit: int, after=None):
+    """One page of list_expense_rows. after is the (date, expense_ID) of the previous page's last row."""
+    if after is None:
+        return db.execute(_expense_page, {"user_id": user_id, "limit": limit}).all()
+    date, expense_id = after
+    params = {"user_id": user_id, "limit": limit, "date": date, "expense_id": expense_id}
+    return db.execute(_expense_page_after, params).all()
+
+def get_expense(db: Session, expense_id: int):
+    return db.get(Expense, expense_id)
+
+def create_expense(db: Session, exp: schemas.ExpenseCreate, user_id: int):
+    new_exp = models.Expense(**{**exp.dict(), "user_ID": user_id})
+    db.add(new_exp)
+    bump_data_version(db, [user_id])
+    db.commit()
+    db.refresh(new_exp)
+    return new_exp
+
+def update_row(db: Session, row, changes: dict):
+    """Apply a PUT to an expense/budget/recurring template owned by row.user_ID."""
+    for k, v in changes.items():
+        setattr(row, k, v)
+    if hasattr(type(row), "version"):
+        row.version = type(row).version + 1  # in SQL, so concurrent PUTs both count
+    bump_data_version(db, [row.user_ID])
+    db.commit()
+    db.refresh(row)
+    return row
+
+def delete_expense(db: Session, exp):
+    db.delete(exp)
+    sync.record_deletion(db, "expense", exp.user_ID, exp.expense_ID)
+    shas = detach_receipts(db, exp.user_ID, [exp.expense_ID])
+    bump_data_version(db, [exp.user_ID])
+    db.commit()
+    release_blobs(shas)
+
+# ---------- BUDGET ----------
+def list_budgets_by_user(db: Session, user_id: int):
+    return db.execute(_budgets_by_user, {"user_id": user_id}).scalars().all()
+
+def get_budget(db: Session, budget_id: int):
+    return db.get(Budget, budget_id)
+
+def create_budget(db: Session, b: schemas.BudgetCreate, user_id: int):
+    new = models.Budget(**{**b.dict(), "user_ID": user_id})
+    db.add(new)
+    bump_data_version(db, [user_id])
+    db.commit()
+    db.refresh(new)
+    return new
+
+def delete_budget(db: Session, b):
+    db.delete(b)
+    sync.record_deletion(db, "budget", b.user_ID, b.budget_ID)
+    bump_data_version(db, [b.user_ID])
+    db.commit()
+
+# ---------- RECURRING ----------
+def list_recurring_by_user(db: Session, user_id: int):
+    return db.execute(_recurring_by_user, {"user_id": user_id}).scalars().all()
+
+def get_recurring(db: Session, recurring_id: int):
+    return db.get(Recurring, recurring_id)
+
+# ---------- SYNC ----------
+def expire_tombstones(db: Session, user_id: int, cutoff):
+    db.execute(_expire_tombstones, {"user_id": user_id, "cutoff": cutoff})
+
+def list_expenses_changed(db: Session, user_id: int, since):
+    return db.execute(_expenses_changed, {"user_id": user_id, "since": since}).scalars().all()
+
+def list_budgets_changed(db: Session, user_id: int, since):
+    return db.execute(_budgets_changed, {"user_id": user_id, "since": since}).scalars().all()
+
+def list_deletions(db: Session, user_id: int, since, entities=("expense", "budget")):
+    """(entity, entity_ID) of rows of the given kinds deleted or archived since `since`."""
+    return db.execute(_deleted_since, {"user_id": user_id, "since": since, "entities": list(entities)}).all()
+
+# ---------- SEARCH ----------
+def search_expenses(db: Session, dialect: str, user_id: int, terms: str, limit: int, offset: int,
+                    category_id=None, payment_id=None, start=None, end=None):
+    """(Expense, score) rows, best match first; terms is a MATCH/AGAINST string in the dialect's syntax."""
+    params = {
+        "user_id": user_id, "terms": terms, "limit": limit, "offset": offset,
+        "category_id": category_id, "payment_id": payment_id, "start": start, "end": end,
+    }
+    return db.execute(_search[dialect], params).all()
+
+# ---------- ARCHIVE ----------
+def list_archive_chunks(db: Session, user_id: int, month: str = None):
+    """Compressed payloads of a user's archived months (or of one month), oldest first."""
+    if month is None:
+        return db.execute(_archive_chunks, {"user_id": user_id}).scalars().all()
+    return db.execute(_archive_chunks_of_month, {"user_id": user_id, "month": month}).scalars().all()
+
+def archive_summary(db: Session, user_id: int):
+    return db.execute(_archive_summary, {"user_id": user_id}).all()
+
+# ---------- REPORTS ----------
+def total_spending(db: Session, user_id: int):
+    total = db.execute(_total_spending, {"user_id": user_id}).scalar()
+    return total if total is not None else 0
+
+def spending_by_category(db: Session, user_id: int):
+    return db.execute(_spending_by_category, {"user_id": user_id}).all()
+
+def monthly_spending(db: Session, user_id: int):
+    return db.execute(_monthly_spending, {"user_id": user_id}).all()
+
+def period_over_period(db: Session, user_id: int):
+    return db.execute(_period_over_period, {"user_id": user_id}).all()
+
+def budget_progress(db: Session, user_id: int):
+    return db.execute(_budget_progress, {"user_id": user_id}).all()
+
+def rolling_spending(db: Session, user_id: int, sizes, start=None, end=None):
+    """Daily rows (day, total, sum_<w>d per window) of spending in [start, end)."""
+    dialect = user_bind(db, user_id).dialect.name
+    stmt = _rolling_spending(dialect, tuple(sizes), start is not None, end is not None)
+    params = {"user_id": user_id}
+    if start is not None:
+        params["start"] = start
+    if end is not None:
+        params["end"] = end
+    return db.execute(stmt, params).all()
+
+def list_anomalies(db: Session, user_id: int, month: str = None):
+    if month is None:
+        return db.execute(_anomalies, {"user_id": user_id}).all()
+    return db.execute(_anomalies_of_month, {"user_id": user_id, "month": month}).all()
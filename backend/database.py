@@ -1,29 +1,81 @@
-# backend/database.py
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-import os
-
-# --- MySQL Configuration ---
-DB_USER = "root"          # <-- your MySQL username
-DB_PASSWORD = "password"  # <-- your MySQL password
-DB_HOST = "localhost"     # usually localhost
-DB_PORT = "3306"          # default MySQL port
-DB_NAME = "expense_tracker"  # make sure this DB exists in MySQL
-
-SQLALCHEMY_DATABASE_URL = (
-    f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-)
-
-# --- SQLAlchemy Setup ---
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
-
-# Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
+# backend/database.py
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, declarative_base
+import os
+from backend.profiling import install_slow_query_log
+
+# --- MySQL Configuration ---
+DB_USER = "root"          # <-- your MySQL username
+DB_PASSWORD = "password"  # <-- your MySQL password
+DB_HOST = "localhost"     # usually localhost
+DB_PORT = "3306"          # default MySQL port
+DB_NAME = "expense_tracker"  # make sure this DB exists in MySQL
+
+# Set DATABASE_URL (e.g. sqlite:///./expense_tracker.db) to run without MySQL
+SQLALCHEMY_DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
+)
+
+# --- Sharding (optional) ---
+# Comma-separated URLs of user-data shards. When set, DATABASE_URL becomes the
+# global database (users, categories, payment methods, shard map); see sharding.py.
+SHARD_DATABASE_URLS = [u.strip() for u in os.getenv("SHARD_DATABASE_URLS", "").split(",") if u.strip()]
+
+
+def _create_engine(url):
+    new_engine = create_engine(
+        url,
+        # SQLite connections are shared across FastAPI's worker threads
+        connect_args={"check_same_thread": False} if url.startswith("sqlite") else {},
+    )
+    install_slow_query_log(new_engine)
+    return new_engine
+
+
+# --- SQLAlchemy Setup ---
+engine = _create_engine(SQLALCHEMY_DATABASE_URL)
+if SHARD_DATABASE_URLS:
+    from backend.sharding import ShardRouter
+
+    shard_router = ShardRouter(
+        engine, {f"shard_{i}": _create_engine(url) for i, url in enumerate(SHARD_DATABASE_URLS)}
+    )
+    SessionLocal = shard_router.sessionmaker()
+else:
+    shard_router = None
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+Base = declarative_base()
+
+
+# --- Where a user's data lives ---
+def user_data_engines():
+    """Every engine holding expenses/budgets: the shards, or just `engine`."""
+    return list(shard_router.shards.values()) if shard_router else [engine]
+
+
+def engine_for_user(user_id: int, for_write: bool = False):
+    return shard_router.engine_for_user(user_id, for_write) if shard_router else engine
+
+
+def user_bind(db, user_id: int):
+    """The engine this session reads this user's rows from (for dialect-specific SQL)."""
+    if shard_router:
+        return db.get_bind(shard_id=shard_router.shard_for_user(user_id))
+    return db.get_bind()
+
+
+def user_connection(db, user_id: int):
+    """The session's connection to the database holding this user's rows."""
+    if shard_router:
+        return db.connection(bind_arguments={"shard_id": shard_router.shard_for_user(user_id, for_write=True)})
+    return db.connection()
+
+# Dependency
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
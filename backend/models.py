@@ -1,68 +1,195 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, DECIMAL
-from sqlalchemy.orm import relationship
-from datetime import datetime
-from backend.database import Base
-
-class User(Base):
-    __tablename__ = "user"  # ✅ match MySQL table name
-
-    user_ID = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    user_name = Column(String(100), nullable=False)
-    password = Column(String(100), nullable=False)
-    user_email = Column(String(150), nullable=False, unique=True)
-    contact_num_1 = Column(String(15), nullable=False, unique=True)
-    contact_num_2 = Column(String(15), nullable=True, unique=True)
-    
-
-    # Relationships (optional but recommended)
-    expenses = relationship("Expense", back_populates="user")
-    budgets = relationship("Budget", back_populates="user")
-
-
-class Category(Base):
-    __tablename__ = "category"
-
-    category_ID = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    category_name = Column(String(100), nullable=False)
-
-    expenses = relationship("Expense", back_populates="category")
-    budgets = relationship("Budget", back_populates="category")
-
-
-class PaymentMethod(Base):
-    __tablename__ = "payment_method"
-
-    payment_ID = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    payment_type = Column(String(50), nullable=True)
-
-    expenses = relationship("Expense", back_populates="payment_method")
-
-
-class Expense(Base):
-    __tablename__ = "expense"
-
-    expense_ID = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    user_ID = Column(Integer, ForeignKey("user.user_ID"), nullable=False)
-    category_ID = Column(Integer, ForeignKey("category.category_ID"), nullable=False)
-    payment_ID = Column(Integer, ForeignKey("payment_method.payment_ID"), nullable=False)
-    date = Column(DateTime, default=datetime.utcnow)
-    amount = Column(DECIMAL(10, 2))
-    description = Column(String(255))
-
-    user = relationship("User", back_populates="expenses")
-    category = relationship("Category", back_populates="expenses")
-    payment_method = relationship("PaymentMethod", back_populates="expenses")
-
-
-class Budget(Base):
-    __tablename__ = "budget"
-
-    budget_ID = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    user_ID = Column(Integer, ForeignKey("user.user_ID"), nullable=False)
-    category_ID = Column(Integer, ForeignKey("category.category_ID"), nullable=False)
-    amount_limit = Column(DECIMAL(10, 2))
-    start_date = Column(DateTime, nullable=False)
-    end_date = Column(DateTime, nullable=False)
-
-    user = relationship("User", back_populates="budgets")
-    category = relationship("Category", back_populates="budgets")
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, DECIMAL, Index, Boolean, UniqueConstraint, LargeBinary, Float, column, table
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from backend.database import Base
+
+class User(Base):
+    __tablename__ = "user"  # ✅ match MySQL table name
+
+    user_ID = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    user_name = Column(String(100), nullable=False, index=True)  # login/register lookups
+    password = Column(String(100), nullable=False)
+    user_email = Column(String(150), nullable=False, unique=True)
+    contact_num_1 = Column(String(15), nullable=False, unique=True)
+    contact_num_2 = Column(String(15), nullable=True, unique=True)
+    # bumped on every expense/budget write; drives ETags on user-scoped GETs
+    data_version = Column(Integer, nullable=False, default=1, server_default="1")
+    
+
+    # Relationships (optional but recommended)
+    expenses = relationship("Expense", back_populates="user")
+    budgets = relationship("Budget", back_populates="user")
+
+
+class Category(Base):
+    __tablename__ = "category"
+
+    category_ID = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    category_name = Column(String(100), nullable=False)
+
+    expenses = relationship("Expense", back_populates="category")
+    budgets = relationship("Budget", back_populates="category")
+
+
+class PaymentMethod(Base):
+    __tablename__ = "payment_method"
+
+    payment_ID = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    payment_type = Column(String(50), nullable=True)
+
+    expenses = relationship("Expense", back_populates="payment_method")
+
+
+class Expense(Base):
+    __tablename__ = "expense"
+    __table_args__ = (
+        # per-user, date-ordered scans (listings, reports, rolling windows)
+        Index("ix_expense_user_date", "user_ID", "date"),
+        Index("ix_expense_user_updated", "user_ID", "updated_at"),
+        # a recurring template materializes at most one expense per due date
+        UniqueConstraint("recurring_ID", "date", name="uq_expense_recurring_date"),
+    )
+
+    expense_ID = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    user_ID = Column(Integer, ForeignKey("user.user_ID"), nullable=False)
+    category_ID = Column(Integer, ForeignKey("category.category_ID"), nullable=False)
+    payment_ID = Column(Integer, ForeignKey("payment_method.payment_ID"), nullable=False)
+    date = Column(DateTime, default=datetime.utcnow)
+    amount = Column(DECIMAL(10, 2))
+    description = Column(String(255))
+    recurring_ID = Column(Integer, nullable=True)  # template this was generated from, if any
+    # delta sync: every insert/update stamps updated_at and bumps version
+    # (crud.update_row, batch.py); concurrent PUTs are still last-writer-wins
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = Column(Integer, nullable=False, default=1)
+
+    user = relationship("User", back_populates="expenses")
+    category = relationship("Category", back_populates="expenses")
+    payment_method = relationship("PaymentMethod", back_populates="expenses")
+
+
+class Budget(Base):
+    __tablename__ = "budget"
+    __table_args__ = (
+        Index("ix_budget_user_updated", "user_ID", "updated_at"),
+    )
+
+    budget_ID = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    user_ID = Column(Integer, ForeignKey("user.user_ID"), nullable=False)
+    category_ID = Column(Integer, ForeignKey("category.category_ID"), nullable=False)
+    amount_limit = Column(DECIMAL(10, 2))
+    start_date = Column(DateTime, nullable=False)
+    end_date = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = Column(Integer, nullable=False, default=1)
+
+    user = relationship("User", back_populates="budgets")
+    category = relationship("Category", back_populates="budgets")
+
+
+class RecurringExpense(Base):
+    """Template for rent/subscriptions/EMIs; the scheduler turns due instances into expenses."""
+    __tablename__ = "recurring_expense"
+    __table_args__ = (
+        Index("ix_recurring_due", "active", "next_due_at"),
+        Index("ix_recurring_user", "user_ID"),
+    )
+
+    recurring_ID = Column(Integer, primary_key=True, autoincrement=True)
+    user_ID = Column(Integer, ForeignKey("user.user_ID"), nullable=False)
+    category_ID = Column(Integer, ForeignKey("category.category_ID"), nullable=False)
+    payment_ID = Column(Integer, ForeignKey("payment_method.payment_ID"), nullable=False)
+    amount = Column(DECIMAL(10, 2), nullable=False)
+    description = Column(String(255))
+    frequency = Column(String(10), nullable=False)  # daily | weekly | monthly | yearly
+    interval = Column(Integer, nullable=False, default=1)  # every N periods
+    start_date = Column(DateTime, nullable=False)  # also anchors the day-of-month
+    end_date = Column(DateTime, nullable=True)
+    next_due_at = Column(DateTime, nullable=False)
+    active = Column(Boolean, nullable=False, default=True)
+
+
+class Tombstone(Base):
+    """Marker left behind by a deleted expense/budget so sync clients can drop it."""
+    __tablename__ = "sync_tombstone"
+    __table_args__ = (
+        Index("ix_tombstone_user_deleted", "user_ID", "deleted_at"),
+    )
+
+    tombstone_ID = Column(Integer, primary_key=True, autoincrement=True)
+    user_ID = Column(Integer, nullable=False)
+    entity = Column(String(20), nullable=False)  # "expense" | "budget"
+    entity_ID = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class ExpenseRollup(Base):
+    """Daily per-category totals of archived expenses; reports read these instead of the rows."""
+    __tablename__ = "expense_rollup"
+    __table_args__ = (
+        UniqueConstraint("user_ID", "day", "category_ID", name="uq_rollup_user_day_category"),
+    )
+
+    rollup_ID = Column(Integer, primary_key=True, autoincrement=True)
+    user_ID = Column(Integer, nullable=False)
+    day = Column(DateTime, nullable=False)
+    category_ID = Column(Integer, nullable=False)
+    total = Column(DECIMAL(12, 2), nullable=False)
+    count = Column(Integer, nullable=False)
+
+
+class ExpenseArchive(Base):
+    """Compressed chunk of one user's archived expenses for one month (see archive.py)."""
+    __tablename__ = "expense_archive"
+    __table_args__ = (
+        Index("ix_archive_user_month", "user_ID", "month"),
+    )
+
+    archive_ID = Column(Integer, primary_key=True, autoincrement=True)
+    user_ID = Column(Integer, nullable=False)
+    month = Column(String(7), nullable=False)  # "YYYY-MM"
+    row_count = Column(Integer, nullable=False)
+    total = Column(DECIMAL(12, 2), nullable=False)
+    payload = Column(LargeBinary(2**24), nullable=False)  # zlib-compressed JSON rows (MEDIUMBLOB on MySQL)
+    archived_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class SpendingAnomaly(Base):
+    """A user's spend in one category and month flagged as unusual by the nightly job (see anomalies.py)."""
+    __tablename__ = "spending_anomaly"
+    __table_args__ = (
+        UniqueConstraint("user_ID", "month", "category_ID", name="uq_anomaly_user_month_category"),
+    )
+
+    anomaly_ID = Column(Integer, primary_key=True, autoincrement=True)
+    user_ID = Column(Integer, nullable=False)
+    category_ID = Column(Integer, nullable=False)
+    month = Column(String(7), nullable=False)  # "YYYY-MM"
+    amount = Column(DECIMAL(12, 2), nullable=False)
+    baseline = Column(DECIMAL(12, 2), nullable=False)  # expected spend for the month
+    score = Column(Float, nullable=False)  # robust z-score
+    detected_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class Receipt(Base):
+    """An expense's receipt; the file lives in content-addressed storage under its SHA-256 (see receipts.py)."""
+    __tablename__ = "receipt"
+    __table_args__ = (
+        Index("ix_receipt_user", "user_ID"),
+        Index("ix_receipt_sha256", "sha256"),  # is a stored file still referenced?
+    )
+
+    receipt_ID = Column(Integer, primary_key=True, autoincrement=True)
+    # no FK: archived expenses leave the expense table but keep their receipts
+    expense_ID = Column(Integer, nullable=False, unique=True)
+    user_ID = Column(Integer, nullable=False)
+    sha256 = Column(String(64), nullable=False)
+    size = Column(Integer, nullable=False)  # counted against the user's quota
+    content_type = Column(String(100), nullable=False)
+    filename = Column(String(255), nullable=True)
+    uploaded_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+# SQLite FTS5 index over expense.description, created by search.setup_search_index
+# (not part of Base.metadata; MySQL uses a FULLTEXT index on expense instead)
+expense_fts = table("expense_fts", column("rowid"), column("expense_fts"))
@@ -0,0 +1,256 @@
+# backend/profiling.py
+"""On-demand request profiling and a slow-query log.
+
+Profiling is opt-in: an operator sends `X-Profile: <PROFILE_TOKEN>` on a
+request, or PROFILE_SAMPLE_RATE picks a random fraction of traffic. While the
+request runs a sampler thread records the stacks of every busy thread, and the
+counts are written to PROFILE_DIR in collapsed-stack format (open with
+speedscope or flamegraph.pl). The file name is returned in X-Profile-Id.
+Under concurrent load other requests' stacks show up in the profile too.
+
+Every engine created in database.py logs statements slower than SLOW_QUERY_MS
+with the route that issued them; recent ones are served at /metrics/slow-queries
+to callers sending `X-Profile-Token: <PROFILE_TOKEN>` (404 while it is unset),
+since they carry statement text.
+Statements run outside a request (scheduler, cron jobs, benchmarks) are only
+logged at DEBUG.
+"""
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+try:
+    # FastAPI builds included routers' routes lazily; app.routes only holds the router
+    from fastapi.routing import iter_route_contexts
+except ImportError:
+    iter_route_contexts = None
+
+router = APIRouter()
+log = logging.getLogger(__name__)
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")  # unset: X-Profile is ignored
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_KEEP = 200
+MAX_STATEMENT_CHARS = 2000
+
+# ASGI scope of the request being served; copied into threadpool workers with the context
+_current_scope = ContextVar("current_scope", default=None)
+# statements run for the request being served, while something counts them
+_query_count = ContextVar("query_count", default=None)
+
+
+def api_routes(app):
+    """(methods, full path template, endpoint) of every API route, including included routers'."""
+    if iter_route_contexts is None:
+        return [(r.methods, r.path, r.endpoint) for r in app.routes if isinstance(r, APIRoute)]
+    return [
+        (c.methods, c.path, c.endpoint)
+        for c in iter_route_contexts(app.routes)
+        if isinstance(c.original_route, APIRoute)
+    ]
+
+
+@lru_cache(maxsize=None)
+def _route_templates(app):
+    # included routers match on their un-prefixed paths; resolve the full ones once
+    return {endpoint: path for _, path, endpoint in api_routes(app)}
+
+
+def route_template(scope):
+    """Path template of the route that served `scope`, or None before routing / if nothing matched."""
+    # the router stores the matched endpoint in the scope
+    endpoint = scope.get("endpoint")
+    return _route_templates(scope["app"]).get(endpoint) if endpoint is not None else None
+
+
+def current_route():
+    """'METHOD /route/{template}' of the request being served, if any."""
+    scope = _current_scope.get()
+    if scope is None:
+        return None
+    return f"{scope['method']} {route_template(scope) or scope['path']}"
+
+
+@contextmanager
+def counting_queries():
+    """Count the statements run in this context (and threadpool calls made from it): yields [count]."""
+    box = [0]
+    token = _query_count.set(box)
+    try:
+        yield box
+    finally:
+        _query_count.reset(token)
+
+
+# -----------------------
+# Sampling profiler
+# -----------------------
+IDLE_FILES = ("threading.py", "queue.py", "selectors.py")  # parked worker threads / idle event loop
+
+
+def _fold(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler(threading.Thread):
+    """Counts the stacks of busy threads every `interval` seconds until stopped."""
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        super().__init__(name="profiler", daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.done = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        while not self.done.wait(self.interval):
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident != me and not frame.f_code.co_filename.endswith(IDLE_FILES):
+                    self.stacks[_fold(frame)] += 1
+
+    def stop(self):
+        self.done.set()
+        self.join()
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _token_matches(value, token):
+    """Whether a header value (str or bytes) is the operator token; never true while it's unset."""
+    if not token or not value:
+        return False
+    if isinstance(value, str):
+        value = value.encode("latin-1")
+    return hmac.compare_digest(value, token.encode())
+
+
+class ProfilerMiddleware:
+    """Tags every request for the slow-query log; profiles the ones opted in."""
+
+    def __init__(self, app, token=PROFILE_TOKEN, sample_rate=PROFILE_SAMPLE_RATE, profile_dir=PROFILE_DIR):
+        self.app = app
+        self.token = token
+        self.sample_rate = sample_rate
+        self.profile_dir = profile_dir
+
+    def _wanted(self, scope):
+        if _token_matches(dict(scope["headers"]).get(b"x-profile"), self.token):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = _current_scope.set(scope)
+        try:
+            if not self._wanted(scope):
+                return await self.app(scope, receive, send)
+            await self._profile(scope, receive, send)
+        finally:
+            _current_scope.reset(token)
+
+    async def _profile(self, scope, receive, send):
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+        profile_id = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{scope['method']}-{slug}"
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", []).append((b"x-profile-id", profile_id.encode()))
+            await send(message)
+
+        sampler = StackSampler()
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            # joining the sampler and writing the file both block; keep them off the event loop
+            await run_in_threadpool(sampler.stop)
+            await run_in_threadpool(sampler.write, os.path.join(self.profile_dir, f"{profile_id}.folded"))
+            log.info("🔬 %s took %.0f ms, %d samples: %s.folded", current_route(), elapsed, sampler.samples, profile_id)
+
+
+# -----------------------
+# Slow-query log
+# -----------------------
+slow_queries = deque(maxlen=SLOW_QUERY_KEEP)
+
+
+def _param_shape(parameters, executemany):
+    """Parameter names and types, never values."""
+    if executemany:
+        return f"{len(parameters)} x {_param_shape(parameters[0], False)}" if parameters else "0 rows"
+    if isinstance(parameters, dict):
+        return "(" + ", ".join(f"{k}: {type(v).__name__}" for k, v in parameters.items()) + ")"
+    return "(" + ", ".join(type(v).__name__ for v in parameters or ()) + ")"
+
+
+def install_slow_query_log(engine, threshold_ms=SLOW_QUERY_MS):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_start"] = time.perf_counter()
+        box = _query_count.get()
+        if box is not None:
+            box[0] += 1
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        ms = (time.perf_counter() - conn.info.pop("query_start")) * 1000
+        if ms < threshold_ms:
+            return
+        route = current_route()
+        if route is None:
+            # scheduler sweeps, cron jobs and benchmarks are expected to run long statements
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("🐢 %.0f ms in background job: %s %s", ms, " ".join(statement.split())[:MAX_STATEMENT_CHARS],
+                          _param_shape(parameters, executemany))
+            return
+        entry = {
+            "at": datetime.utcnow().isoformat(timespec="seconds"),
+            "ms": round(ms, 1),
+            "route": route,
+            "database": conn.engine.url.database,
+            "statement": " ".join(statement.split())[:MAX_STATEMENT_CHARS],
+            "params": _param_shape(parameters, executemany),
+        }
+        slow_queries.append(entry)
+        log.warning("🐢 %.0f ms in %s: %s %s", ms, route, entry["statement"], entry["params"])
+
+
+@router.get("/metrics/slow-queries")
+async def get_slow_queries(x_profile_token: Optional[str] = Header(None)):
+    if not PROFILE_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not _token_matches(x_profile_token, PROFILE_TOKEN):
+        raise HTTPException(status_code=403, detail="X-Profile-Token required")
+    return {"threshold_ms": SLOW_QUERY_MS, "queries": list(slow_queries)[::-1]}
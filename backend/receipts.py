@@ -0,0 +1,398 @@
+# backend/receipts.py
+"""Receipt attachments.
+
+Files are stored once per content under RECEIPT_DIR/blobs/<sha256[:2]>/<sha256>,
+so the same PDF uploaded for ten expenses (or by ten users) takes the disk
+space of one; receipt rows point at the hash. Uploads are the raw request
+body (Content-Type: the file's type, optional X-Filename header), streamed to
+a temp file in chunks while being hashed - never held in memory - then linked
+into place. Downloads go through FileResponse: Range requests, and sendfile
+on servers that support the ASGI pathsend extension.
+
+Image thumbnails are rendered by a process pool after the upload returns.
+Each user's receipts count against RECEIPT_QUOTA_BYTES (by their size, however
+they dedupe). Deleting an expense or a user drops their receipt rows and the
+files nothing else references; a crash can still strand a file, so run the
+sweep from cron too:
+
+    python -m backend.receipts [grace_seconds]
+"""
+import hashlib
+import importlib.util
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+import anyio
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from backend import models
+from backend.database import get_db, user_data_engines
+from backend.thumbnails import make_thumbnail
+
+router = APIRouter()
+log = logging.getLogger(__name__)
+
+RECEIPT_DIR = os.getenv("RECEIPT_DIR", "receipts")
+RECEIPT_MAX_BYTES = int(os.getenv("RECEIPT_MAX_BYTES", str(10 * 2**20)))
+RECEIPT_QUOTA_BYTES = int(os.getenv("RECEIPT_QUOTA_BYTES", str(200 * 2**20)))  # per user
+RECEIPT_GC_GRACE_SECONDS = int(os.getenv("RECEIPT_GC_GRACE_SECONDS", "3600"))  # spares in-flight uploads
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))  # 0 disables thumbnails
+THUMBNAILS_ENABLED = THUMBNAIL_WORKERS > 0 and importlib.util.find_spec("PIL") is not None
+CONTENT_TYPES = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp", "application/pdf": ".pdf"}
+THUMBNAIL_TYPES = {"image/jpeg", "image/png", "image/webp"}
+REFERENCE_CHUNK = 500  # hashes per IN (...) when sweeping
+
+receipts = models.Receipt.__table__
+
+
+# -----------------------
+# Content-addressed storage
+# -----------------------
+def blob_path(sha: str) -> str:
+    return os.path.join(RECEIPT_DIR, "blobs", sha[:2], sha)
+
+
+def thumbnail_path(sha: str) -> str:
+    return os.path.join(RECEIPT_DIR, "thumbs", sha[:2], f"{sha}.jpg")
+
+
+def _upload_dir() -> str:
+    path = os.path.join(RECEIPT_DIR, "tmp")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+async def _receive(request: Request, limit: int, too_large: str):
+    """Stream the request body to a temp file; returns (temp path, sha256, size)."""
+    fd, tmp = tempfile.mkstemp(dir=_upload_dir())
+    os.close(fd)
+    digest, size = hashlib.sha256(), 0
+    try:
+        async with await anyio.open_file(tmp, "wb") as f:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > limit:
+                    raise HTTPException(status_code=413, detail=too_large)
+                digest.update(chunk)
+                await f.write(chunk)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return tmp, digest.hexdigest(), size
+
+
+def _link_blob(tmp: str, sha: str):
+    """Make `tmp`'s content available as the blob for `sha` (a no-op when it's already stored)."""
+    path = blob_path(sha)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        os.link(tmp, path)
+    except FileExistsError:
+        os.utime(path)  # the sweep spares recently touched files
+
+
+def _referenced(shas):
+    """The subset of `shas` some receipt row on any database still points at."""
+    found = set()
+    shas = list(shas)
+    for bind in user_data_engines():
+        with bind.connect() as conn:
+            for i in range(0, len(shas), REFERENCE_CHUNK):
+                chunk = shas[i:i + REFERENCE_CHUNK]
+                found.update(conn.execute(select(receipts.c.sha256).where(receipts.c.sha256.in_(chunk)).distinct()).scalars())
+    return found
+
+
+def _remove_blob(sha: str) -> int:
+    removed = 0
+    for path in (blob_path(sha), thumbnail_path(sha)):
+        try:
+            size = os.path.getsize(path)
+            os.unlink(path)
+            removed += size
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def release_blobs(shas):
+    """Delete the stored files of `shas` that no receipt references any more.
+
+    Call after the transaction that dropped the receipt rows has committed.
+    An upload racing with this re-links its file after its own commit.
+    """
+    shas = set(shas)
+    if not shas:
+        return
+    for sha in shas - _referenced(shas):
+        _remove_blob(sha)
+
+
+def detach_receipts(conn, user_id: int, expense_ids=None):
+    """Delete a user's receipt rows (all of them, or those of `expense_ids`); returns their hashes.
+
+    Works on a Session or a Connection, inside the deleting transaction; pass the
+    result to release_blobs() once it commits.
+    """
+    where = [receipts.c.user_ID == user_id]
+    if expense_ids is not None:
+        if not expense_ids:
+            return []
+        where.append(receipts.c.expense_ID.in_(sorted(expense_ids)))
+    shas = conn.execute(select(receipts.c.sha256).where(*where)).scalars().all()
+    if shas:
+        conn.execute(delete(receipts).where(*where))
+    return shas
+
+
+def _prefix_dirs(kind: str):
+    root = os.path.join(RECEIPT_DIR, kind)
+    if not os.path.isdir(root):
+        return []
+    return sorted(entry.path for entry in os.scandir(root) if entry.is_dir())
+
+
+def collect_garbage(grace: int = RECEIPT_GC_GRACE_SECONDS):
+    """Sweep files no receipt references and abandoned uploads older than `grace` seconds.
+
+    Returns (files removed, bytes freed).
+    """
+    cutoff = time.time() - grace
+    files = freed = 0
+    for prefix in _prefix_dirs("blobs"):
+        old = [entry.name for entry in os.scandir(prefix) if entry.is_file() and entry.stat().st_mtime < cutoff]
+        for sha in set(old) - _referenced(old):
+            freed += _remove_blob(sha)
+            files += 1
+    for prefix in _prefix_dirs("thumbs"):
+        for entry in os.scandir(prefix):
+            sha = entry.name.split(".")[0]
+            if entry.stat().st_mtime < cutoff and not os.path.exists(blob_path(sha)):
+                freed += entry.stat().st_size
+                os.unlink(entry.path)
+                files += 1
+    for entry in os.scandir(_upload_dir()):
+        if entry.stat().st_mtime < cutoff:
+            freed += entry.stat().st_size
+            os.unlink(entry.path)
+            files += 1
+    return files, freed
+
+
+# -----------------------
+# Thumbnails
+# -----------------------
+_thumbnail_pool = None
+_pool_lock = threading.Lock()
+
+
+def _pool():
+    global _thumbnail_pool
+    with _pool_lock:
+        if _thumbnail_pool is None:
+            # spawn: forking a process with live threads and DB connections isn't safe
+            _thumbnail_pool = ProcessPoolExecutor(THUMBNAIL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _thumbnail_pool
+
+
+def _thumbnail_done(future):
+    if future.exception() is not None:
+        log.warning("🖼️ thumbnail failed: %s", future.exception())
+
+
+def schedule_thumbnail(sha: str, content_type: str):
+    """Render the thumbnail in the process pool; the upload doesn't wait for it."""
+    if not THUMBNAILS_ENABLED or content_type not in THUMBNAIL_TYPES or os.path.exists(thumbnail_path(sha)):
+        return
+    _pool().submit(make_thumbnail, blob_path(sha), thumbnail_path(sha)).add_done_callback(_thumbnail_done)
+
+
+def shutdown_thumbnails():
+    global _thumbnail_pool
+    with _pool_lock:
+        if _thumbnail_pool is not None:
+            _thumbnail_pool.shutdown(wait=False, cancel_futures=True)
+            _thumbnail_pool = None
+
+
+# -----------------------
+# Queries
+# -----------------------
+def _receipt_for(db: Session, expense_id: int):
+    # no user_ID to route on: a sharded session asks every shard
+    return db.execute(select(models.Receipt).where(models.Receipt.expense_ID == expense_id)).scalars().first()
+
+
+def quota_used(db: Session, user_id: int, except_expense_id: int = None, lock: bool = False) -> int:
+    q = select(func.coalesce(func.sum(receipts.c.size), 0)).where(receipts.c.user_ID == user_id)
+    if except_expense_id is not None:
+        q = q.where(receipts.c.expense_ID != except_expense_id)
+    if lock:
+        # InnoDB locks the user's range of ix_receipt_user, so a concurrent upload waits here
+        q = q.with_for_update()
+    return int(db.execute(q).scalar())
+
+
+def _attach(db: Session, user_id: int, expense_id: int, sha: str, size: int, content_type: str, filename: Optional[str]):
+    """Create or replace the expense's receipt row; returns (receipt, hash it replaced, quota used).
+
+    The quota is checked again in this transaction: the check before the upload
+    can't see receipts attached by uploads that were streaming at the same time.
+    """
+    used = quota_used(db, user_id, expense_id, lock=True) + size
+    if used > RECEIPT_QUOTA_BYTES:
+        db.rollback()
+        raise HTTPException(status_code=413, detail=f"Receipt storage quota of {RECEIPT_QUOTA_BYTES // 2**20} MB exceeded")
+    receipt = db.execute(
+        select(models.Receipt).where(models.Receipt.user_ID == user_id, models.Receipt.expense_ID == expense_id)
+    ).scalars().first()
+    replaced = receipt.sha256 if receipt is not None else None
+    if receipt is None:
+        receipt = models.Receipt(expense_ID=expense_id, user_ID=user_id)
+        db.add(receipt)
+    receipt.sha256, receipt.size, receipt.content_type, receipt.filename = sha, size, content_type, filename
+    db.commit()
+    db.refresh(receipt)
+    return receipt, replaced, used
+
+
+def _describe(receipt):
+    return {
+        "expense_ID": receipt.expense_ID,
+        "sha256": receipt.sha256,
+        "size": receipt.size,
+        "content_type": receipt.content_type,
+        "filename": receipt.filename,
+        "uploaded_at": receipt.uploaded_at,
+    }
+
+
+# -----------------------
+# Endpoints
+# -----------------------
+@router.post("/expenses/{expense_id}/receipt", status_code=201)
+async def upload_receipt(
+    expense_id: int,
+    request: Request,
+    x_filename: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    content_type = request.headers.get("content-type", "").partition(";")[0].strip().lower()
+    if content_type not in CONTENT_TYPES:
+        raise HTTPException(status_code=415, detail=f"Receipts must be one of: {', '.join(CONTENT_TYPES)}")
+    too_large = f"Receipts are limited to {RECEIPT_MAX_BYTES // 2**20} MB"
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > RECEIPT_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=too_large)
+
+    expense = await run_in_threadpool(db.get, models.Expense, expense_id)
+    if expense is None:
+        raise HTTPException(status_code=404, detail="Expense not found")
+    user_id = expense.user_ID
+    used = await run_in_threadpool(quota_used, db, user_id, expense_id)
+    # end the read transaction: its pooled connection isn't held while a slow client uploads
+    await run_in_threadpool(db.rollback)
+    limit = RECEIPT_MAX_BYTES
+    if RECEIPT_QUOTA_BYTES - used < limit:
+        limit = RECEIPT_QUOTA_BYTES - used
+        too_large = f"Receipt storage quota of {RECEIPT_QUOTA_BYTES // 2**20} MB exceeded"
+
+    tmp, sha, size = await _receive(request, limit, too_large)
+    try:
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Empty upload")
+        filename = None
+        if x_filename:
+            filename = os.path.basename(x_filename.replace("\\", "/"))[:255] or None
+        await run_in_threadpool(_link_blob, tmp, sha)
+        try:
+            receipt, replaced, used = await run_in_threadpool(
+                _attach, db, user_id, expense_id, sha, size, content_type, filename,
+            )
+        except IntegrityError:
+            await run_in_threadpool(db.rollback)
+            await run_in_threadpool(release_blobs, [sha])  # unless another receipt shares it
+            raise HTTPException(status_code=409, detail="Another receipt upload for this expense is in progress")
+        except HTTPException:
+            await run_in_threadpool(release_blobs, [sha])
+            raise
+        # a concurrent release_blobs() may have removed the file before our row committed
+        await run_in_threadpool(_link_blob, tmp, sha)
+    finally:
+        os.unlink(tmp)
+    if replaced and replaced != sha:
+        await run_in_threadpool(release_blobs, [replaced])
+    schedule_thumbnail(sha, content_type)
+    return {
+        "message": "Receipt uploaded",
+        "receipt": _describe(receipt),
+        "quota": {"used": used, "limit": RECEIPT_QUOTA_BYTES},
+    }
+
+
+@router.get("/expenses/{expense_id}/receipt")
+def download_receipt(expense_id: int, db: Session = Depends(get_db)):
+    receipt = _receipt_for(db, expense_id)
+    if receipt is None or not os.path.exists(blob_path(receipt.sha256)):
+        raise HTTPException(status_code=404, detail="No receipt for this expense")
+    return FileResponse(
+        blob_path(receipt.sha256),
+        media_type=receipt.content_type,
+        filename=receipt.filename or f"receipt-{expense_id}{CONTENT_TYPES.get(receipt.content_type, '')}",
+        content_disposition_type="inline",
+        headers={"ETag": f'"{receipt.sha256}"', "Cache-Control": "private, no-cache"},
+    )
+
+
+@router.get("/expenses/{expense_id}/receipt/thumbnail")
+def download_receipt_thumbnail(expense_id: int, db: Session = Depends(get_db)):
+    receipt = _receipt_for(db, expense_id)
+    if receipt is None:
+        raise HTTPException(status_code=404, detail="No receipt for this expense")
+    path = thumbnail_path(receipt.sha256)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="No thumbnail for this receipt (yet)")
+    return FileResponse(
+        path, media_type="image/jpeg",
+        headers={"ETag": f'"{receipt.sha256}-thumb"', "Cache-Control": "private, no-cache"},
+    )
+
+
+@router.delete("/expenses/{expense_id}/receipt")
+def delete_receipt(expense_id: int, db: Session = Depends(get_db)):
+    receipt = _receipt_for(db, expense_id)
+    if receipt is None:
+        raise HTTPException(status_code=404, detail="No receipt for this expense")
+    shas = detach_receipts(db, receipt.user_ID, [expense_id])
+    db.commit()
+    release_blobs(shas)
+    return {"message": "Receipt deleted"}
+
+
+# -----------------------
+# CLI
+# -----------------------
+def main(argv):
+    from backend.database import engine, shard_router
+
+    grace = int(argv[0]) if argv else RECEIPT_GC_GRACE_SECONDS
+    models.Base.metadata.create_all(bind=engine)
+    if shard_router:
+        shard_router.setup(models.Base.metadata)
+    files, freed = collect_garbage(grace)
+    print(f"✅ removed {files} unreferenced receipt files ({freed / 2**20:.1f} MB) older than {grace}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
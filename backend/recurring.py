@@ -0,0 +1,218 @@
+# backend/recurring.py
+import calendar
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select, update, bindparam
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from backend import crud, models, schemas
+from backend.database import get_db, shard_router, user_data_engines
+from backend.versioning import bump_data_version, user_etag, versioned_transaction
+from backend.writes import insert_expenses
+
+log = logging.getLogger(__name__)
+
+router = APIRouter()
+
+RECURRING_TICK_SECONDS = float(os.getenv("RECURRING_TICK_SECONDS", "60"))  # 0 disables the scheduler
+RECURRING_BATCH_SIZE = 500  # templates claimed per sweep
+MAX_CATCHUP = 36  # occurrences per template per sweep when far behind
+
+templates = models.RecurringExpense.__table__
+
+
+# -----------------------
+# Schedule arithmetic
+# -----------------------
+def next_occurrence(current: datetime, frequency: str, interval: int, anchor_day: int) -> datetime:
+    """The occurrence after `current`; monthly/yearly dates clamp to month end (31st -> 28/29/30)."""
+    if frequency == "daily":
+        return current + timedelta(days=interval)
+    if frequency == "weekly":
+        return current + timedelta(weeks=interval)
+    months = current.month - 1 + interval * (12 if frequency == "yearly" else 1)
+    year, month = current.year + months // 12, months % 12 + 1
+    return current.replace(year=year, month=month, day=min(anchor_day, calendar.monthrange(year, month)[1]))
+
+
+def reschedule(start_date: datetime, frequency: str, interval: int, end_date, not_before: datetime):
+    """First occurrence at or after `not_before`, counted from the start_date anchor, and whether it's <= end_date."""
+    due = start_date
+    while due < not_before:
+        due = next_occurrence(due, frequency, interval, start_date.day)
+    return due, end_date is None or due <= end_date
+
+
+def _due_instances(t, now):
+    """Expense rows due for template `t` up to `now`, plus its new next_due_at/active."""
+    rows = []
+    due = t.next_due_at
+    while due <= now and (t.end_date is None or due <= t.end_date) and len(rows) < MAX_CATCHUP:
+        rows.append({
+            "user_ID": t.user_ID,
+            "category_ID": t.category_ID,
+            "payment_ID": t.payment_ID,
+            "amount": t.amount,
+            "description": t.description,
+            "date": due,
+            "recurring_ID": t.recurring_ID,
+        })
+        due = next_occurrence(due, t.frequency, t.interval, t.start_date.day)
+    active = t.end_date is None or due <= t.end_date
+    return rows, due, active
+
+
+# -----------------------
+# Materialization sweep
+# -----------------------
+def _sweep(bind, now):
+    """Claim one batch of due templates and materialize them in a single transaction.
+
+    Returns (templates advanced, expenses created).
+    """
+    with versioned_transaction(bind) as (conn, touched):
+        due = conn.execute(
+            select(templates)
+            .where(templates.c.active.is_(True), templates.c.next_due_at <= now)
+            .order_by(templates.c.next_due_at)
+            .limit(RECURRING_BATCH_SIZE)
+            # concurrent workers on MySQL skip rows another worker already holds
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not due:
+            return 0, 0
+
+        expenses, advances = [], []
+        for t in due:
+            if shard_router is not None and shard_router.lookup(t.user_ID)[1] == "moving":
+                continue  # picked up on the user's new shard next tick
+            rows, next_due, active = _due_instances(t, now)
+            expenses.extend(rows)
+            advances.append({"r_id": t.recurring_ID, "old_due": t.next_due_at, "new_due": next_due, "still_active": active})
+
+        if not advances:
+            return 0, 0
+        if expenses:
+            insert_expenses(conn, expenses)
+            touched.update(row["user_ID"] for row in expenses)
+        conn.execute(
+            update(templates)
+            .where(templates.c.recurring_ID == bindparam("r_id"), templates.c.next_due_at == bindparam("old_due"))
+            .values(next_due_at=bindparam("new_due"), active=bindparam("still_active")),
+            advances,
+        )
+        return len(advances), len(expenses)
+
+
+def materialize_due(bind, now=None, max_retries=3):
+    """Create every due recurring expense, sweeping in indexed batches until none remain.
+
+    Safe to run from several workers at once: the unique (recurring_ID, date) key
+    rejects an instance another worker already created, and the loser's batch
+    rolls back and re-reads the advanced schedule.
+    """
+    now = now or datetime.utcnow()
+    created, conflicts = 0, 0
+    while True:
+        try:
+            advanced, n = _sweep(bind, now)
+        except IntegrityError:
+            conflicts += 1
+            if conflicts > max_retries:
+                raise
+            continue
+        if advanced == 0:
+            return created
+        created += n
+
+
+def _scheduler_loop(stop: threading.Event):
+    while not stop.wait(RECURRING_TICK_SECONDS):
+        for bind in user_data_engines():
+            try:
+                created = materialize_due(bind)
+                if created:
+                    log.info("materialized %d recurring expenses on %s", created, bind.url.database)
+            except Exception:
+                log.exception("recurring expense sweep failed")
+
+
+def start_scheduler():
+    """Start the background sweeper; returns the Event that stops it (None if disabled)."""
+    if RECURRING_TICK_SECONDS <= 0:
+        return None
+    stop = threading.Event()
+    threading.Thread(target=_scheduler_loop, args=(stop,), name="recurring-scheduler", daemon=True).start()
+    return stop
+
+
+# -----------------------
+# Template CRUD
+# -----------------------
+@router.get("/recurring/{user_id}", dependencies=[Depends(user_etag)])
+def get_user_recurring(user_id: int, db: Session = Depends(get_db)):
+    return crud.list_recurring_by_user(db, user_id)
+
+
+@router.post("/recurring/add", status_code=status.HTTP_201_CREATED)
+def add_recurring(template: schemas.RecurringExpenseCreate, db: Session = Depends(get_db)):
+    if template.interval < 1:
+        raise HTTPException(status_code=400, detail="interval must be at least 1")
+    if template.end_date and template.end_date < template.start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    values = template.dict()
+    start = datetime.combine(values.pop("start_date"), datetime.min.time())
+    end = values.pop("end_date")
+    new_template = models.RecurringExpense(
+        **values,
+        start_date=start,
+        end_date=datetime.combine(end, datetime.min.time()) if end else None,
+        next_due_at=start,
+    )
+    db.add(new_template)
+    bump_data_version(db, [new_template.user_ID])
+    db.commit()
+    db.refresh(new_template)
+    return {"message": "Recurring expense created successfully", "recurring": new_template}
+
+
+@router.put("/recurring/{recurring_id}")
+def update_recurring(recurring_id: int, update: schemas.RecurringExpenseUpdate, db: Session = Depends(get_db)):
+    template = crud.get_recurring(db, recurring_id)
+    if not template:
+        raise HTTPException(status_code=404, detail="Recurring expense not found")
+    changes = update.dict(exclude_unset=True)
+    if changes.get("active", False) is None:
+        del changes["active"]
+    if changes.get("end_date") is not None:
+        changes["end_date"] = datetime.combine(changes["end_date"], datetime.min.time())
+        if changes["end_date"] < template.start_date:
+            raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    if changes.keys() & {"end_date", "active"}:
+        # the sweeper deactivates a template whose next occurrence is past end_date
+        exhausted = not template.active and template.end_date is not None and template.next_due_at > template.end_date
+        # an exhausted template comes back once end_date covers its next occurrence; a paused one only when asked
+        wants_active = changes.get("active", template.active or exhausted)
+        not_before = template.next_due_at
+        if wants_active and not template.active and not exhausted:
+            not_before = max(not_before, datetime.utcnow())  # resuming: don't backfill the pause
+        changes["next_due_at"], in_range = reschedule(
+            template.start_date, template.frequency, template.interval, changes.get("end_date", template.end_date), not_before,
+        )
+        changes["active"] = wants_active and in_range
+    return {"message": "Recurring expense updated", "recurring": crud.update_row(db, template, changes)}
+
+
+@router.delete("/recurring/{recurring_id}")
+def delete_recurring(recurring_id: int, db: Session = Depends(get_db)):
+    """Stops future instances; expenses already created are kept."""
+    template = crud.get_recurring(db, recurring_id)
+    if not template:
+        raise HTTPException(status_code=404, detail="Recurring expense not found")
+    db.delete(template)
+    bump_data_version(db, [template.user_ID])
+    db.commit()
+    return {"message": "Recurring expense deleted successfully"}
@@ -0,0 +1,395 @@
+# backend/replay.py
+"""Replay captured traffic (see traffic.py) against a local instance, and compare two runs.
+
+    python -m backend.replay run traffic-*.jsonl.gz --out before.json [--target URL] [--speed 1] [--limit N]
+    python -m backend.replay compare before.json after.json
+
+Start the target on a fresh database with RATE_LIMITS=0 (every captured user
+arrives from this one IP) and TRAFFIC_QUERY_COUNTS=1 (statement counts come
+back in X-Query-Count). Replay the same capture against each build; both runs
+send identical requests.
+
+`run` first creates one user per captured user bucket and seeds it with
+SEED_EXPENSES expenses, SEED_BUDGETS budgets and a recurring expense, from a
+fixed random seed. Then it re-issues every request at its captured offset
+divided by --speed (0: back to back, as fast as REPLAY_WORKERS allow).
+Shapes become concrete requests deterministically: the bucket's user stands in
+for the caller, pseudonymous ids map onto that user's seeded rows, strings
+become text of the same length and bodies are rebuilt from their shapes.
+Pagination and sync cursors can't be replayed, so those requests go out
+without them (first page, full sync). Account deletion and /seed-data are
+skipped.
+
+`compare` prints p50/p95/p99 latency and statements per request by route and
+exits 1 when a route's p95 grew by more than REGRESSION_P95 or it ran
+REGRESSION_QUERIES more statements per request.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from urllib.parse import urlparse
+import requests
+from backend.schemas import BATCH_MAX_OPERATIONS
+from backend.traffic import read_traces
+
+TARGET = "http://127.0.0.1:8000"
+REPLAY_WORKERS = 32
+REPLAY_SEED = 1234
+REPLAY_PASSWORD = "replay-password"
+SEED_EXPENSES = 200
+SEED_BUDGETS = 3
+SEED_MONTHS = 18  # seeded expenses are spread over this many months back from today
+TIMEOUT = 30
+CURSOR_PARAMS = {"after", "since"}
+SKIP_ROUTES = {"DELETE /users/{user_id}", "POST /seed-data"}
+REGRESSION_P95 = 0.20  # +20%
+REGRESSION_QUERIES = 0.5  # more statements per request; cache hits make the count vary a little
+MIN_SAMPLES = 20  # routes with fewer requests in either run are shown but never flagged
+WORDS = "rent groceries fuel netflix coffee lunch taxi pharmacy books gym electricity internet movie gift".split()
+
+
+# -----------------------
+# Synthetic values
+# -----------------------
+def _text(length, rng):
+    words = []
+    while sum(len(w) + 1 for w in words) <= length:
+        words.append(rng.choice(WORDS))
+    return " ".join(words)[:length]
+
+
+def _day(rng):
+    return date.today() - timedelta(days=rng.randrange(SEED_MONTHS * 30))
+
+
+# -----------------------
+# Setup
+# -----------------------
+def _contact(run_id, n):
+    # contact numbers are unique, at most 15 characters
+    return f"{int(run_id, 16):08d}{n:07d}"
+
+
+class ReplayUser:
+    def __init__(self, name, contact):
+        self.name = name
+        self.contact = contact
+        self.user_id = None
+        self.token = None
+        self.rows = {"expense": [], "budget": [], "recurring": []}
+
+    def headers(self):
+        return {"Authorization": f"Bearer {self.token}"} if self.token else {}
+
+    def pick(self, kind, alias):
+        """The seeded row a captured pseudonym stands for: same pseudonym, same row."""
+        rows = self.rows.get(kind) or [0]
+        return rows[int(alias.lstrip("#"), 16) % len(rows)]
+
+
+def _check(res):
+    if res.status_code >= 400:
+        raise RuntimeError(f"{res.request.method} {res.request.url}: {res.status_code} {res.text[:200]}")
+    return res.json()
+
+
+def _seed_user(session, target, user, reference, seed):
+    """Register, log in and seed one stand-in user."""
+    rng = random.Random(seed)
+    _check(session.post(f"{target}/auth/register", json={
+        "user_name": user.name, "password": REPLAY_PASSWORD,
+        "user_email": f"{user.name}@example.com", "contact_num_1": user.contact,
+    }, timeout=TIMEOUT))
+    login = _check(session.post(f"{target}/auth/login", json={"username": user.name, "password": REPLAY_PASSWORD}, timeout=TIMEOUT))
+    user.user_id, user.token = login["user_id"], login["access_token"]
+
+    categories, methods = reference
+    operations = [
+        {"op": "create", "entity": "expense", "data": {
+            "category_ID": rng.choice(categories), "payment_ID": rng.choice(methods),
+            "amount": round(rng.uniform(20, 3000), 2), "date": f"{_day(rng).isoformat()}T{rng.randrange(24):02d}:00:00",
+            "description": _text(rng.randrange(4, 30), rng),
+        }}
+        for _ in range(SEED_EXPENSES)
+    ]
+    for _ in range(SEED_BUDGETS):
+        start = _day(rng)
+        operations.append({"op": "create", "entity": "budget", "data": {
+            "category_ID": rng.choice(categories), "amount_limit": round(rng.uniform(1000, 20000), 2),
+            "start_date": start.isoformat(), "end_date": (start + timedelta(days=30)).isoformat(),
+        }})
+    for i in range(0, len(operations), BATCH_MAX_OPERATIONS):
+        chunk = operations[i:i + BATCH_MAX_OPERATIONS]
+        results = _check(session.post(f"{target}/batch", json={"user_ID": user.user_id, "operations": chunk},
+                                      headers=user.headers(), timeout=TIMEOUT))["results"]
+        for op, result in zip(chunk, results):
+            user.rows[op["entity"]].append(result["id"])
+
+    recurring = _check(session.post(f"{target}/recurring/add", json={
+        "user_ID": user.user_id, "category_ID": rng.choice(categories), "payment_ID": rng.choice(methods),
+        "amount": 999.0, "description": "rent", "frequency": "monthly",
+        "start_date": (date.today() + timedelta(days=30)).isoformat(),
+    }, headers=user.headers(), timeout=TIMEOUT))
+    user.rows["recurring"].append(recurring["recurring"]["recurring_ID"])
+
+
+def prepare(session, target, buckets, workers):
+    """Stand-in users by captured bucket, seeded on the target."""
+    _check(session.post(f"{target}/seed-data", timeout=TIMEOUT))
+    reference = (
+        [c["category_ID"] for c in _check(session.get(f"{target}/categories", timeout=TIMEOUT))],
+        [p["payment_ID"] for p in _check(session.get(f"{target}/payment-methods", timeout=TIMEOUT))],
+    )
+    run_id = uuid.uuid4().hex[:6]  # user names must be new on every run against the same database
+    users = {bucket: ReplayUser(f"replay-{run_id}-{bucket}", _contact(run_id, n)) for n, bucket in enumerate(buckets)}
+    with ThreadPoolExecutor(workers) as pool:
+        for future in [pool.submit(_seed_user, session, target, user, reference, REPLAY_SEED + bucket)
+                       for bucket, user in users.items()]:
+            future.result()
+    return users, reference, run_id
+
+
+# -----------------------
+# Requests from shapes
+# -----------------------
+def _value(shape, key, user, reference, rng, entity=None):
+    if isinstance(shape, dict):
+        hint = shape.get("entity") if isinstance(shape.get("entity"), str) else entity
+        built = {k: _value(v, k, user, reference, rng, hint) for k, v in shape.items()}
+        if isinstance(built.get("start_date"), str) and isinstance(built.get("end_date"), str):
+            built["end_date"] = (date.fromisoformat(built["start_date"][:10]) + timedelta(days=30)).isoformat()
+        return built
+    if isinstance(shape, list):
+        count, item = shape
+        return [_value(item, key, user, reference, rng, entity) for _ in range(count)]
+    if not isinstance(shape, str):
+        return shape  # numbers, booleans and nulls were kept as they were
+    if shape == "user":
+        return user.user_id
+    if shape.startswith("#"):
+        kind = entity if key == "id" else key[:-3].lower()
+        return user.pick(kind, shape)
+    if shape == "number":
+        return round(rng.uniform(20, 3000), 2)
+    if shape == "date":
+        return _day(rng).isoformat()
+    if shape == "datetime":
+        return f"{_day(rng).isoformat()}T12:00:00"
+    if shape.startswith("str:"):
+        return _text(int(shape[4:]), rng)
+    return shape  # an enum value
+
+
+def materialize(entry, user, reference, rng, run_id, index):
+    """(method, path, kwargs for requests) for a captured entry."""
+    path = entry["r"].replace("{user_id}", str(user.user_id))
+    for name, shape in entry["p"].items():
+        if shape.startswith("#"):
+            value = user.pick(name[:-3], shape)
+        else:
+            value = _text(int(shape[4:]), rng) if shape.startswith("str:") else shape
+        path = path.replace(f"{{{name}}}", str(value))
+    params = {
+        k: _text(int(v[4:]), rng) if v.startswith("str:") else v
+        for k, v in entry["q"].items() if k not in CURSOR_PARAMS
+    }
+    kwargs = {"params": params, "headers": user.headers()}
+    if entry["r"] == "/auth/login":
+        kwargs["json"] = {"username": user.name, "password": REPLAY_PASSWORD}
+    elif entry["r"] == "/auth/register":
+        name = f"replay-{run_id}-new-{index}"
+        kwargs["json"] = {
+            "user_name": name, "password": REPLAY_PASSWORD,
+            "user_email": f"{name}@example.com", "contact_num_1": _contact(run_id, 1_000_000 + index),
+        }
+    elif "b" in entry:
+        kwargs["json"] = _value(entry["b"], None, user, reference, rng)
+    elif "raw" in entry:
+        size, content_type = entry["raw"]
+        kwargs["data"] = rng.randbytes(size)
+        kwargs["headers"] = {**kwargs["headers"], "Content-Type": content_type}
+    return entry["m"], path, kwargs
+
+
+# -----------------------
+# Replay
+# -----------------------
+def replay(entries, target=TARGET, speed=1.0, workers=REPLAY_WORKERS):
+    """Re-issue `entries` against `target`; returns the run as a dict (see compare)."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    skipped = Counter(f"{e['m']} {e['r']}" for e in entries if f"{e['m']} {e['r']}" in SKIP_ROUTES)
+    entries = [e for e in entries if f"{e['m']} {e['r']}" not in SKIP_ROUTES]
+    users, reference, run_id = prepare(session, target, sorted({e["u"] for e in entries} - {None}) or [0], workers)
+    default_user = next(iter(users.values()))
+
+    results = [None] * len(entries)
+
+    def send(index, route, scheduled, method, path, kwargs):
+        start = time.perf_counter()
+        try:
+            res = session.request(method, target + path, timeout=TIMEOUT, **kwargs)
+            status, queries = res.status_code, res.headers.get("X-Query-Count")
+        except requests.RequestException:
+            status, queries = None, None
+        ms = (time.perf_counter() - start) * 1000
+        results[index] = {
+            "route": route, "status": status, "ms": round(ms, 1),
+            "n": int(queries) if queries is not None else None,
+            "late": round(max(0.0, start - scheduled) * 1000, 1),
+        }
+
+    first = entries[0]["t"] if entries else 0
+    began = time.perf_counter()
+    # a bounded pool stalls the schedule instead of opening unbounded connections
+    slots = threading.BoundedSemaphore(workers * 4)
+    with ThreadPoolExecutor(workers) as pool:
+        for index, entry in enumerate(entries):
+            # per-request seed: the same request every run, whatever the thread timing
+            rng = random.Random(f"{REPLAY_SEED}:{index}")
+            user = users.get(entry["u"], default_user)
+            method, path, kwargs = materialize(entry, user, reference, rng, run_id, index)
+            scheduled = began + (entry["t"] - first) / speed if speed else time.perf_counter()
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            slots.acquire()
+            future = pool.submit(send, index, f"{entry['m']} {entry['r']}", scheduled, method, path, kwargs)
+            future.add_done_callback(lambda _: slots.release())
+    elapsed = time.perf_counter() - began
+
+    return {
+        "target": target,
+        "speed": speed,
+        "captured_seconds": round(entries[-1]["t"] - first, 1) if entries else 0,
+        "elapsed_seconds": round(elapsed, 1),
+        "skipped": dict(skipped),
+        "results": results,
+    }
+
+
+# -----------------------
+# Compare
+# -----------------------
+def percentile(values, q):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))]
+
+
+def summarize(run):
+    """Route -> {count, errors, p50, p95, p99, queries}."""
+    by_route = defaultdict(list)
+    for r in run["results"]:
+        by_route[r["route"]].append(r)
+    summary = {}
+    for route, rows in by_route.items():
+        ok = sorted(r["ms"] for r in rows if r["status"] is not None and r["status"] < 500)
+        counted = [r["n"] for r in rows if r["n"] is not None]
+        summary[route] = {
+            "count": len(rows),
+            "errors": sum(1 for r in rows if r["status"] is None or r["status"] >= 500),
+            "p50": percentile(ok, 50),
+            "p95": percentile(ok, 95),
+            "p99": percentile(ok, 99),
+            "queries": sum(counted) / len(counted) if counted else None,
+        }
+    return summary
+
+
+def _ms(value):
+    return f"{value:8.1f}" if value is not None else f"{'-':>8}"
+
+
+def compare(before, after, threshold=REGRESSION_P95):
+    """Print both runs' latencies and statement counts by route; returns the regressed routes."""
+    a, b = summarize(before), summarize(after)
+    regressions = []
+    print(f"{'route':<48} {'n':>6} {'p50 ms':>17} {'p95 ms':>17} {'p99 ms':>17} {'queries':>13}  errors")
+    for route in sorted(set(a) | set(b)):
+        x, y = a.get(route), b.get(route)
+        if x is None or y is None:
+            print(f"{route:<48} only in {'before' if y is None else 'after'}")
+            continue
+        flags = []
+        if min(x["count"], y["count"]) >= MIN_SAMPLES and x["p95"] and y["p95"] and y["p95"] > x["p95"] * (1 + threshold):
+            flags.append(f"p95 +{(y['p95'] / x['p95'] - 1) * 100:.0f}%")
+        if x["queries"] is not None and y["queries"] is not None and y["queries"] >= x["queries"] + REGRESSION_QUERIES:
+            flags.append("more queries")
+        if flags:
+            regressions.append((route, flags))
+        queries = (f"{x['queries']:5.1f} →{y['queries']:5.1f}" if x["queries"] is not None and y["queries"] is not None
+                   else f"{'-':>13}")
+        print(
+            f"{route:<48} {y['count']:>6} {_ms(x['p50'])}→{_ms(y['p50'])} {_ms(x['p95'])}→{_ms(y['p95'])} "
+            f"{_ms(x['p99'])}→{_ms(y['p99'])} {queries}  {x['errors']}→{y['errors']}"
+            + (f"  ⚠️ {', '.join(flags)}" if flags else "")
+        )
+    return regressions
+
+
+# -----------------------
+# CLI
+# -----------------------
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m backend.replay")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="replay captured traffic against a local instance")
+    run.add_argument("captures", nargs="+")
+    run.add_argument("--out", required=True)
+    run.add_argument("--target", default=TARGET)
+    run.add_argument("--speed", type=float, default=1.0, help="1: captured pace, 2: twice as fast, 0: back to back")
+    run.add_argument("--limit", type=int, help="replay only the first N requests")
+    run.add_argument("--workers", type=int, default=REPLAY_WORKERS)
+    run.add_argument("--allow-remote", action="store_true", help="the replay writes: only local targets by default")
+    cmp = commands.add_parser("compare", help="compare two runs of the same capture")
+    cmp.add_argument("before")
+    cmp.add_argument("after")
+    cmp.add_argument("--threshold", type=float, default=REGRESSION_P95)
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        with open(args.before) as f:
+            before = json.load(f)
+        with open(args.after) as f:
+            after = json.load(f)
+        regressions = compare(before, after, args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} route(s) regressed")
+            return 1
+        print("✅ no regressions")
+        return 0
+
+    if urlparse(args.target).hostname not in ("127.0.0.1", "localhost", "::1") and not args.allow_remote:
+        print(f"❌ {args.target} isn't local; the replay registers users and writes data (--allow-remote to proceed)")
+        return 2
+    entries = read_traces(args.captures)[:args.limit]
+    if not entries:
+        print("❌ nothing captured")
+        return 2
+    result = replay(entries, args.target, args.speed, args.workers)
+    result["captured_at"] = datetime.utcfromtimestamp(entries[0]["t"]).isoformat(timespec="seconds")
+    with open(args.out, "w") as f:
+        json.dump(result, f)
+    errors = sum(1 for r in result["results"] if r["status"] is None or r["status"] >= 500)
+    late = percentile(sorted(r["late"] for r in result["results"]), 95)
+    print(f"✅ replayed {len(result['results'])} requests in {result['elapsed_seconds']}s "
+          f"(captured over {result['captured_seconds']}s), {errors} errors, p95 dispatch lag {late} ms → {args.out}")
+    if result["skipped"]:
+        print(f"   skipped: {result['skipped']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,269 @@
+# backend/report_cache.py
+"""Result cache for the /reports/* routes.
+
+A report is cached as its rendered JSON body under (path, query, user's data
+version). Every write bumps the data version (see versioning.py), so a write
+makes the user's old entries unreachable; nothing is ever invalidated. Changing
+a category or payment method bumps every user's version, since reports carry
+their names. The version comes from the user_etag dependency, which already
+looked it up.
+
+Lookups go to an in-process LRU capped at REPORT_CACHE_MAX_BYTES of bodies,
+then, when REPORT_CACHE_URL is set, to a shared backend so other processes'
+results are reused:
+
+- redis://host:6379/0   Redis (pip install redis)
+- memory://             a process-local stand-in with the same interface, for dev and tests
+
+Concurrent misses for the same key are single-flighted: one request computes,
+the others wait for its result, for up to REPORT_CACHE_WAIT seconds before
+computing it themselves (a hung leader mustn't pin their threads). Counters are served at /metrics/report-cache.
+
+Tabular reports (`cached(..., tabular=True)`) also answer Arrow or msgpack
+(see columnar.py); each representation is cached under its own key.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from fastapi import APIRouter, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from backend.columnar import encode, negotiate
+
+router = APIRouter()
+log = logging.getLogger(__name__)
+
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", str(64 * 2**20)))
+REPORT_CACHE_URL = os.getenv("REPORT_CACHE_URL")  # unset: in-process only
+REPORT_CACHE_TTL = int(os.getenv("REPORT_CACHE_TTL", "3600"))  # shared entries; stale versions just expire
+REPORT_CACHE_WAIT = float(os.getenv("REPORT_CACHE_WAIT", "10"))  # seconds a coalesced request waits for its leader
+KEY_PREFIX = "report:"
+
+
+# -----------------------
+# Backends
+# -----------------------
+class LocalLRU:
+    """Bodies by key, least recently used evicted first once max_bytes is exceeded."""
+
+    def __init__(self, max_bytes=REPORT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            body = self.entries.get(key)
+            if body is not None:
+                self.entries.move_to_end(key)
+            return body
+
+    def set(self, key, body):
+        """Store `body`; returns how many entries were evicted to make room."""
+        if len(body) > self.max_bytes:
+            return 0
+        evicted = 0
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old)
+            self.entries[key] = body
+            self.bytes += len(body)
+            while self.bytes > self.max_bytes:
+                _, dropped = self.entries.popitem(last=False)
+                self.bytes -= len(dropped)
+                evicted += 1
+        return evicted
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+
+class MemoryBackend:
+    """Stand-in for the shared backend: same get/set(ttl) interface, one process."""
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            hit = self.entries.get(key)
+            if hit is None:
+                return None
+            body, expires = hit
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            return body
+
+    def set(self, key, body, ttl):
+        with self.lock:
+            self.entries[key] = (body, time.monotonic() + ttl)
+
+
+class RedisBackend:
+    def __init__(self, url):
+        import redis  # optional: pip install redis
+
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self.client.get(KEY_PREFIX + key)
+
+    def set(self, key, body, ttl):
+        self.client.set(KEY_PREFIX + key, body, ex=ttl)
+
+
+def shared_backend(url=REPORT_CACHE_URL):
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return MemoryBackend()
+    if url.startswith(("redis://", "rediss://")):
+        return RedisBackend(url)
+    raise ValueError(f"unsupported REPORT_CACHE_URL {url!r}")
+
+
+# -----------------------
+# Cache
+# -----------------------
+class _Flight:
+    """One in-progress computation that concurrent misses wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.body = None
+        self.error = None
+
+
+class ReportCache:
+    def __init__(self, local=None, shared=None, ttl=REPORT_CACHE_TTL, wait=REPORT_CACHE_WAIT):
+        self.local = local or LocalLRU()
+        self.shared = shared
+        self.ttl = ttl
+        self.wait = wait
+        self.flights = {}
+        self.lock = threading.Lock()
+        self.counters = defaultdict(int)
+
+    def _count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    def _shared_get(self, key):
+        try:
+            return self.shared.get(key)
+        except Exception:
+            # a cache outage must not take reports down with it
+            self._count("shared_errors")
+            log.exception("report cache: shared get failed")
+            return None
+
+    def _shared_set(self, key, body):
+        try:
+            self.shared.set(key, body, self.ttl)
+        except Exception:
+            self._count("shared_errors")
+            log.exception("report cache: shared set failed")
+
+    def get_or_compute(self, key, compute):
+        """The cached body for `key`, or compute() it once however many requests miss together."""
+        body = self.local.get(key)
+        if body is not None:
+            self._count("hits")
+            return body
+
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = _Flight()
+        if not leader:
+            if flight.done.wait(self.wait):
+                self._count("coalesced")
+                if flight.error is not None:
+                    raise flight.error
+                return flight.body
+            # the leader is stuck; don't hold this thread hostage to it
+            self._count("wait_timeouts")
+            body = compute()
+            self._count("evictions", self.local.set(key, body))
+            return body
+
+        try:
+            body = self._shared_get(key) if self.shared is not None else None
+            if body is not None:
+                self._count("shared_hits")
+            else:
+                self._count("misses")
+                body = compute()
+                if self.shared is not None:
+                    self._shared_set(key, body)
+            self._count("evictions", self.local.set(key, body))
+            flight.body = body
+            return body
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+
+    def snapshot(self):
+        with self.lock:
+            counters = dict(self.counters)
+        lookups = sum(counters.get(k, 0) for k in ("hits", "shared_hits", "coalesced", "misses", "wait_timeouts"))
+        served = lookups - counters.get("misses", 0) - counters.get("wait_timeouts", 0)
+        return {
+            "entries": len(self.local.entries),
+            "bytes": self.local.bytes,
+            "max_bytes": self.local.max_bytes,
+            "shared": type(self.shared).__name__ if self.shared is not None else None,
+            "hit_ratio": round(served / lookups, 4) if lookups else None,
+            **{k: counters.get(k, 0) for k in ("hits", "shared_hits", "coalesced", "misses", "evictions", "shared_errors", "wait_timeouts")},
+        }
+
+
+cache = ReportCache(shared=shared_backend())
+
+
+def _render(result):
+    # exactly what FastAPI would send for the route's return value
+    return JSONResponse(jsonable_encoder(result)).body
+
+
+def report_cache(request: Request, response: Response):
+    """Dependency for report routes: `return cached(lambda: <build the report>)`.
+
+    Needs user_etag to have run first (it stores the data version on the request).
+    Without a version (unknown user) the report is computed uncached. Pass
+    tabular=True for reports that are a list of flat rows.
+    """
+    version = getattr(request.state, "data_version", None)
+
+    def cached(compute, tabular=False):
+        media_type = (negotiate(request) if tabular else None) or "application/json"
+        render = _render if media_type == "application/json" else lambda rows: encode(rows, None, media_type)
+        if version is None:
+            return compute() if media_type == "application/json" else Response(render(compute()), media_type=media_type)
+        key = f"{request.url.path}?{'&'.join(sorted(f'{k}={v}' for k, v in request.query_params.multi_items()))}#v{version}"
+        if media_type != "application/json":
+            key += f"#{media_type}"
+        out = Response(cache.get_or_compute(key, lambda: render(compute())), media_type=media_type)
+        # a returned Response doesn't pick up headers set by dependencies (the ETag)
+        out.headers.raw.extend(response.headers.raw)
+        return out
+
+    return cached
+
+
+@router.get("/metrics/report-cache")
+async def get_report_cache_metrics():
+    return cache.snapshot()
@@ -1,70 +1,176 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
-from datetime import date, datetime
-
-# ======================
-# 👤 USER SCHEMAS
-# ======================
-class UserCreate(BaseModel):
-    user_name: str
-    password: str
-    user_email: EmailStr
-    contact_num_1: str
-    contact_num_2: Optional[str] = None
-
-
-class LoginRequest(BaseModel):
-    username: str
-    password: str
-
-
-# ======================
-# 🏷 CATEGORY / PAYMENT
-# ======================
-class CategoryCreate(BaseModel):
-    category_name: str
-
-
-class PaymentMethodCreate(BaseModel):
-    payment_type: str
-
-
-# ======================
-# 💰 BUDGET SCHEMAS
-# ======================
-class BudgetCreate(BaseModel):
-    user_ID: int
-    category_ID: int
-    amount_limit: float
-    start_date: date
-    end_date: date
-
-
-# Used for PUT update (all fields optional)
-class BudgetUpdate(BaseModel):
-    category_ID: Optional[int] = None
-    amount_limit: Optional[float] = None
-    start_date: Optional[date] = None
-    end_date: Optional[date] = None
-
-
-# ======================
-# 💸 EXPENSE SCHEMAS
-# ======================
-class ExpenseCreate(BaseModel):
-    user_ID: int
-    category_ID: int
-    payment_ID: int
-    amount: float
-    date: datetime
-    description: Optional[str] = None
-
-
-# Used for PUT update (all fields optional)
-class ExpenseUpdate(BaseModel):
-    category_ID: Optional[int] = None
-    payment_ID: Optional[int] = None
-    amount: Optional[float] = None
-    date: Optional[datetime] = None
-    description: Optional[str] = None
-
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
+from typing import Optional, Literal
+from datetime import date, datetime
+
+# ======================
+# 👤 USER SCHEMAS
+# ======================
+class UserCreate(BaseModel):
+    user_name: str
+    password: str
+    user_email: EmailStr
+    contact_num_1: str
+    contact_num_2: Optional[str] = None
+
+
+class LoginRequest(BaseModel):
+    username: str
+    password: str
+
+
+class UserOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    user_ID: int
+    user_name: str
+    user_email: str
+
+
+class TokenOut(BaseModel):
+    access_token: str
+    token_type: str
+
+
+# ======================
+# 🏷 CATEGORY / PAYMENT
+# ======================
+class CategoryCreate(BaseModel):
+    category_name: str
+
+
+class PaymentMethodCreate(BaseModel):
+    payment_type: str
+
+
+# ======================
+# 💰 BUDGET SCHEMAS
+# ======================
+class BudgetCreate(BaseModel):
+    user_ID: int
+    category_ID: int
+    amount_limit: float
+    start_date: date
+    end_date: date
+
+
+# Used for PUT update (all fields optional)
+class BudgetUpdate(BaseModel):
+    category_ID: Optional[int] = None
+    amount_limit: Optional[float] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+
+
+class BudgetOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    budget_ID: int
+    user_ID: int
+    category_ID: int
+    amount_limit: float
+    start_date: datetime
+    end_date: datetime
+
+
+# ======================
+# 💸 EXPENSE SCHEMAS
+# ======================
+class ExpenseCreate(BaseModel):
+    user_ID: int
+    category_ID: int
+    payment_ID: int
+    amount: float
+    date: datetime
+    description: Optional[str] = None
+
+
+# Used for PUT update (all fields optional)
+class ExpenseUpdate(BaseModel):
+    category_ID: Optional[int] = None
+    payment_ID: Optional[int] = None
+    amount: Optional[float] = None
+    date: Optional[datetime] = None
+    description: Optional[str] = None
+
+
+class ExpenseOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    expense_ID: int
+    user_ID: int
+    category_ID: int
+    payment_ID: int
+    amount: float
+    date: datetime
+    description: Optional[str] = None
+
+
+class ExpenseRow(BaseModel):
+    """A listed expense with its category and payment names inline (see crud.list_expense_rows)."""
+    model_config = ConfigDict(from_attributes=True)
+
+    expense_ID: int
+    user_ID: int
+    category_ID: int
+    payment_ID: int
+    amount: Optional[float] = None
+    date: Optional[datetime] = None
+    description: Optional[str] = None
+    recurring_ID: Optional[int] = None
+    updated_at: Optional[datetime] = None
+    version: Optional[int] = None
+    category_name: Optional[str] = None
+    payment_name: Optional[str] = None
+    archived: bool = False
+
+
+# ======================
+# 📊 REPORT SCHEMAS
+# ======================
+class ReportOut(BaseModel):
+    category: str
+    total: float
+
+
+# ======================
+# 🔁 RECURRING EXPENSE SCHEMAS
+# ======================
+class RecurringExpenseCreate(BaseModel):
+    user_ID: int
+    category_ID: int
+    payment_ID: int
+    amount: float
+    description: Optional[str] = None
+    frequency: Literal["daily", "weekly", "monthly", "yearly"]
+    interval: int = 1
+    start_date: date
+    end_date: Optional[date] = None
+
+
+# Used for PUT update (all fields optional)
+class RecurringExpenseUpdate(BaseModel):
+    category_ID: Optional[int] = None
+    payment_ID: Optional[int] = None
+    amount: Optional[float] = None
+    description: Optional[str] = None
+    end_date: Optional[date] = None
+    active: Optional[bool] = None
+
+
+# ======================
+# 📦 BATCH SCHEMAS
+# ======================
+BATCH_MAX_OPERATIONS = 500
+
+# data: ExpenseCreate/BudgetCreate fields for a create (user_ID defaults to the
+# batch's), ExpenseUpdate/BudgetUpdate fields for an update; see batch.py
+class BatchOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    entity: Literal["expense", "budget"]
+    id: Optional[int] = None  # row to update/delete
+    data: dict = {}
+
+
+class BatchRequest(BaseModel):
+    user_ID: int
+    operations: list[BatchOperation] = Field(..., min_length=1, max_length=BATCH_MAX_OPERATIONS)
@@ -0,0 +1,129 @@
+# backend/search.py
+import re
+from datetime import date, timedelta
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from backend import crud, models
+from backend.database import get_db, user_bind
+
+router = APIRouter()
+
+FTS_TABLE = models.expense_fts.name
+MYSQL_FT_INDEX = "ix_expense_description_ft"
+MAX_RESULTS = 200
+
+# SQLite: external-content FTS5 table kept in sync with `expense` by triggers,
+# so inserts/updates/deletes (including bulk deletes) never leave it stale.
+SQLITE_SETUP = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        description, content='expense', content_rowid='expense_ID', tokenize='unicode61'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS expense_fts_ai AFTER INSERT ON expense BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.expense_ID, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS expense_fts_ad AFTER DELETE ON expense BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.expense_ID, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS expense_fts_au AFTER UPDATE OF description ON expense BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.expense_ID, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.expense_ID, new.description);
+    END""",
+    # index whatever rows existed before the FTS table did
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+
+# -----------------------
+# Index setup (called once at startup)
+# -----------------------
+def setup_search_index(bind):
+    """Create the full-text index for the current dialect if it does not exist yet."""
+    with bind.begin() as conn:
+        if bind.dialect.name == "sqlite":
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"), {"n": FTS_TABLE}
+            ).first()
+            if not exists:
+                for stmt in SQLITE_SETUP:
+                    conn.execute(text(stmt))
+        elif bind.dialect.name == "mysql":
+            exists = conn.execute(
+                text(
+                    "SELECT 1 FROM information_schema.statistics "
+                    "WHERE table_schema = DATABASE() AND table_name = 'expense' AND index_name = :n"
+                ),
+                {"n": MYSQL_FT_INDEX},
+            ).first()
+            if not exists:
+                # InnoDB maintains FULLTEXT indexes transactionally on every write
+                conn.execute(text(f"ALTER TABLE expense ADD FULLTEXT INDEX {MYSQL_FT_INDEX} (description)"))
+
+
+# -----------------------
+# Query building
+# -----------------------
+def _terms(q: str):
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        raise HTTPException(status_code=400, detail="Search query must contain at least one word")
+    return terms
+
+
+def _sqlite_match(terms):
+    # every term must match, each as a prefix: "netf" -> "netf"*
+    return " ".join(f'"{t}"*' for t in terms)
+
+
+def _mysql_match(terms):
+    return " ".join(f"+{t}*" for t in terms)
+
+
+MATCH_SYNTAX = {"sqlite": _sqlite_match, "mysql": _mysql_match}
+
+
+# -----------------------
+# Search endpoint
+# -----------------------
+@router.get("/expenses/{user_id}/search")
+def search_expenses(
+    user_id: int,
+    q: str,
+    category_id: Optional[int] = None,
+    payment_id: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    limit: int = 50,
+    offset: int = 0,
+    db: Session = Depends(get_db),
+):
+    """Ranked prefix search over expense descriptions, combinable with the usual filters."""
+    terms = _terms(q)
+    dialect = user_bind(db, user_id).dialect.name
+    if dialect not in MATCH_SYNTAX:
+        raise HTTPException(status_code=501, detail="Full-text search is not available on this database")
+
+    rows = crud.search_expenses(
+        db, dialect, user_id, MATCH_SYNTAX[dialect](terms),
+        limit=max(1, min(limit, MAX_RESULTS)),
+        offset=max(offset, 0),
+        category_id=category_id,
+        payment_id=payment_id,
+        start=start,
+        end=end + timedelta(days=1) if end else None,
+    )
+
+    results = []
+    for exp, rank in rows:
+        results.append({
+            "expense_ID": exp.expense_ID,
+            "user_ID": exp.user_ID,
+            "category_ID": exp.category_ID,
+            "payment_ID": exp.payment_ID,
+            "date": exp.date,
+            "amount": float(exp.amount or 0),
+            "description": exp.description,
+            "score": round(float(rank or 0), 4),
+        })
+    return results
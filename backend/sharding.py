@@ -0,0 +1,361 @@
+# backend/sharding.py
+"""User-ID based horizontal sharding.
+
+Users and the shard map live in the global database. Expenses, budgets,
+recurring templates and tombstones live on the user's shard. Categories and
+payment methods are owned by the global database and copied to every shard,
+so reports can still join against them.
+
+Enable by setting SHARD_DATABASE_URLS (comma-separated) next to DATABASE_URL;
+see backend/database.py. Rebalance with:
+
+    python -m backend.sharding status
+    python -m backend.sharding move <user_id> <shard_id>
+"""
+import sys
+import time
+from datetime import datetime
+from sqlalchemy import Column, Integer, MetaData, String, Table, insert, select, update, delete, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql import operators, visitors
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter
+from sqlalchemy.sql.schema import Column as SchemaColumn
+
+GLOBAL = "global"
+GLOBAL_TABLES = {"user", "user_shard"}
+REFERENCE_TABLES = {"category", "payment_method"}  # owned by global, copied to every shard
+# Shard k numbers its rows from (k + 1) * SHARD_ID_SPAN so ids never collide across
+# shards (by-id routes scatter over all shards). Fits 20 shards in a 32-bit INT.
+SHARD_ID_SPAN = 100_000_000
+SHARD_MAP_TTL = 2.0  # seconds a process may serve a stale shard-map entry
+
+shard_meta = MetaData()
+user_shard = Table(
+    "user_shard",
+    shard_meta,
+    Column("user_ID", Integer, primary_key=True, autoincrement=False),
+    Column("shard_id", String(50), nullable=False),
+    Column("state", String(10), nullable=False, default="active"),  # active | moving
+)
+
+
+class ShardMovingError(Exception):
+    """The user's data is being moved between shards; writes must be retried."""
+
+
+def _shard_metadata(metadata):
+    """Copy of the user-data tables for a shard: no cross-database FKs, AUTOINCREMENT on SQLite."""
+    meta = MetaData()
+    for table in metadata.sorted_tables:
+        if table.name in GLOBAL_TABLES:
+            continue
+        copy = table.to_metadata(meta)
+        for fk in list(copy.foreign_key_constraints):
+            copy.constraints.discard(fk)
+        copy.foreign_keys.clear()
+        for col in copy.columns:
+            col.foreign_keys.clear()
+        # keep a high-water mark so the shard's id range survives deletes
+        copy.dialect_options["sqlite"]["autoincrement"] = True
+    return meta
+
+
+def _user_ids_in(statement, params=None):
+    """Values compared with a user_ID column anywhere in the statement."""
+    tables, user_ids = set(), set()
+    for el in visitors.iterate(statement):
+        if isinstance(el, Table):
+            tables.add(el.name)
+        elif isinstance(el, SchemaColumn) and el.table is not None and hasattr(el.table, "name"):
+            tables.add(el.table.name)
+        elif isinstance(el, BinaryExpression) and el.operator is operators.eq:
+            for col, val in ((el.left, el.right), (el.right, el.left)):
+                if getattr(col, "key", None) == "user_ID" and isinstance(val, BindParameter):
+                    # lazy loads pass the value as an execution parameter
+                    value = val.effective_value if val.effective_value is not None else (params or {}).get(val.key)
+                    if value is not None:
+                        user_ids.add(int(value))
+    return tables, user_ids
+
+
+class ShardRouter:
+    def __init__(self, global_engine, shard_engines):
+        self.global_engine = global_engine
+        self.shards = dict(shard_engines)
+        self.shard_ids = list(self.shards)
+        self._cache = {}
+
+    # -----------------------
+    # Shard map
+    # -----------------------
+    def _default_shard(self, user_id):
+        return self.shard_ids[user_id % len(self.shard_ids)]
+
+    def lookup(self, user_id):
+        """(shard_id, state) for a user; users without a map entry go to user_id % N."""
+        hit = self._cache.get(user_id)
+        now = time.monotonic()
+        if hit and now - hit[2] < SHARD_MAP_TTL:
+            return hit[0], hit[1]
+        with self.global_engine.connect() as conn:
+            row = conn.execute(
+                select(user_shard.c.shard_id, user_shard.c.state).where(user_shard.c.user_ID == user_id)
+            ).first()
+        if row is None:
+            # not persisted: any GET can name an id, including ones that don't exist
+            row = (self._default_shard(user_id), "active")
+        self._cache[user_id] = (row[0], row[1], now)
+        return row[0], row[1]
+
+    def pin(self, user_id):
+        """Record a new user's shard, so adding shards later doesn't silently move them."""
+        try:
+            with self.global_engine.begin() as conn:
+                conn.execute(insert(user_shard).values(
+                    user_ID=user_id, shard_id=self._default_shard(user_id), state="active",
+                ))
+        except IntegrityError:
+            pass  # already mapped
+        self._cache.pop(user_id, None)
+
+    def shard_for_user(self, user_id, for_write=False):
+        shard_id, state = self.lookup(user_id)
+        if for_write and state == "moving":
+            raise ShardMovingError(f"user {user_id} is being moved from {shard_id}")
+        return shard_id
+
+    def engine_for_user(self, user_id, for_write=False):
+        return self.shards[self.shard_for_user(user_id, for_write)]
+
+    def _set(self, user_id, shard_id, state, users=None):
+        """Update the map entry; given the `users` table, also bump the user's data version with it."""
+        with self.global_engine.begin() as conn:
+            updated = conn.execute(
+                update(user_shard).where(user_shard.c.user_ID == user_id).values(shard_id=shard_id, state=state)
+            ).rowcount
+            if not updated:
+                conn.execute(insert(user_shard).values(user_ID=user_id, shard_id=shard_id, state=state))
+            if users is not None:
+                conn.execute(update(users).where(users.c.user_ID == user_id).values(data_version=users.c.data_version + 1))
+        self._cache.pop(user_id, None)
+
+    def forget(self, user_id):
+        with self.global_engine.begin() as conn:
+            conn.execute(delete(user_shard).where(user_shard.c.user_ID == user_id))
+        self._cache.pop(user_id, None)
+
+    # -----------------------
+    # ShardedSession choosers
+    # -----------------------
+    def shard_chooser(self, mapper, instance, clause=None):
+        if mapper is None or mapper.local_table.name in GLOBAL_TABLES | REFERENCE_TABLES:
+            return GLOBAL
+        user_id = getattr(instance, "user_ID", None)
+        if user_id is None:
+            return GLOBAL
+        return self.shard_for_user(user_id, for_write=True)
+
+    def identity_chooser(self, mapper, primary_key, *, lazy_loaded_from=None, **kw):
+        if mapper.local_table.name in GLOBAL_TABLES | REFERENCE_TABLES:
+            return [GLOBAL]
+        if lazy_loaded_from is not None and lazy_loaded_from.identity_token in self.shards:
+            return [lazy_loaded_from.identity_token]
+        return self.shard_ids
+
+    def execute_chooser(self, orm_context):
+        params = orm_context.parameters if isinstance(orm_context.parameters, dict) else None
+        tables, user_ids = _user_ids_in(orm_context.statement, params)
+        if tables and tables <= GLOBAL_TABLES | REFERENCE_TABLES:
+            return [GLOBAL]
+        if user_ids:
+            is_write = orm_context.is_insert or orm_context.is_update or orm_context.is_delete
+            return sorted({self.shard_for_user(uid, for_write=is_write) for uid in user_ids})
+        # no user_ID criterion (e.g. lookup by expense_ID): ask every shard
+        return self.shard_ids
+
+    def sessionmaker(self):
+        return sessionmaker(
+            class_=ShardedSession,
+            autoflush=False,
+            shards={GLOBAL: self.global_engine, **self.shards},
+            shard_chooser=self.shard_chooser,
+            identity_chooser=self.identity_chooser,
+            execute_chooser=self.execute_chooser,
+            # data-version bumps target the global DB; apply them once the shard write commits
+            info={"defer_version_bumps": True},
+        )
+
+    # -----------------------
+    # Setup
+    # -----------------------
+    def setup(self, metadata):
+        """Create the shard map and shard schemas, reserve id ranges, copy reference tables."""
+        shard_meta.create_all(self.global_engine)
+        tables = _shard_metadata(metadata)
+        for index, eng in enumerate(self.shards.values()):
+            tables.create_all(eng)
+            self._reserve_id_range(eng, tables, (index + 1) * SHARD_ID_SPAN)
+        self.replicate_reference_tables(metadata)
+
+    def _reserve_id_range(self, eng, tables, start):
+        with eng.begin() as conn:
+            for table in tables.sorted_tables:
+                if table.name in REFERENCE_TABLES or table.autoincrement_column is None:
+                    continue
+                if eng.dialect.name == "sqlite":
+                    seq = conn.execute(text("SELECT seq FROM sqlite_sequence WHERE name = :t"), {"t": table.name}).scalar()
+                    if seq is None:
+                        conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:t, :s)"), {"t": table.name, "s": start})
+                    elif seq < start:
+                        conn.execute(text("UPDATE sqlite_sequence SET seq = :s WHERE name = :t"), {"t": table.name, "s": start})
+                elif eng.dialect.name == "mysql":
+                    current = conn.execute(
+                        text(
+                            "SELECT AUTO_INCREMENT FROM information_schema.tables "
+                            "WHERE table_schema = DATABASE() AND table_name = :t"
+                        ),
+                        {"t": table.name},
+                    ).scalar()
+                    if current is None or current <= start:
+                        conn.execute(text(f"ALTER TABLE `{table.name}` AUTO_INCREMENT = {start + 1}"))
+
+    def replicate_reference_tables(self, metadata):
+        """Refresh every shard's copy of the (small) reference tables from global."""
+        with self.global_engine.connect() as conn:
+            snapshot = {
+                name: [dict(r) for r in conn.execute(select(metadata.tables[name])).mappings()]
+                for name in REFERENCE_TABLES
+            }
+        for eng in self.shards.values():
+            with eng.begin() as conn:
+                for name, rows in snapshot.items():
+                    conn.execute(delete(metadata.tables[name]))
+                    if rows:
+                        conn.execute(insert(metadata.tables[name]), rows)
+
+    # -----------------------
+    # Rebalancing
+    # -----------------------
+    def move_user(self, user_id, target, metadata, settle=None):
+        """Move one user's rows to `target` while the API keeps serving.
+
+        1. mark the user "moving": writes get 503/Retry-After, reads still hit the source
+        2. copy rows to the target, keeping their ids wherever the target can: any id
+           below the end of its range (always, when moving to a higher shard). An id
+           from a higher shard's range would drag the target's auto-increment into that
+           range, so those rows get new ids in the target's range instead: old expense/
+           budget ids get tombstones and the copies a fresh updated_at (sync clients
+           converge), and receipts, materialized expenses and archived chunks follow
+           the new ids. Other holders of a renumbered id - a stored Idempotency-Key
+           response, an expense grid open in the frontend - get 404s for it.
+        3. flip the map to the target, still "moving", and bump the user's data version
+           in the same transaction; wait out cached lookups, then let writes resume
+           (until then readers on a stale map entry see what the target holds)
+        4. delete the source rows
+        """
+        from backend.archive import remap_recurring_ids
+
+        if target not in self.shards:
+            raise ValueError(f"unknown shard {target!r}; have {self.shard_ids}")
+        source, _ = self.lookup(user_id)
+        if source == target:
+            return 0
+        settle = SHARD_MAP_TTL * 2 if settle is None else settle
+        range_end = (self.shard_ids.index(target) + 2) * SHARD_ID_SPAN
+        t = metadata.tables
+        expense, budget, recurring, tombstone = t["expense"], t["budget"], t["recurring_expense"], t["sync_tombstone"]
+        receipt, chunks = t["receipt"], t["expense_archive"]  # receipt rows only; the files are in shared storage
+        derived = (t["expense_rollup"], t["spending_anomaly"])
+
+        self._set(user_id, source, "moving")
+        time.sleep(settle)  # let in-flight writes that saw "active" finish
+        now = datetime.utcnow()
+        moved = 0
+        try:
+            with self.shards[source].connect() as src, self.shards[target].begin() as dst:
+                def rows_of(table):
+                    return [dict(r) for r in src.execute(select(table).where(table.c.user_ID == user_id)).mappings()]
+
+                def copy(table, rows):
+                    """Insert rows, keeping the ids the target can take; {old id: new id} of the others."""
+                    pk = table.primary_key.columns[0].name
+                    kept, renumbered = [], {}
+                    for row in rows:
+                        if row[pk] < range_end:
+                            kept.append(row)
+                        else:
+                            old_id = row.pop(pk)
+                            renumbered[old_id] = dst.execute(insert(table).values(**row)).inserted_primary_key[0]
+                    if kept:
+                        dst.execute(insert(table), kept)
+                    return renumbered
+
+                # templates first so materialized expenses can follow them
+                template_ids = copy(recurring, rows_of(recurring))
+                receipts, graves = rows_of(receipt), []
+                for table, pk, entity in ((expense, "expense_ID", "expense"), (budget, "budget_ID", "budget")):
+                    rows = rows_of(table)
+                    for row in rows:
+                        if row.get("recurring_ID") in template_ids:
+                            row["recurring_ID"] = template_ids[row["recurring_ID"]]
+                        if row[pk] >= range_end:
+                            row["updated_at"] = now
+                    new_ids = copy(table, rows)
+                    graves += [{"user_ID": user_id, "entity": entity, "entity_ID": old_id, "deleted_at": now} for old_id in new_ids]
+                    if table is expense:
+                        for r in receipts:  # receipts of archived expenses keep their expense ids
+                            r["expense_ID"] = new_ids.get(r["expense_ID"], r["expense_ID"])
+                    moved += len(rows)
+                copy(receipt, receipts)
+                archived = rows_of(chunks)
+                if template_ids:
+                    for row in archived:
+                        row["payload"] = remap_recurring_ids(row["payload"], template_ids)
+                copy(chunks, archived)
+                for table in (*derived, tombstone):
+                    copy(table, rows_of(table))
+                if graves:
+                    dst.execute(insert(tombstone), graves)
+        except Exception:
+            self._set(user_id, source, "active")
+            raise
+
+        self._set(user_id, target, "moving", users=t["user"])
+        time.sleep(settle)  # readers with a cached map entry may still query the source
+        self._set(user_id, target, "active")
+        with self.shards[source].begin() as src:
+            for table in (expense, budget, recurring, tombstone, receipt, chunks, *derived):
+                src.execute(delete(table).where(table.c.user_ID == user_id))
+        return moved
+
+
+# -----------------------
+# CLI
+# -----------------------
+def main(argv):
+    from backend import models
+    from backend.database import shard_router
+
+    if shard_router is None:
+        print("Sharding is not enabled (set SHARD_DATABASE_URLS).")
+        return 1
+    shard_router.setup(models.Base.metadata)
+    if argv[:1] == ["status"]:
+        with shard_router.global_engine.connect() as conn:
+            for shard_id, count in conn.execute(
+                select(user_shard.c.shard_id, text("COUNT(*)")).group_by(user_shard.c.shard_id)
+            ):
+                print(f"{shard_id}: {count} users")
+        return 0
+    if len(argv) == 3 and argv[0] == "move":
+        moved = shard_router.move_user(int(argv[1]), argv[2], models.Base.metadata)
+        print(f"✅ Moved user {argv[1]} to {argv[2]} ({moved} rows)")
+        return 0
+    print(__doc__)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
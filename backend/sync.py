@@ -0,0 +1,92 @@
+# backend/sync.py
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from backend import crud, models
+from backend.database import get_db
+
+router = APIRouter()
+
+# Rows stamped shortly before a cursor may belong to transactions that had not
+# committed yet when the cursor was issued, so every delta re-reads this much
+# history. Clients merge by primary key, making the overlap harmless.
+SYNC_OVERLAP = timedelta(seconds=30)
+# Tombstones older than this are purged; clients further behind get a full snapshot.
+TOMBSTONE_RETENTION = timedelta(days=30)
+SYNC_ENTITIES = ("expenses", "budgets")
+
+
+# -----------------------
+# Tombstones
+# -----------------------
+def record_deletion(db: Session, entity: str, user_id: int, entity_id: int):
+    """Leave a tombstone for a deleted row; commits with the caller's transaction."""
+    db.add(models.Tombstone(user_ID=user_id, entity=entity, entity_ID=entity_id))
+    # expire this user's old tombstones while we're here (indexed on user_ID, deleted_at)
+    crud.expire_tombstones(db, user_id, datetime.utcnow() - TOMBSTONE_RETENTION)
+
+
+def record_deletions(conn, entity: str, user_id: int, entity_ids):
+    """record_deletion for many rows deleted on a connection to the user's database (see batch.py)."""
+    now = datetime.utcnow()
+    conn.execute(insert(models.Tombstone.__table__), [
+        {"user_ID": user_id, "entity": entity, "entity_ID": entity_id, "deleted_at": now} for entity_id in entity_ids
+    ])
+    crud.expire_tombstones(conn, user_id, now - TOMBSTONE_RETENTION)
+
+
+def _parse_cursor(since: Optional[str]):
+    if not since:
+        return None
+    try:
+        return datetime.fromisoformat(since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid sync cursor")
+
+
+def _parse_entities(entities: str):
+    wanted = [e.strip() for e in entities.split(",") if e.strip()]
+    if not wanted or not set(wanted) <= set(SYNC_ENTITIES):
+        raise HTTPException(status_code=400, detail=f"entities must be a comma-separated subset of {','.join(SYNC_ENTITIES)}")
+    return wanted
+
+
+# -----------------------
+# Delta endpoint
+# -----------------------
+@router.get("/sync/{user_id}")
+def sync_user_data(
+    user_id: int,
+    since: Optional[str] = None,
+    entities: str = ",".join(SYNC_ENTITIES),
+    db: Session = Depends(get_db),
+):
+    """Expenses/budgets changed since `since` plus ids deleted since then.
+
+    Without a cursor (or with one older than tombstone retention) a full snapshot
+    is returned with `full: true`, and the client should replace its local copy.
+    A client that mirrors only some entities asks for them (`entities=budgets`);
+    the others are left out of the response, including their deletions.
+    """
+    now = datetime.utcnow()
+    cursor = _parse_cursor(since)
+    wanted = _parse_entities(entities)
+    full = cursor is None or cursor < now - TOMBSTONE_RETENTION
+
+    out = {"cursor": (now - SYNC_OVERLAP).isoformat(), "full": full}
+    if "expenses" in wanted:
+        out["expenses"] = (
+            crud.list_expenses_by_user(db, user_id) if full else crud.list_expenses_changed(db, user_id, cursor)
+        )
+    if "budgets" in wanted:
+        out["budgets"] = (
+            crud.list_budgets_by_user(db, user_id) if full else crud.list_budgets_changed(db, user_id, cursor)
+        )
+    deleted = {entity: [] for entity in wanted}
+    if not full:
+        for entity, entity_id in crud.list_deletions(db, user_id, cursor, [e[:-1] for e in wanted]):
+            deleted[f"{entity}s"].append(entity_id)
+    out["deleted"] = deleted
+    return out
@@ -0,0 +1,305 @@
+# backend/test_query_plans.py
+"""Query-plan regression test for every statement the API issues.
+
+Seeds a scaled database, calls every API route, captures each SQL statement
+and runs EXPLAIN (MySQL) / EXPLAIN QUERY PLAN (SQLite) on it. Fails on full
+scans of tables above PLAN_CHECK_MIN_ROWS rows, and on filesorts / temp
+tables over that many rows, naming the offending route. Routes the test
+doesn't call also fail, so new routes must be added to requests_for().
+
+Run it like the other test scripts, from the repo root or from backend/:
+
+    python backend/test_query_plans.py [users] [expenses]
+    python -m pytest backend/test_query_plans.py
+
+Uses a throwaway SQLite file unless DATABASE_URL is set (point it at an empty
+MySQL database to check MySQL plans; SHARD_DATABASE_URLS is honoured too).
+PLAN_CHECK_USERS / PLAN_CHECK_EXPENSES size the seed under pytest.
+"""
+import os
+import random
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+if not __package__:
+    # run as a script: make the backend package importable from any cwd
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test_query_plans.db"
+os.environ.setdefault("RECURRING_TICK_SECONDS", "0")
+os.environ.setdefault("RECEIPT_DIR", tempfile.mkdtemp())
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, func, insert, inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from backend import anomalies, archive, models, utils
+from backend.admission import ROUTE_LIMITS
+from backend.profiling import api_routes
+from backend.app import app
+from backend.database import engine, engine_for_user, user_data_engines
+
+USERS = int(os.getenv("PLAN_CHECK_USERS", "2000"))
+EXPENSES = int(os.getenv("PLAN_CHECK_EXPENSES", "50000"))
+MIN_ROWS = int(os.getenv("PLAN_CHECK_MIN_ROWS", "1000"))
+HEAVY_USER_EXPENSES = 400  # the user every route is called for
+
+EXPLAINED = ("SELECT", "WITH", "UPDATE", "DELETE")
+
+
+# -----------------------
+# Seed
+# -----------------------
+def seed():
+    client.post("/seed-data")
+    password = utils.hash_password("secret")
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [
+            {
+                "user_name": f"user_{i}", "password": password, "user_email": f"user_{i}@example.com",
+                "contact_num_1": f"{i:010d}",
+            }
+            for i in range(1, USERS + 1)
+        ])
+        user_ids = conn.execute(select(models.User.user_ID).order_by(models.User.user_ID)).scalars().all()
+
+    rng = random.Random(42)
+    heavy = user_ids[0]
+    start = datetime.utcnow() - timedelta(days=730)
+    by_engine = {}
+    for i in range(EXPENSES):
+        user_id = heavy if i < HEAVY_USER_EXPENSES else rng.choice(user_ids)
+        by_engine.setdefault(engine_for_user(user_id), []).append({
+            "user_ID": user_id, "category_ID": rng.randint(1, 7), "payment_ID": rng.randint(1, 5),
+            "amount": round(rng.uniform(1, 500), 2), "date": start + timedelta(minutes=rng.randint(0, 730 * 1440)),
+            "description": rng.choice(["coffee", "groceries", "rent", "netflix", "fuel", "lunch"]),
+        })
+    for bind, rows in by_engine.items():
+        with bind.begin() as conn:
+            conn.execute(insert(models.Expense.__table__), rows)
+            conn.execute(insert(models.Budget.__table__), [
+                {
+                    "user_ID": user_id, "category_ID": 1, "amount_limit": 1000,
+                    "start_date": start, "end_date": start + timedelta(days=365),
+                }
+                for user_id in {r["user_ID"] for r in rows}
+            ])
+    # give the heavy user a year of cold storage
+    archive.archive_user(engine_for_user(heavy), heavy, archive.archive_cutoff(days=365))
+    for bind in user_data_engines():
+        anomalies.detect_anomalies(bind, f"{datetime.utcnow():%Y-%m}")
+    return heavy
+
+
+def _ids(user_id):
+    with engine_for_user(user_id).connect() as conn:
+        expense_id = conn.execute(
+            select(models.Expense.expense_ID).where(models.Expense.user_ID == user_id).limit(1)
+        ).scalar()
+        budget_id = conn.execute(
+            select(models.Budget.budget_ID).where(models.Budget.user_ID == user_id).limit(1)
+        ).scalar()
+        month = conn.execute(
+            select(models.ExpenseArchive.month).where(models.ExpenseArchive.user_ID == user_id).limit(1)
+        ).scalar()
+        newest = conn.execute(
+            select(models.Expense.date, models.Expense.expense_ID).where(models.Expense.user_ID == user_id)
+            .order_by(models.Expense.date.desc(), models.Expense.expense_ID.desc()).limit(1)
+        ).one()
+    cursor = f"{newest.date.isoformat()}|{newest.expense_ID}"
+    return {"user_id": user_id, "expense_id": expense_id, "budget_id": budget_id, "month": month, "cursor": cursor}
+
+
+# -----------------------
+# Routes to call: (method, path template, request kwargs)
+# -----------------------
+def requests_for(ids):
+    expense = {"user_ID": ids["user_id"], "category_ID": 1, "payment_ID": 1, "amount": 12.5, "date": "2025-01-01T10:00:00"}
+    budget = {"user_ID": ids["user_id"], "category_ID": 2, "amount_limit": 500, "start_date": "2025-01-01", "end_date": "2025-12-31"}
+    recurring = {"user_ID": ids["user_id"], "category_ID": 1, "payment_ID": 1, "amount": 9.99, "frequency": "monthly", "start_date": "2025-01-01"}
+    return [
+        ("GET", "/", {}),
+        ("GET", "/metrics/admission", {}),
+        ("GET", "/metrics/slow-queries", {}),
+        ("GET", "/metrics/report-cache", {}),
+        ("POST", "/auth/register", {"json": {"user_name": "new_user", "password": "secret", "user_email": "new@example.com", "contact_num_1": "9999999999"}}),
+        ("POST", "/auth/login", {"json": {"username": "user_1", "password": "secret"}}),
+        ("GET", "/categories", {}),
+        ("GET", "/payment-methods", {}),
+        ("GET", "/budgets/{user_id}", {}),
+        ("POST", "/budgets/add", {"json": budget}),
+        ("PUT", "/budgets/{budget_id}", {"json": {"amount_limit": 750}}),
+        ("GET", "/expenses/{user_id}", {}),
+        ("GET", "/expenses/{user_id}", {"params": {"include_archived": "true"}}),
+        ("GET", "/expenses/{user_id}", {"params": {"limit": 50}}),
+        ("GET", "/expenses/{user_id}", {"params": {"limit": 50, "after": ids["cursor"]}}),
+        ("POST", "/expenses/add", {"json": expense}),
+        ("PUT", "/expenses/{expense_id}", {"json": {"amount": 15}}),
+        ("POST", "/expenses/{expense_id}/receipt", {"content": b"%PDF-1.4 receipt", "headers": {"Content-Type": "application/pdf"}}),
+        ("GET", "/expenses/{expense_id}/receipt", {}),
+        ("GET", "/expenses/{expense_id}/receipt/thumbnail", {}),
+        ("DELETE", "/expenses/{expense_id}/receipt", {}),
+        ("POST", "/batch", {"json": {"user_ID": ids["user_id"], "operations": [
+            {"op": "create", "entity": "expense", "data": expense},
+            {"op": "create", "entity": "budget", "data": budget},
+            {"op": "update", "entity": "expense", "id": ids["expense_id"], "data": {"amount": 20, "description": "batch"}},
+            {"op": "update", "entity": "budget", "id": ids["budget_id"], "data": {"amount_limit": 800}},
+        ]}}),
+        ("GET", "/expenses/{user_id}/search", {"params": {"q": "coffee"}}),
+        ("GET", "/expenses/{user_id}/archive", {}),
+        ("GET", "/expenses/{user_id}/archive/{month}", {}),
+        ("GET", "/reports/spending-by-category/{user_id}", {}),
+        ("GET", "/reports/total-spending/{user_id}", {}),
+        ("GET", "/reports/monthly-spending/{user_id}", {}),
+        ("GET", "/reports/rolling/{user_id}", {}),
+        ("GET", "/reports/period-over-period/{user_id}", {}),
+        ("GET", "/reports/budget-progress/{user_id}", {}),
+        ("GET", "/reports/anomalies/{user_id}", {}),
+        ("GET", "/sync/{user_id}", {}),
+        ("GET", "/sync/{user_id}", {"params": {"since": (datetime.utcnow() - timedelta(days=1)).isoformat()}}),
+        ("GET", "/sync/{user_id}", {"params": {"since": (datetime.utcnow() - timedelta(days=1)).isoformat(), "entities": "budgets"}}),
+        ("GET", "/recurring/{user_id}", {}),
+        ("POST", "/recurring/add", {"json": recurring}),
+        ("PUT", "/recurring/{recurring_id}", {"json": {"amount": 10.99}}),
+        ("DELETE", "/recurring/{recurring_id}", {}),
+        ("DELETE", "/expenses/{expense_id}", {}),
+        ("DELETE", "/budgets/{budget_id}", {}),
+        ("POST", "/seed-data", {}),
+        ("DELETE", "/users/{user_id}", {}),
+    ]
+
+
+# -----------------------
+# Capture
+# -----------------------
+captured = {}  # (route, engine url, statement) -> (engine, parameters)
+current_route = None
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _capture(conn, cursor, statement, parameters, context, executemany):
+    if current_route and statement.lstrip().upper().startswith(EXPLAINED):
+        params = parameters[0] if executemany and parameters else parameters
+        captured.setdefault((current_route, str(conn.engine.url), statement), (conn.engine, params))
+
+
+def call_routes(ids):
+    global current_route
+    called, recurring_id = set(), None
+    for method, path, kwargs in requests_for(ids):
+        current_route = f"{method} {path}"
+        values = dict(ids)
+        if "{recurring_id}" in path:
+            values["recurring_id"] = recurring_id
+        response = client.request(method, path.format(**values), **kwargs)
+        current_route = None
+        if response.status_code >= 500:
+            print(f"⚠️  {method} {path} returned {response.status_code}")
+        if path == "/recurring/add" and response.status_code == 201:
+            recurring_id = response.json()["recurring"]["recurring_ID"]
+        called.add((method, path))
+    return called
+
+
+# -----------------------
+# Plans
+# -----------------------
+def table_sizes():
+    """Names of tables holding at least MIN_ROWS rows on some database."""
+    big = set()
+    for bind in {engine, *user_data_engines()}:
+        present = set(inspect(bind).get_table_names())
+        with bind.connect() as conn:
+            for table in models.Base.metadata.sorted_tables:
+                if table.name in present and conn.execute(select(func.count()).select_from(table)).scalar() >= MIN_ROWS:
+                    big.add(table.name)
+    return big
+
+
+def _table_name(name, big):
+    # SQLAlchemy aliases tables as name_1, name_2 ...
+    return name if name in big else re.sub(r"_\d+$", "", name)
+
+
+def sqlite_problems(conn, statement, params, big):
+    plan = [row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", params)]
+    problems, scanned = [], False
+    for detail in plan:
+        m = re.match(r"SCAN (\S+)", detail)
+        if m and _table_name(m.group(1), big) in big and "VIRTUAL TABLE" not in detail:
+            scanned = True
+            problems.append(f"full scan: {detail}")
+    for detail in plan:
+        # a sort over a bounded (SEARCHed) row set is fine; over a scanned big table it is not
+        if scanned and "USE TEMP B-TREE" in detail:
+            problems.append(f"temp b-tree: {detail}")
+    return problems
+
+
+def mysql_problems(conn, statement, params, big):
+    problems = []
+    for row in conn.exec_driver_sql(f"EXPLAIN {statement}", params).mappings():
+        table, access, extra, rows = row["table"] or "", row["type"], row["Extra"] or "", row["rows"] or 0
+        if _table_name(table, big) in big and access in ("ALL", "index"):
+            problems.append(f"full {'index ' if access == 'index' else ''}scan of {table} (~{rows} rows)")
+        if rows >= MIN_ROWS and ("Using filesort" in extra or "Using temporary" in extra):
+            problems.append(f"{extra} over ~{rows} rows of {table}")
+    return problems
+
+
+def check_plans(big):
+    failures = []
+    for (route, _, statement), (bind, params) in captured.items():
+        check = sqlite_problems if bind.dialect.name == "sqlite" else mysql_problems
+        with bind.connect() as conn:
+            try:
+                problems = check(conn, statement, params, big)
+            except DBAPIError as exc:
+                problems = [f"could not EXPLAIN: {exc.orig}"]
+        failures.extend((route, problem, statement) for problem in problems)
+    return failures
+
+
+def run_check():
+    """Seed, call every route and EXPLAIN what they ran: (routes called, routes missed, failures)."""
+    for limits in ROUTE_LIMITS.values():
+        limits.update(ip=None, user=None)
+
+    heavy = seed()
+    big = table_sizes()
+    print(f"Seeded {USERS} users, {EXPENSES} expenses; tables with >= {MIN_ROWS} rows: {', '.join(sorted(big))}")
+
+    called = call_routes(_ids(heavy))
+    routes = {(m, path) for methods, path, _ in api_routes(app) for m in methods}
+    return called, sorted(routes - called), check_plans(big)
+
+
+def _report(missing, failures):
+    lines = [f"❌ {method} {path}: not exercised, add it to requests_for()" for method, path in missing]
+    lines += [f"❌ {route}: {problem}\n     {' '.join(statement.split())[:300]}" for route, problem, statement in failures]
+    return "\n".join(lines)
+
+
+def test_query_plans():
+    _, missing, failures = run_check()
+    assert not missing and not failures, "\n" + _report(missing, failures)
+
+
+def main():
+    called, missing, failures = run_check()
+    if missing or failures:
+        print(_report(missing, failures))
+        return 1
+    print(f"✅ {len(captured)} statements from {len(called)} routes use indexed plans")
+    return 0
+
+
+client = TestClient(app, raise_server_exceptions=False)
+
+if __name__ == "__main__":
+    USERS = int(sys.argv[1]) if len(sys.argv) > 1 else USERS
+    EXPENSES = int(sys.argv[2]) if len(sys.argv) > 2 else EXPENSES
+    sys.exit(main())
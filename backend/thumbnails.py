@@ -0,0 +1,21 @@
+# backend/thumbnails.py
+"""Receipt thumbnails, rendered in worker processes (see receipts.py).
+
+Imports nothing from the app, so spawned workers start quickly and never open
+database connections.
+"""
+import os
+
+THUMBNAIL_SIZE = (320, 320)
+
+
+def make_thumbnail(src: str, dest: str) -> str:
+    from PIL import Image  # optional: pip install pillow
+
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    with Image.open(src) as image:
+        image.thumbnail(THUMBNAIL_SIZE)
+        partial = f"{dest}.{os.getpid()}.part"
+        image.convert("RGB").save(partial, "JPEG", quality=80)
+    os.replace(partial, dest)  # readers never see a half-written file
+    return dest
@@ -0,0 +1,269 @@
+# backend/traffic.py
+"""Opt-in capture of anonymized API traffic, for replay.py.
+
+Set TRAFFIC_CAPTURE_PATH (e.g. traffic-{pid}.jsonl.gz; {pid} keeps workers
+apart) and every API request is appended to it as one JSON line:
+
+    {"t": 1760000000.123, "m": "GET", "r": "/expenses/{user_id}", "u": 17,
+     "p": {}, "q": {"limit": "50"}, "s": 200, "ms": 12.4, "n": 3, "sz": 2048}
+
+t         wall-clock start, so the files of several workers merge by sorting
+r         route template; unmatched paths and /metrics/* aren't recorded
+u         user bucket: keyed hash of the caller's user name (bearer token
+          subject, or the name in a login/register body) mod
+          TRAFFIC_USER_BUCKETS; null for anonymous requests
+p, q      path and query params: user_id is dropped, other ids become keyed
+          pseudonyms ("#3fa9c2d1"), numbers and dates are kept, free text
+          (the search query q) and other strings become their length ("str:7")
+b         JSON body shape: keys, list lengths and value kinds, never values;
+          credentials and contact details are only marked "redacted"
+raw       other bodies: [bytes, content type]
+s ms n sz status, server time, SQL statements run, response bytes
+
+No names, amounts, descriptions or tokens are written. TRAFFIC_SALT keeps
+buckets and pseudonyms stable across workers and restarts (unset: a random
+salt per process). TRAFFIC_SAMPLE_RATE keeps that fraction of callers, whole
+sessions rather than single requests. Lines are written by a background
+thread, so requests never wait on the disk.
+
+TRAFFIC_QUERY_COUNTS=1 adds X-Query-Count to every response, with or without
+capture; replay.py uses it to compare statement counts between builds.
+"""
+import atexit
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from urllib.parse import parse_qsl
+from backend.admission import token_subject
+from backend.profiling import counting_queries, route_template
+
+log = logging.getLogger(__name__)
+
+TRAFFIC_CAPTURE_PATH = os.getenv("TRAFFIC_CAPTURE_PATH")  # unset: nothing is captured
+TRAFFIC_SAMPLE_RATE = float(os.getenv("TRAFFIC_SAMPLE_RATE", "1"))
+TRAFFIC_USER_BUCKETS = int(os.getenv("TRAFFIC_USER_BUCKETS", "256"))
+TRAFFIC_SALT = os.getenv("TRAFFIC_SALT", "").encode() or os.urandom(16)
+TRAFFIC_QUERY_COUNTS = os.getenv("TRAFFIC_QUERY_COUNTS") == "1"
+MAX_BODY_BYTES = 64 * 1024  # larger JSON bodies are recorded by size only
+FLUSH_SECONDS = 1.0
+SKIP_PREFIXES = ("/metrics/",)
+
+# body keys whose values are kept: small fixed vocabularies and reference data
+ENUM_KEYS = {"op", "entity", "frequency"}
+REFERENCE_KEYS = {"category_ID", "payment_ID", "interval"}
+# not even their length is recorded
+SENSITIVE_KEYS = {
+    "password", "token", "access_token", "username", "user_name", "user_email", "email",
+    "contact_num_1", "contact_num_2",
+}
+REDACTED = "redacted"
+FREE_TEXT_PARAMS = {"q"}  # search text is recorded by length, even when it looks like a number
+KEEP_VALUE = re.compile(r"-?\d{1,12}(\.\d+)?|\d{4}-\d{2}(-\d{2})?")  # numbers, months, dates
+DATETIME_VALUE = re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}")
+DATE_VALUE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+# -----------------------
+# Anonymization
+# -----------------------
+def _digest(value, salt=TRAFFIC_SALT):
+    return hmac.new(salt, str(value).encode(), hashlib.sha256).hexdigest()
+
+
+def pseudonym(value):
+    return "#" + _digest(value)[:8]
+
+
+def param_shape(name, value):
+    """A path/query value as recorded: ids pseudonymized, numbers and dates kept, other text by length."""
+    if name in SENSITIVE_KEYS:
+        return REDACTED
+    if name.endswith("_id"):
+        return pseudonym(value)
+    if name in FREE_TEXT_PARAMS:
+        return f"str:{len(value)}"
+    return value if KEEP_VALUE.fullmatch(value) else f"str:{len(value)}"
+
+
+def body_shape(value, key=None):
+    """Keys, list lengths and value kinds of a JSON body; ids pseudonymized, sensitive values redacted."""
+    if key in SENSITIVE_KEYS:
+        return REDACTED
+    if isinstance(value, dict):
+        return {k: body_shape(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [len(value), body_shape(value[0], key) if value else None]
+    if value is None or isinstance(value, bool):
+        return value
+    if key == "user_ID":
+        return "user"
+    if key in ENUM_KEYS or key in REFERENCE_KEYS:
+        return value
+    if isinstance(value, (int, float)):
+        return pseudonym(value) if key and key.lower().endswith("id") else "number"
+    text = str(value)
+    if DATETIME_VALUE.match(text):
+        return "datetime"
+    if DATE_VALUE.fullmatch(text):
+        return "date"
+    return f"str:{len(text)}"
+
+
+# -----------------------
+# Writer
+# -----------------------
+class CaptureWriter(threading.Thread):
+    """Appends queued entries to `path` (gzipped when it ends in .gz), one batch per FLUSH_SECONDS."""
+
+    def __init__(self, path):
+        super().__init__(name="traffic-capture", daemon=True)
+        self.path = path.format(pid=os.getpid())
+        self.queue = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        atexit.register(self.flush)
+        self.start()
+
+    def put(self, entry):
+        self.queue.put(entry)
+
+    def run(self):
+        while True:
+            time.sleep(FLUSH_SECONDS)
+            try:
+                self.flush()
+            except Exception:
+                log.exception("traffic capture: write to %s failed", self.path)
+
+    def flush(self):
+        lines = []
+        while True:
+            try:
+                lines.append(json.dumps(self.queue.get_nowait(), separators=(",", ":")))
+            except queue.Empty:
+                break
+        if not lines:
+            return
+        opener = gzip.open if self.path.endswith(".gz") else open
+        # a gzip file appended to in batches is a valid multi-member gzip file
+        with self.lock, opener(self.path, "at") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def read_traces(paths):
+    """Captured entries of one or more files, in start order."""
+    entries = []
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt") as f:
+            entries.extend(json.loads(line) for line in f if line.strip())
+    entries.sort(key=lambda e: e["t"])
+    return entries
+
+
+# -----------------------
+# Middleware
+# -----------------------
+class TrafficCaptureMiddleware:
+    """Records anonymized request traces when TRAFFIC_CAPTURE_PATH is set; counts statements per request."""
+
+    def __init__(self, app, path=TRAFFIC_CAPTURE_PATH, sample_rate=TRAFFIC_SAMPLE_RATE,
+                 buckets=TRAFFIC_USER_BUCKETS, query_counts=TRAFFIC_QUERY_COUNTS):
+        self.app = app
+        self.writer = CaptureWriter(path) if path else None
+        self.sample_rate = sample_rate
+        self.buckets = buckets
+        self.query_counts = query_counts
+
+    def _sampled(self, caller):
+        if self.sample_rate >= 1:
+            return True
+        if caller is None:
+            return random.random() < self.sample_rate
+        # by caller, so a sampled user's whole session is kept
+        return int(_digest(f"sample:{caller}")[:8], 16) / 0x100000000 < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (self.writer is None and not self.query_counts):
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        content_type = headers.get(b"content-type", b"").split(b";")[0].strip().decode("latin-1")
+        keep_body = self.writer is not None and content_type == "application/json"
+        body = bytearray()
+        received = sent = 0
+        status = 500
+
+        async def receive_counted():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                received += len(chunk)
+                if keep_body and received <= MAX_BODY_BYTES:
+                    body.extend(chunk)
+            return message
+
+        async def send_counted(message):
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.query_counts:
+                    message["headers"] = [*message.get("headers", []), (b"x-query-count", str(queries[0]).encode())]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        started_at, start = time.time(), time.perf_counter()
+        with counting_queries() as queries:
+            try:
+                await self.app(scope, receive_counted, send_counted)
+            finally:
+                if self.writer is not None:
+                    ms = (time.perf_counter() - start) * 1000
+                    doc = None
+                    if keep_body and 0 < received <= MAX_BODY_BYTES:
+                        try:
+                            doc = json.loads(body)
+                        except ValueError:
+                            pass
+                    self._record(scope, headers, doc, content_type, received, started_at, ms, status, queries[0], sent)
+
+    def _record(self, scope, headers, doc, content_type, received, started_at, ms, status, queries, sent):
+        template = route_template(scope)
+        if template is None or template.startswith(SKIP_PREFIXES):
+            return
+        path_params = scope.get("path_params", {})
+        # one form of caller (the user name), so a user's whole session lands in one bucket
+        subject = token_subject(headers)
+        if subject is None and isinstance(doc, dict) and template in ("/auth/login", "/auth/register"):
+            subject = doc.get("username") or doc.get("user_name")
+        caller = f"sub:{subject}" if subject is not None else None
+        if not self._sampled(caller):
+            return
+
+        entry = {
+            "t": round(started_at, 3),
+            "m": scope["method"],
+            "r": template,
+            "u": int(_digest(caller)[:8], 16) % self.buckets if caller is not None else None,
+            "p": {k: param_shape(k, str(v)) for k, v in path_params.items() if k != "user_id"},
+            "q": {k: param_shape(k, v) for k, v in parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True)},
+            "s": status,
+            "ms": round(ms, 1),
+            "n": queries,
+            "sz": sent,
+        }
+        if doc is not None:
+            entry["b"] = body_shape(doc)
+        elif received:
+            entry["raw"] = [received, content_type]
+        self.writer.put(entry)
@@ -0,0 +1,124 @@
+# backend/versioning.py
+from contextlib import contextmanager
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import bindparam, event, select, update
+from sqlalchemy.orm import Session
+from backend import models
+from backend.columnar import FORMAT_TAGS, negotiate
+from backend.database import SessionLocal, engine, get_db, shard_router
+
+users = models.User.__table__
+
+# built once; executed on every write / every user-scoped GET
+_bump = (
+    update(users)
+    .where(users.c.user_ID.in_(bindparam("user_ids", expanding=True)))
+    .values(data_version=users.c.data_version + 1)
+)
+_data_version = select(users.c.data_version).where(users.c.user_ID == bindparam("user_id"))
+# reports and listings show category/payment names, so changing one dates every user's data
+_bump_all = update(users).values(data_version=users.c.data_version + 1)
+REFERENCE_MODELS = (models.Category, models.PaymentMethod)
+
+
+# -----------------------
+# Per-user data version
+# -----------------------
+def bump_data_version(conn, user_ids):
+    """Advance the data version of every user touched by a write.
+
+    Works on a Session or a Connection; call it inside the writing transaction
+    so the new version becomes visible exactly when the write does. On a sharded
+    session the user table is in another database, so the bump is applied right
+    after the shard commits instead - never before the data it describes.
+    """
+    ids = sorted(set(user_ids))
+    if not ids:
+        return
+    if isinstance(conn, Session) and conn.info.get("defer_version_bumps"):
+        conn.info.setdefault("pending_version_bumps", set()).update(ids)
+        return
+    conn.execute(_bump, {"user_ids": ids})
+
+
+@contextmanager
+def versioned_transaction(bind):
+    """Transaction on `bind` that bumps the data version of users added to the yielded set."""
+    touched = set()
+    with bind.begin() as conn:
+        yield conn, touched
+        if bind is engine:
+            bump_data_version(conn, touched)
+    if bind is not engine and touched:
+        with engine.begin() as conn:
+            bump_data_version(conn, touched)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _bump_on_reference_change(session, flush_context):
+    """Adding, renaming or removing a category/payment method bumps every user's data version.
+
+    Unsharded, the bump joins the flushing transaction, so cached reports and
+    ETags roll over exactly when the names change. Sharded, reports join the
+    shards' copies of the reference tables, so they are refreshed after the
+    commit and the bump follows. Changes made outside the ORM should call
+    bump_all_data_versions (after replicating, on a sharded setup).
+    """
+    if any(isinstance(obj, REFERENCE_MODELS) for obj in (*session.new, *session.dirty, *session.deleted)):
+        if shard_router is None:
+            session.execute(_bump_all)
+        else:
+            session.info["reference_changed"] = True
+
+
+def bump_all_data_versions(conn):
+    """For scripts that change reference tables with Core statements or raw SQL."""
+    conn.execute(_bump_all)
+
+
+if shard_router is not None:
+    @event.listens_for(SessionLocal, "after_commit")
+    def _apply_deferred_bumps(session):
+        ids = session.info.pop("pending_version_bumps", None)
+        if ids:
+            with engine.begin() as conn:
+                bump_data_version(conn, ids)
+        if session.info.pop("reference_changed", False):
+            shard_router.replicate_reference_tables(models.Base.metadata)
+            with engine.begin() as conn:
+                bump_all_data_versions(conn)
+
+    @event.listens_for(SessionLocal, "after_rollback")
+    def _drop_deferred_bumps(session):
+        session.info.pop("pending_version_bumps", None)
+        session.info.pop("reference_changed", None)
+
+
+def get_data_version(db: Session, user_id: int):
+    return db.execute(_data_version, {"user_id": user_id}).scalar()
+
+
+# -----------------------
+# Conditional GET
+# -----------------------
+def _etag(user_id: int, version: int, representation: str = None) -> str:
+    # weak: the same version may be sent gzip/br/identity encoded;
+    # Arrow/msgpack bodies (see columnar.py) are tagged apart from JSON ones
+    suffix = f"-{representation}" if representation else ""
+    return f'W/"u{user_id}-v{version}{suffix}"'
+
+
+def user_etag(user_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    """Dependency for user-scoped GETs: 304 on a matching If-None-Match, before any query runs."""
+    version = get_data_version(db, user_id)
+    if version is None:
+        return
+    request.state.data_version = version  # keys the report cache (see report_cache.py)
+    etag = _etag(user_id, version, FORMAT_TAGS.get(negotiate(request)))
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = {tag.strip() for tag in if_none_match.split(",")}
+        if etag in candidates or "*" in candidates:
+            raise HTTPException(status_code=304, headers=headers)
+    response.headers.update(headers)
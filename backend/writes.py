@@ -0,0 +1,240 @@
+# backend/writes.py
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from fastapi import HTTPException
+from sqlalchemy import insert, text
+from backend import models
+from backend.database import engine_for_user
+from backend.versioning import versioned_transaction
+
+# --- Group commit configuration ---
+# Off by default: the window adds latency to every insert and only pays for itself
+# with many concurrent writers (see bench_inserts.py for where the crossover is).
+GROUP_COMMIT_ENABLED = os.getenv("GROUP_COMMIT", "0") == "1"
+GROUP_COMMIT_WINDOW_MS = float(os.getenv("GROUP_COMMIT_WINDOW_MS", "5"))
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "500"))
+GROUP_COMMIT_TIMEOUT = 10  # seconds a request waits for its batch
+
+# --- Idempotency configuration ---
+# Keys live in this process only: lost on restart, not shared between workers.
+IDEMPOTENCY_MAX_KEYS = 10_000
+IDEMPOTENCY_TTL_SECONDS = 24 * 60 * 60
+
+
+# -----------------------
+# Multi-row insert
+# -----------------------
+_consecutive_ids = {}
+
+
+def _mysql_ids_are_consecutive(conn):
+    """Lock modes 0/1 hand a multi-row INSERT one consecutive block of auto-increment ids."""
+    key = id(conn.engine)
+    if key not in _consecutive_ids:
+        mode = conn.execute(text("SELECT @@innodb_autoinc_lock_mode")).scalar()
+        _consecutive_ids[key] = int(mode) <= 1
+    return _consecutive_ids[key]
+
+
+def insert_rows(conn, table, rows):
+    """Insert all rows with one multi-row INSERT and return their primary keys in input order.
+
+    Callers bump the users' data versions (see versioning.py).
+    """
+    pk = table.primary_key.columns[0]
+    if conn.dialect.insert_executemany_returning_sort_by_parameter_order:
+        # SQLite >= 3.35 / MariaDB: INSERT ... VALUES (...), (...) RETURNING <pk>
+        result = conn.execute(insert(table).returning(pk, sort_by_parameter_order=True), rows)
+        return list(result.scalars())
+    if conn.dialect.name == "mysql" and _mysql_ids_are_consecutive(conn):
+        result = conn.execute(insert(table).values(rows))
+        first = result.lastrowid
+        return list(range(first, first + len(rows)))
+    # interleaved auto-increment (MySQL 8 default) may not number one statement's rows
+    # consecutively, so fall back to lastrowid per row - still one transaction, one commit
+    return [conn.execute(insert(table).values(**row)).inserted_primary_key[0] for row in rows]
+
+
+def insert_expenses(conn, rows):
+    return insert_rows(conn, models.Expense.__table__, rows)
+
+
+# -----------------------
+# Group commit
+# -----------------------
+class GroupCommitter:
+    """Coalesces inserts arriving within a short window into one INSERT and one commit."""
+
+    def __init__(self, window_ms=GROUP_COMMIT_WINDOW_MS, max_batch=GROUP_COMMIT_MAX_BATCH):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, row) -> Future:
+        self._ensure_started()
+        fut = Future()
+        self._queue.put((row, fut))
+        return fut
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="expense-group-commit", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _flush(self, batch):
+        # one INSERT + commit per database the batch touches (one, unless sharded)
+        by_bind = {}
+        for row, fut in batch:
+            try:
+                bind = engine_for_user(row["user_ID"], for_write=True)
+            except Exception as exc:
+                fut.set_exception(exc)
+                continue
+            by_bind.setdefault(bind, []).append((row, fut))
+        for bind, items in by_bind.items():
+            self._flush_group(bind, items)
+
+    def _flush_group(self, bind, items):
+        try:
+            with versioned_transaction(bind) as (conn, touched):
+                ids = insert_expenses(conn, [row for row, _ in items])
+                touched.update(row["user_ID"] for row, _ in items)
+        except Exception:
+            # one bad row (e.g. unknown category) must not fail its neighbours
+            for row, fut in items:
+                self._flush_one(bind, row, fut)
+            return
+        for (_, fut), expense_id in zip(items, ids):
+            fut.set_result(expense_id)
+
+    def _flush_one(self, bind, row, fut):
+        try:
+            with versioned_transaction(bind) as (conn, touched):
+                expense_id = insert_expenses(conn, [row])[0]
+                touched.add(row["user_ID"])
+            fut.set_result(expense_id)
+        except Exception as exc:
+            fut.set_exception(exc)
+
+
+group_committer = GroupCommitter()
+
+
+# -----------------------
+# Idempotency keys
+# -----------------------
+class _Entry:
+    __slots__ = ("fingerprint", "created", "done", "response")
+
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.created = time.monotonic()
+        self.done = threading.Event()
+        self.response = None
+
+
+class IdempotencyStore:
+    """Bounded in-process store of recent Idempotency-Keys and the responses they produced.
+
+    Entries are kept in creation order and expire IDEMPOTENCY_TTL_SECONDS after
+    they were claimed; past max_keys the oldest finished ones go first. A key
+    still in flight is never evicted, or its retry would run the request again.
+
+    Keys are deduplicated per API process; run a single worker (or a shared store)
+    if retries may land on different processes.
+    """
+
+    def __init__(self, max_keys=IDEMPOTENCY_MAX_KEYS, ttl=IDEMPOTENCY_TTL_SECONDS):
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        expired = []
+        for key, entry in self._entries.items():
+            if now - entry.created < self.ttl:
+                break  # creation order: everything after is younger
+            if entry.done.is_set():
+                expired.append(key)
+        for key in expired:
+            del self._entries[key]
+        excess = len(self._entries) - self.max_keys
+        if excess > 0:
+            finished = [key for key, entry in self._entries.items() if entry.done.is_set()]
+            for key in finished[:excess]:
+                del self._entries[key]
+
+    def claim(self, key, fingerprint):
+        """Return (entry, owner). The owner runs the request; everyone else waits on it."""
+        with self._lock:
+            now = time.monotonic()
+            self._evict(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.fingerprint != fingerprint:
+                    raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request body")
+                return entry, False
+            entry = self._entries[key] = _Entry(fingerprint)
+            return entry, True
+
+    def complete(self, entry, response):
+        entry.response = response
+        entry.done.set()
+
+    def release(self, key, entry):
+        """Forget a failed attempt so the client can retry with the same key."""
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+        entry.done.set()
+
+
+idempotency_store = IdempotencyStore()
+
+
+def _fingerprint(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def run_idempotent(key, payload, fn):
+    """Run fn() once per key; returns (response, replayed)."""
+    if not key:
+        return fn(), False
+    entry, owner = idempotency_store.claim(key, _fingerprint(payload))
+    if not owner:
+        entry.done.wait(GROUP_COMMIT_TIMEOUT)
+        if entry.response is None:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is in progress or failed; retry")
+        return entry.response, True
+    try:
+        response = fn()
+    except Exception:
+        idempotency_store.release(key, entry)
+        raise
+    idempotency_store.complete(entry, response)
+    return response, False
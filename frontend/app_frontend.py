@@ -1,361 +1,904 @@
-import streamlit as st
-import requests
-import pandas as pd
-from datetime import date
-from typing import Optional
-
-
-st.cache_data.clear()
-
-
-API_URL = "http://127.0.0.1:8000"
-TIMEOUT = 10
-
-st.set_page_config(page_title="Expense Tracker", layout="wide")
-
-# -------------------------
-# Session initialization
-# -------------------------
-if "token" not in st.session_state:
-    st.session_state["token"] = None
-if "username" not in st.session_state:
-    st.session_state["username"] = None
-if "user_id" not in st.session_state:
-    st.session_state["user_id"] = None
-if "categories" not in st.session_state:
-    st.session_state["categories"] = []
-if "payment_methods" not in st.session_state:
-    st.session_state["payment_methods"] = []
-
-# -------------------------
-# Helpers
-# -------------------------
-def _headers(token: Optional[str]):
-    headers = {"Content-Type": "application/json"}
-    if token:
-        headers["Authorization"] = f"Bearer {token}"
-    return headers
-
-def try_get(url, token=None):
-    try:
-        return requests.get(url, headers=_headers(token), timeout=TIMEOUT)
-    except Exception as e:
-        return {"error": True, "details": str(e)}
-
-def try_post(url, data, token=None):
-    try:
-        return requests.post(url, json=data, headers=_headers(token), timeout=TIMEOUT)
-    except Exception as e:
-        return {"error": True, "details": str(e)}
-
-def try_put(url, data, token=None):
-    try:
-        return requests.put(url, json=data, headers=_headers(token), timeout=TIMEOUT)
-    except Exception as e:
-        return {"error": True, "details": str(e)}
-
-def try_delete(url, token=None):
-    try:
-        return requests.delete(url, headers=_headers(token), timeout=TIMEOUT)
-    except Exception as e:
-        return {"error": True, "details": str(e)}
-
-# -------------------------
-# Login / Signup
-# -------------------------
-def login_signup_page():
-    st.title("💰 Expense Tracker")
-    st.caption("Manage your expenses, budgets, and reports easily.")
-
-    col1, col2 = st.columns(2)
-
-    # --- SIGNUP ---
-    with col1:
-        st.subheader("Create Account")
-        with st.form("signup_form"):
-            s_user = st.text_input("Username*", key="signup_user")
-            s_pw = st.text_input("Password*", type="password", key="signup_pw")
-            s_email = st.text_input("Email*", key="signup_email")
-            s_contact1 = st.text_input("Contact Number 1*", key="signup_c1")
-            s_contact2 = st.text_input("Contact Number 2 (Optional)", key="signup_c2")
-            submitted = st.form_submit_button("Sign Up")
-
-            if submitted:
-                if not s_user or not s_pw or not s_email or not s_contact1:
-                    st.warning("Please fill all required fields.")
-                else:
-                    payload = {
-                        "user_name": s_user,
-                        "password": s_pw,
-                        "user_email": s_email,
-                        "contact_num_1": s_contact1,
-                        "contact_num_2": s_contact2 or None,
-                    }
-                    r = requests.post(f"{API_URL}/auth/register", json=payload, timeout=TIMEOUT)
-                    if r.status_code == 200:
-                        st.success("✅ Account created! Please login.")
-                    else:
-                        st.error(f"Signup failed: {r.text}")
-
-    # --- LOGIN ---
-    with col2:
-        st.subheader("Login")
-        with st.form("login_form"):
-            l_user = st.text_input("Username", key="login_user")
-            l_pw = st.text_input("Password", type="password", key="login_pw")
-            submitted = st.form_submit_button("Login")
-
-            if submitted:
-                if not l_user or not l_pw:
-                    st.warning("Please enter both username and password.")
-                else:
-                    payload = {"username": l_user, "password": l_pw}
-                    r = requests.post(f"{API_URL}/auth/login", json=payload, timeout=TIMEOUT)
-                    if r.status_code == 200:
-                        data = r.json()
-                        if data.get("status") == "error":
-                            st.error(data.get("message", "Login failed"))
-                        elif data.get("status") == "success":
-                            token = data.get("access_token")
-                            st.session_state["token"] = token
-                            st.session_state["username"] = data.get("username")
-                            st.session_state["user_id"] = data.get("user_id")
-                            st.success("✅ Login successful!")
-                            st.rerun()
-                        else:
-                            st.error("Unexpected response from server.")
-                    else:
-                        st.error(f"⚠️ Backend error: {r.text}")
-
-# -------------------------
-# Dashboard
-# -------------------------
-def dashboard_page():
-    user_id = st.session_state.get("user_id")
-    if not user_id:
-        st.warning("User ID not found in session. Please log in again.")
-        return
-
-    st.sidebar.title(f"👋 {st.session_state['username']}")
-    if st.sidebar.button("🚪 Logout"):
-        for k in ["token", "username", "user_id", "categories", "payment_methods"]:
-            st.session_state[k] = None if k not in ["categories", "payment_methods"] else []
-        st.rerun()
-
-    # Delete account
-    with st.sidebar.expander("⚠️ Danger zone"):
-        st.markdown("### Delete Account")
-        st.warning("This will permanently delete your account and all related data!")
-        confirm = st.text_input("Type DELETE to confirm account deletion", key="delete_confirm")
-        if st.button("🗑️ Delete my account", key="delete_btn"):
-            if confirm == "DELETE":
-                res = try_delete(f"{API_URL}/users/{user_id}", token=st.session_state["token"])
-                if not isinstance(res, dict) and res.status_code == 200:
-                    st.success("✅ Account deleted successfully. Logging out...")
-                    for k in ["token", "username", "user_id", "categories", "payment_methods"]:
-                        st.session_state[k] = None if k not in ["categories", "payment_methods"] else []
-                    st.rerun()
-                else:
-                    st.error(f"❌ Failed to delete account: {res.text if not isinstance(res, dict) else res['details']}")
-            else:
-                st.warning("Please type DELETE in the box above to confirm.")
-
-    # Load categories & payment methods
-    # Fetch categories every time
-    cat_res = try_get(f"{API_URL}/categories", token=st.session_state["token"])
-    if not isinstance(cat_res, dict) and cat_res.status_code == 200:
-        st.session_state["categories"] = cat_res.json()
-
-    # Fetch payment methods every time
-    pm_res = try_get(f"{API_URL}/payment-methods", token=st.session_state["token"])
-    if not isinstance(pm_res, dict) and pm_res.status_code == 200:
-        st.session_state["payment_methods"] = pm_res.json()
-
-
-    cat_options = {c["category_ID"]: c["category_name"] for c in st.session_state["categories"]}
-    pm_options = {p["payment_ID"]: p["payment_type"] for p in st.session_state["payment_methods"]}
-
-    tab1, tab2, tab3 = st.tabs(["➕ Add / Manage Expenses", "💰 Budgets", "📈 Reports"])
-
-    # ---- Expenses tab ----
-    with tab1:
-        st.subheader("Add Expense")
-        with st.form("add_expense", clear_on_submit=True):
-            col1, col2 = st.columns(2)
-            with col1:
-                amount = st.number_input("Amount", min_value=0.01, step=0.01)
-                category_id = st.selectbox("Category", options=list(cat_options.keys()), format_func=lambda k: cat_options[k])
-            with col2:
-                payment_id = st.selectbox("Payment Method", options=list(pm_options.keys()), format_func=lambda k: pm_options[k])
-                exp_date = st.date_input("Date", value=date.today())
-            description = st.text_area("Description")
-            submitted = st.form_submit_button("Add Expense")
-            if submitted:
-                payload = {
-                    "user_ID": user_id,
-                    "category_ID": int(category_id),
-                    "payment_ID": int(payment_id),
-                    "amount": float(amount),
-                    "description": description,
-                    "date": exp_date.isoformat()
-                }
-                res = try_post(f"{API_URL}/expenses/add", payload, token=st.session_state["token"])
-                if not isinstance(res, dict) and res.status_code in (200, 201):
-                    st.success("✅ Expense added!")
-                    st.rerun()
-                else:
-                    st.error(f"Failed to add expense. {res.text if not isinstance(res, dict) else res['details']}")
-           
-
-        st.markdown("----")
-        st.subheader("Your expenses")
-        exp_res = try_get(f"{API_URL}/expenses/{user_id}", token=st.session_state["token"])
-        if isinstance(exp_res, dict) or exp_res.status_code != 200:
-            st.info("No expenses or couldn't fetch them.")
-        else:
-            data = exp_res.json()
-            if data:
-                df = pd.DataFrame(data)
-                df["date"] = pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d")
-                df["category_name"] = df["category_ID"].map(cat_options)
-                df["payment_name"] = df["payment_ID"].map(pm_options)
-                df["amount"] = df["amount"].astype(float)
-                st.dataframe(df[["expense_ID","date","amount","category_name","payment_name","description"]], use_container_width=True)
-
-                st.subheader("📊 Total Spending")
-                total_res = try_get(f"{API_URL}/reports/total-spending/{user_id}", token=st.session_state["token"])
-                if not isinstance(total_res, dict) and total_res.status_code == 200:
-                    st.metric("Total Spending", f"₹{total_res.json().get('total_spending',0):.2f}")
-
-                selected = st.selectbox("Choose expense_ID to edit/delete", df["expense_ID"])
-                row = df[df["expense_ID"] == selected].iloc[0]
-                new_amount = st.number_input("Amount (edit)", value=float(row["amount"]))
-                new_desc = st.text_area("Description (edit)", value=row.get("description",""))
-                if st.button("Update Expense"):
-                    payload = {"amount": float(new_amount), "description": new_desc}
-                    r = try_put(f"{API_URL}/expenses/{int(selected)}", payload, token=st.session_state["token"])
-                    if not isinstance(r, dict) and r.status_code == 200:
-                        st.success("✅ Expense updated!")
-                        st.rerun()
-                if st.button("Delete Expense"):
-                    r = try_delete(f"{API_URL}/expenses/{int(selected)}", token=st.session_state["token"])
-                    if not isinstance(r, dict) and r.status_code == 200:
-                        st.success("🗑️ Expense deleted!")
-                        st.rerun()
-        
-
-    # ---- Budgets tab ----
-    with tab2:
-        st.subheader("Add / Manage Budgets")
-        with st.form("add_budget", clear_on_submit=True):
-            b_cat = st.selectbox("Category", options=list(cat_options.keys()), format_func=lambda k: cat_options[k])
-            b_amt = st.number_input("Amount limit", min_value=0.01, step=0.01)
-            b_start = st.date_input("Start date", value=date.today())
-            b_end = st.date_input("End date", value=date.today())
-            submitted = st.form_submit_button("Save Budget")
-            if submitted:
-                if b_end <= b_start:
-                    st.error("End date must be after start date.")
-                else:
-                    payload = {
-                        "user_ID": user_id,
-                        "category_ID": int(b_cat),
-                        "amount_limit": float(b_amt),
-                        "start_date": b_start.isoformat(),
-                        "end_date": b_end.isoformat()
-                    }
-                    res = try_post(f"{API_URL}/budgets/add", payload, token=st.session_state["token"])
-                    if not isinstance(res, dict) and res.status_code in (200,201):
-                        st.success("✅ Budget saved!")
-                        st.rerun()
-                    else:
-                        st.error(f"Failed to create budget. {res.text if not isinstance(res, dict) else res['details']}")
-
-        st.markdown("----")
-        st.subheader("Your budgets")
-        bud_res = try_get(f"{API_URL}/budgets/{user_id}", token=st.session_state["token"])
-        if isinstance(bud_res, dict) or bud_res.status_code != 200:
-            st.info("No budgets or couldn't fetch them.")
-        else:
-            budgets = bud_res.json()
-            if budgets:
-                dfb = pd.DataFrame(budgets)
-                dfb["category_name"] = dfb["category_ID"].map(cat_options)
-                st.dataframe(dfb[["budget_ID","category_name","amount_limit","start_date","end_date"]], use_container_width=True)
-
-                sel_bid = st.selectbox("Select budget_ID to edit/delete", dfb["budget_ID"])
-                row = dfb[dfb["budget_ID"] == sel_bid].iloc[0]
-                new_limit = st.number_input("New amount limit", value=float(row["amount_limit"]))
-                new_start = st.date_input("New start date", value=pd.to_datetime(row["start_date"]).date())
-                new_end = st.date_input("New end date", value=pd.to_datetime(row["end_date"]).date())
-                if st.button("Update Budget"):
-                    payload = {
-                        "amount_limit": float(new_limit),
-                        "start_date": new_start.isoformat(),
-                        "end_date": new_end.isoformat()
-                    }
-                    r = try_put(f"{API_URL}/budgets/{int(sel_bid)}", payload, token=st.session_state["token"])
-                    if not isinstance(r, dict) and r.status_code == 200:
-                        st.success("✅ Budget updated!")
-                        st.rerun()
-                if st.button("Delete Budget"):
-                    r = try_delete(f"{API_URL}/budgets/{int(sel_bid)}", token=st.session_state["token"])
-                    if not isinstance(r, dict) and r.status_code == 200:
-                        st.success("🗑️ Budget deleted!")
-                        st.rerun()
-
-    # ---- Reports tab ----
-    with tab3:
-        st.subheader("📊 Total Spending")
-        total_res = try_get(f"{API_URL}/reports/total-spending/{user_id}", token=st.session_state["token"])
-        if not isinstance(total_res, dict) and total_res.status_code == 200:
-            st.metric("Total Spending", f"₹{total_res.json().get('total_spending',0):.2f}")
-
-        st.markdown("----")
-        st.subheader("Spending by category")
-        rep_res = try_get(f"{API_URL}/reports/spending-by-category/{user_id}", token=st.session_state["token"])
-        if not isinstance(rep_res, dict) and rep_res.status_code == 200:
-            data = rep_res.json()
-            if data:
-                rdf = pd.DataFrame(data)
-                rdf["total"] = rdf["total"].astype(float)
-                st.bar_chart(rdf.set_index("category_name")["total"])
-            else:
-                st.info("No data for reports.")
-        else:
-            st.info("No report data or endpoint not available.")
-
-        st.markdown("----")
-        st.subheader("📆 Monthly Spending Trend")
-
-        monthly_res = try_get(f"{API_URL}/reports/monthly-spending/{user_id}", token=st.session_state["token"])
-        if not isinstance(monthly_res, dict) and monthly_res.status_code == 200:
-            data = monthly_res.json()
-            if data:
-                mdf = pd.DataFrame(data)
-
-                # Convert to datetime safely
-                mdf["month_dt"] = pd.to_datetime(mdf["month"], format="%Y-%m", errors="coerce")
-
-                # Sort by datetime
-                mdf = mdf.sort_values("month_dt")
-
-                # Create readable month labels
-                mdf["month_label"] = mdf["month_dt"].dt.strftime("%b %Y")
-
-                # ✅ Ensure x-axis is ordered by datetime
-                st.bar_chart(data=mdf, x="month_label", y="total", use_container_width=True)
-
-            else:
-                st.info("No monthly data yet.")
-        else:
-            st.warning("Couldn't fetch monthly report.")
-
-
-# -------------------------
-# Run app
-# -------------------------
-if st.session_state["token"]:
-    dashboard_page()
-else:
-    login_signup_page()
+import streamlit as st
+from streamlit.errors import StreamlitAPIException
+import requests
+import pandas as pd
+import uuid
+import hashlib
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import date
+from typing import Optional
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None  # list responses then come as JSON
+
+PAGE_START = time.perf_counter()
+
+
+st.cache_data.clear()
+
+
+API_URL = "http://127.0.0.1:8000"
+TIMEOUT = 10  # cap on any single call
+CONNECT_TIMEOUT = 2
+PAGE_BUDGET = 8  # seconds one render (the page, or a panel rerun) may spend waiting on the backend
+GET_RETRIES = 2  # only GETs are retried; writes go out once
+RETRY_STATUSES = {429, 502, 503, 504}
+BACKOFF_BASE, BACKOFF_CAP = 0.2, 2.0  # seconds; full jitter
+BREAKER_FAILURES = 5  # consecutive failures that open the circuit
+BREAKER_COOLDOWN = 15  # seconds before a probe is let through
+FETCH_WORKERS = 16  # threads for concurrent GETs, shared by all sessions
+PAGE_SIZE = 50  # rows per page of the expense grid
+REPORTS_REFRESH = 30  # seconds between report refreshes; unchanged reports come back as 304s
+ARROW = "application/vnd.apache.arrow.stream"
+# list and report GETs answer Arrow columns when asked (see backend/columnar.py); the rest stay JSON
+ACCEPT = f"{ARROW}, application/json;q=0.9" if pa is not None else "application/json"
+
+st.set_page_config(page_title="Expense Tracker", layout="wide")
+
+# -------------------------
+# Session initialization
+# -------------------------
+if "token" not in st.session_state:
+    st.session_state["token"] = None
+if "username" not in st.session_state:
+    st.session_state["username"] = None
+if "user_id" not in st.session_state:
+    st.session_state["user_id"] = None
+if "categories" not in st.session_state:
+    st.session_state["categories"] = []
+if "payment_methods" not in st.session_state:
+    st.session_state["payment_methods"] = []
+# reused across retries of the same submission so the backend can dedupe it;
+# rotated after every successful add
+if "expense_idem_key" not in st.session_state:
+    st.session_state["expense_idem_key"] = str(uuid.uuid4())
+
+# -------------------------
+# Helpers
+# -------------------------
+def _headers(token: Optional[str]):
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    # the backend rate-limits anonymous calls by the browser's address, not this server's
+    if st.context.ip_address:
+        headers["X-Forwarded-For"] = st.context.ip_address
+    return headers
+
+def _idempotency_key(nonce_key, payload):
+    digest = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:16]
+    return f"{st.session_state[nonce_key]}-{digest}"
+
+class CircuitBreaker:
+    """Fails backend calls fast while the backend keeps failing.
+
+    closed -> open after BREAKER_FAILURES consecutive failures (errors and 5xx);
+    open -> one probe after BREAKER_COOLDOWN seconds, whose outcome closes or reopens it.
+    """
+
+    def __init__(self, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN):
+        self.threshold = failures
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.probing else "open"
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self.probing = True
+            return True
+
+    def record(self, ok):
+        with self.lock:
+            self.probing = False
+            if ok:
+                self.failures, self.opened_at = 0, None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+@st.cache_resource
+def backend():
+    """Pooled HTTP session and circuit breaker, shared by every session of this process."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=32)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session, CircuitBreaker()
+
+@st.cache_resource
+def fetch_pool():
+    """Threads that run a render's independent GETs at once (see prefetch)."""
+    return ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="fetch")
+
+@contextmanager
+def latency_budget(seconds):
+    """Backend calls made inside share one deadline; a nested budget keeps the outer one.
+
+    The outermost budget is the render: responses prefetched for it are dropped with it.
+    """
+    if st.session_state.get("deadline") is not None:
+        yield
+        return
+    st.session_state["deadline"] = time.perf_counter() + seconds
+    try:
+        yield
+    finally:
+        st.session_state["deadline"] = None
+        st.session_state.pop("prefetched", None)
+
+def _timeout(deadline):
+    """(connect, read) timeout for the next call: what's left of the budget, at most TIMEOUT; None once spent."""
+    total = TIMEOUT if deadline is None else min(TIMEOUT, deadline - time.perf_counter())
+    if total <= 0:
+        return None
+    return (min(CONNECT_TIMEOUT, total), total)
+
+def _retry_delay(attempt, res):
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    try:
+        return max(delay, float(res.headers.get("Retry-After", 0)))
+    except (AttributeError, ValueError):
+        return delay
+
+def _send(transport, method, url, deadline, retries=0, **kwargs):
+    """One backend call through the breaker, retried `retries` times while the deadline allows.
+
+    Returns the Response, or an error dict like the try_* helpers always have.
+    Doesn't touch st.session_state, so prefetch can run it on worker threads.
+    """
+    session, breaker = transport
+    for attempt in range(retries + 1):
+        timeout = _timeout(deadline)
+        if timeout is None:
+            return {"error": True, "details": "Skipped: this page already spent its time budget on the server."}
+        if not breaker.allow():
+            return {"error": True, "details": "The server is unavailable right now; try again shortly."}
+        try:
+            res = session.request(method, url, timeout=timeout, **kwargs)
+        except Exception as e:
+            breaker.record(False)
+            res = {"error": True, "details": str(e)}
+        else:
+            breaker.record(res.status_code < 500)
+            if res.status_code not in RETRY_STATUSES:
+                return res
+        if attempt == retries:
+            break
+        delay = _retry_delay(attempt, res)
+        if deadline is not None and time.perf_counter() + delay >= deadline:
+            break
+        time.sleep(delay)
+    return res
+
+def _timed_get(transport, url, deadline, headers):
+    start = time.perf_counter()
+    res = _send(transport, "GET", url, deadline, GET_RETRIES, headers=headers)
+    return res, time.perf_counter() - start
+
+def _write(method, url, **kwargs):
+    # reads prefetched for this render may predate the write
+    st.session_state.pop("prefetched", None)
+    return _send(backend(), method, url, st.session_state.get("deadline"), **kwargs)
+
+def _revalidation(url, token):
+    """Headers for a GET of url, and the cached response they revalidate (None if there is none)."""
+    # conditional GET: the backend answers 304 when the user's data hasn't changed
+    cached = st.session_state.setdefault("response_cache", {}).get(url)
+    headers = _headers(token)
+    headers["Accept"] = ACCEPT
+    if cached is not None and cached.headers.get("ETag"):
+        headers["If-None-Match"] = cached.headers["ETag"]
+    return headers, cached
+
+def _settle(url, cached, res):
+    """What try_get returns for a GET's outcome: the fresh response, the revalidated copy, or a stale one."""
+    if isinstance(res, dict) or res.status_code >= 500 or res.status_code == 429:
+        if cached is None:
+            return res
+        # degraded backend: serve the last good copy; render_timer says how old it is
+        stale = st.session_state.get("stale_reads")
+        if stale is not None:
+            stale.append(cached.fetched_at)
+        return cached
+    if res.status_code == 304 and cached is not None:
+        cached.fetched_at = time.time()
+        return cached
+    if res.status_code == 200:
+        res.fetched_at = time.time()
+        st.session_state["response_cache"][url] = res
+    return res
+
+def try_get(url, token=None):
+    prefetched = st.session_state.get("prefetched", {})
+    if url in prefetched:
+        return prefetched[url]
+    headers, cached = _revalidation(url, token)
+    return _settle(url, cached, _send(backend(), "GET", url, st.session_state.get("deadline"), GET_RETRIES, headers=headers))
+
+def prefetch(urls, token=None, label="page"):
+    """GET urls concurrently, for try_get to answer from memory for the rest of this render.
+
+    Results are in once every request is done or the render's deadline passes,
+    whichever is first; a request still running then counts as failed (and may
+    be served stale). URLs already prefetched in this render are skipped.
+    """
+    prefetched = st.session_state.setdefault("prefetched", {})
+    urls = [url for url in dict.fromkeys(urls) if url not in prefetched]
+    if not urls:
+        return
+    transport, deadline = backend(), st.session_state.get("deadline")
+    start = time.perf_counter()
+    jobs = {}
+    for url in urls:
+        headers, cached = _revalidation(url, token)
+        jobs[url] = cached, fetch_pool().submit(_timed_get, transport, url, deadline, headers)
+    futures = [future for _, future in jobs.values()]
+    wait(futures, timeout=None if deadline is None else max(0, deadline - time.perf_counter()))
+    sequential = 0
+    for url, (cached, future) in jobs.items():
+        if future.done():
+            res, seconds = future.result()
+            sequential += seconds
+        else:
+            res = {"error": True, "details": "Timed out: this page ran out of time for the server."}
+        prefetched[url] = _settle(url, cached, res)
+    # wall time vs. what the same calls would have taken one after another
+    st.session_state.setdefault("fetch_ms", {})[label] = (
+        len(urls), (time.perf_counter() - start) * 1000, sequential * 1000,
+    )
+
+def _sync_url(user_id):
+    # only budgets are mirrored: the expense grid pages through /expenses instead
+    local = st.session_state.get("sync")
+    url = f"{API_URL}/sync/{user_id}?entities=budgets"
+    if local and local["user_id"] == user_id and local["cursor"]:
+        url += f"&since={requests.utils.quote(local['cursor'])}"
+    return url
+
+def sync_user_data(user_id, token):
+    """Pull only the budgets that changed since the last render and merge them into the local copy."""
+    local = st.session_state.get("sync")
+    if not local or local["user_id"] != user_id:
+        local = {"user_id": user_id, "cursor": None, "budgets": {}}
+    res = try_get(_sync_url(user_id), token=token)
+    if isinstance(res, dict) or res.status_code != 200:
+        # keep serving the last synced copy, if any
+        return local if local["cursor"] else None
+
+    delta = res.json()
+    if delta["full"]:
+        local["budgets"] = {}
+    for b in delta["budgets"]:
+        local["budgets"][b["budget_ID"]] = b
+    for bid in delta["deleted"]["budgets"]:
+        local["budgets"].pop(bid, None)
+    local["cursor"] = delta["cursor"]
+    st.session_state["sync"] = local
+    return local
+
+@contextmanager
+def render_timer(panel):
+    """Time one panel's render for the debug panel; shown inline when debug timings are on.
+
+    The panel's backend calls share a PAGE_BUDGET (the page's, on a full run), and
+    a banner above the panel says so when some of its data had to be served stale.
+    """
+    start = time.perf_counter()
+    banner = st.empty()
+    stale = st.session_state["stale_reads"] = []
+    st.session_state.setdefault("fetch_ms", {}).pop(panel, None)
+    with latency_budget(PAGE_BUDGET):
+        yield
+    if stale:
+        minutes = (time.time() - min(stale)) / 60
+        banner.warning(f"⚠️ The server is slow or unavailable. Showing data from {minutes:.0f} min ago; it refreshes once the server recovers.")
+    ms = (time.perf_counter() - start) * 1000
+    st.session_state.setdefault("render_ms", {})[panel] = ms
+    if st.session_state.get("debug_timings"):
+        fetched = _fetch_summary(panel)
+        st.caption(f"⏱️ {panel} rendered in {ms:.0f} ms" + (f"; {fetched}" if fetched else ""))
+
+def _fetch_summary(label):
+    timing = st.session_state.get("fetch_ms", {}).get(label)
+    if timing is None:
+        return None
+    calls, wall, sequential = timing
+    return f"{calls} concurrent GETs in {wall:.0f} ms ({sequential:.0f} ms one after another)"
+
+def response_frame(res):
+    """DataFrame of a list response: Arrow columns load as typed arrays, JSON is parsed row by row."""
+    if res.headers.get("Content-Type", "").startswith(ARROW):
+        return pa.ipc.open_stream(res.content).read_pandas(date_as_object=False)
+    return pd.DataFrame(res.json())
+
+def cached_frame(res, build=None):
+    """DataFrame for a GET response, rebuilt only when the response's ETag changes.
+
+    build(df) shapes a non-empty frame for display; an empty one is returned as is.
+    """
+    frames = st.session_state.setdefault("frames", {})
+    etag = res.headers.get("ETag")
+    hit = frames.get(res.url)
+    if etag and hit and hit[0] == etag:
+        return hit[1]
+    df = response_frame(res)
+    if build is not None and not df.empty:
+        df = build(df)
+    frames[res.url] = (etag, df)
+    return df
+
+def rerun_panel():
+    """Rerun only the calling panel; a full run (e.g. a panel's first render) reruns the page."""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+def clear_session():
+    for k in ["token", "username", "user_id", "categories", "payment_methods"]:
+        st.session_state[k] = None if k not in ["categories", "payment_methods"] else []
+    for k in ["sync", "response_cache", "prefetched", "frames", "render_ms", "fetch_ms", "expense_pages", "grid_version"]:
+        st.session_state.pop(k, None)
+
+def try_post(url, data, token=None, idempotency_key=None):
+    headers = _headers(token)
+    if idempotency_key:
+        headers["Idempotency-Key"] = idempotency_key
+    return _write("POST", url, json=data, headers=headers)
+
+def try_put(url, data, token=None):
+    return _write("PUT", url, json=data, headers=_headers(token))
+
+def try_delete(url, token=None):
+    return _write("DELETE", url, headers=_headers(token))
+
+# -------------------------
+# Login / Signup
+# -------------------------
+def login_signup_page():
+    st.title("💰 Expense Tracker")
+    st.caption("Manage your expenses, budgets, and reports easily.")
+
+    col1, col2 = st.columns(2)
+
+    # --- SIGNUP ---
+    with col1:
+        st.subheader("Create Account")
+        with st.form("signup_form"):
+            s_user = st.text_input("Username*", key="signup_user")
+            s_pw = st.text_input("Password*", type="password", key="signup_pw")
+            s_email = st.text_input("Email*", key="signup_email")
+            s_contact1 = st.text_input("Contact Number 1*", key="signup_c1")
+            s_contact2 = st.text_input("Contact Number 2 (Optional)", key="signup_c2")
+            submitted = st.form_submit_button("Sign Up")
+
+            if submitted:
+                if not s_user or not s_pw or not s_email or not s_contact1:
+                    st.warning("Please fill all required fields.")
+                else:
+                    payload = {
+                        "user_name": s_user,
+                        "password": s_pw,
+                        "user_email": s_email,
+                        "contact_num_1": s_contact1,
+                        "contact_num_2": s_contact2 or None,
+                    }
+                    r = requests.post(f"{API_URL}/auth/register", json=payload, headers=_headers(None), timeout=TIMEOUT)
+                    if r.status_code == 200:
+                        st.success("✅ Account created! Please login.")
+                    else:
+                        st.error(f"Signup failed: {r.text}")
+
+    # --- LOGIN ---
+    with col2:
+        st.subheader("Login")
+        with st.form("login_form"):
+            l_user = st.text_input("Username", key="login_user")
+            l_pw = st.text_input("Password", type="password", key="login_pw")
+            submitted = st.form_submit_button("Login")
+
+            if submitted:
+                if not l_user or not l_pw:
+                    st.warning("Please enter both username and password.")
+                else:
+                    payload = {"username": l_user, "password": l_pw}
+                    r = requests.post(f"{API_URL}/auth/login", json=payload, headers=_headers(None), timeout=TIMEOUT)
+                    if r.status_code == 200:
+                        data = r.json()
+                        if data.get("status") == "error":
+                            st.error(data.get("message", "Login failed"))
+                        elif data.get("status") == "success":
+                            token = data.get("access_token")
+                            st.session_state["token"] = token
+                            st.session_state["username"] = data.get("username")
+                            st.session_state["user_id"] = data.get("user_id")
+                            st.success("✅ Login successful!")
+                            st.rerun()
+                        else:
+                            st.error("Unexpected response from server.")
+                    else:
+                        st.error(f"⚠️ Backend error: {r.text}")
+
+# -------------------------
+# Dashboard panels
+# Each panel is a fragment: its widgets rerun only that panel, and a mutation
+# reruns only the panel it was made in.
+# -------------------------
+def _expense_frame(df, cat_options, pm_options):
+    df["date"] = pd.to_datetime(df["date"]).dt.date
+    # the listing returns names inline; fall back to the lookups for anything it couldn't name
+    df["category_name"] = df["category_name"].fillna(df["category_ID"].map(cat_options))
+    df["payment_name"] = df["payment_name"].fillna(df["payment_ID"].map(pm_options))
+    df["amount"] = df["amount"].astype(float)
+    return df
+
+def _grid_operations(edits, df, cat_options, pm_options):
+    """POST /batch operations for the edits, additions and deletions made in the expense grid."""
+    cat_ids = {name: cid for cid, name in cat_options.items()}
+    pm_ids = {name: pid for pid, name in pm_options.items()}
+
+    def to_api(row):
+        data = {
+            "amount": row.get("amount"),
+            "description": row.get("description"),
+            "category_ID": cat_ids.get(row.get("category_name")),
+            "payment_ID": pm_ids.get(row.get("payment_name")),
+            "date": pd.Timestamp(row["date"]).isoformat() if row.get("date") else None,
+        }
+        return {k: v for k, v in data.items() if v is not None}
+
+    row_id = lambda i: int(df.iloc[int(i)]["expense_ID"])
+    deleted = {int(i) for i in edits["deleted_rows"]}
+    # /batch takes one update or delete per row: edits to a deleted row are dropped
+    ops = [{"op": "update", "entity": "expense", "id": row_id(i), "data": to_api(changes)}
+           for i, changes in edits["edited_rows"].items() if int(i) not in deleted]
+    ops += [{"op": "create", "entity": "expense", "data": to_api(row)} for row in edits["added_rows"]]
+    ops += [{"op": "delete", "entity": "expense", "id": row_id(i)} for i in edits["deleted_rows"]]
+    return ops
+
+def _expense_urls(user_id):
+    """The GETs expenses_panel makes on every render."""
+    # server-side pages, newest first; expense_pages holds the cursor each visited page started after
+    pages = st.session_state.setdefault("expense_pages", [None])
+    url = f"{API_URL}/expenses/{user_id}?limit={PAGE_SIZE}"
+    if pages[-1]:
+        url += f"&after={requests.utils.quote(pages[-1])}"
+    return {"total": f"{API_URL}/reports/total-spending/{user_id}", "page": url}
+
+@st.fragment
+def expenses_panel(user_id, cat_options, pm_options):
+    with render_timer("expenses"):
+        urls = _expense_urls(user_id)
+        prefetch(urls.values(), token=st.session_state["token"], label="expenses")
+        st.subheader("Add Expense")
+        with st.form("add_expense", clear_on_submit=True):
+            col1, col2 = st.columns(2)
+            with col1:
+                amount = st.number_input("Amount", min_value=0.01, step=0.01)
+                category_id = st.selectbox("Category", options=list(cat_options.keys()), format_func=lambda k: cat_options[k])
+            with col2:
+                payment_id = st.selectbox("Payment Method", options=list(pm_options.keys()), format_func=lambda k: pm_options[k])
+                exp_date = st.date_input("Date", value=date.today())
+            description = st.text_area("Description")
+            submitted = st.form_submit_button("Add Expense")
+            if submitted:
+                payload = {
+                    "user_ID": user_id,
+                    "category_ID": int(category_id),
+                    "payment_ID": int(payment_id),
+                    "amount": float(amount),
+                    "description": description,
+                    "date": exp_date.isoformat()
+                }
+                res = try_post(f"{API_URL}/expenses/add", payload, token=st.session_state["token"],
+                               idempotency_key=_idempotency_key("expense_idem_key", payload))
+                if not isinstance(res, dict) and res.status_code in (200, 201):
+                    st.session_state["expense_idem_key"] = str(uuid.uuid4())
+                    st.session_state["expense_pages"] = [None]  # new expenses land on the first page
+                    st.success("✅ Expense added!")
+                    rerun_panel()
+                else:
+                    st.error(f"Failed to add expense. {res.text if not isinstance(res, dict) else res['details']}")
+
+        st.markdown("----")
+        st.subheader("📊 Total Spending")
+        total_res = try_get(urls["total"], token=st.session_state["token"])
+        if not isinstance(total_res, dict) and total_res.status_code == 200:
+            st.metric("Total Spending", f"₹{total_res.json().get('total_spending',0):.2f}")
+
+        st.subheader("Your expenses")
+        pages = st.session_state["expense_pages"]
+        res = try_get(urls["page"], token=st.session_state["token"])
+        if isinstance(res, dict) or res.status_code != 200:
+            st.info("No expenses or couldn't fetch them.")
+            return
+        df = cached_frame(res, lambda df: _expense_frame(df, cat_options, pm_options))
+        if df.empty:
+            if len(pages) > 1:  # the last row of this page was deleted
+                pages.pop()
+                rerun_panel()
+            st.info("No expenses yet.")
+            return
+        # edit cells, add or delete rows, then save them all with one POST /batch
+        grid_key = f"expense_grid_{st.session_state.setdefault('grid_version', 0)}_{pages[-1]}"
+        st.data_editor(
+            df[["expense_ID","date","amount","category_name","payment_name","description"]],
+            key=grid_key,
+            num_rows="dynamic",
+            hide_index=True,
+            disabled=["expense_ID"],
+            column_config={
+                "date": st.column_config.DateColumn("date", required=True),
+                "amount": st.column_config.NumberColumn("amount", min_value=0.01, step=0.01, required=True),
+                "category_name": st.column_config.SelectboxColumn("category", options=list(cat_options.values()), required=True),
+                "payment_name": st.column_config.SelectboxColumn("payment", options=list(pm_options.values()), required=True),
+            },
+            use_container_width=True,
+        )
+        ops = _grid_operations(st.session_state[grid_key], df, cat_options, pm_options)
+        if st.button(f"💾 Save changes ({len(ops)})", disabled=not ops, key="grid_save"):
+            res = try_post(f"{API_URL}/batch", {"user_ID": user_id, "operations": ops}, token=st.session_state["token"])
+            if not isinstance(res, dict) and res.status_code == 200:
+                st.session_state["grid_version"] += 1  # fresh editor without the saved edits
+                if any(op["op"] == "create" for op in ops):
+                    st.session_state["expense_pages"] = [None]
+                st.success("✅ Changes saved!")
+                rerun_panel()
+            else:
+                st.error(f"Failed to save changes. {res.text if not isinstance(res, dict) else res['details']}")
+
+        next_cursor = res.headers.get("X-Next-Cursor")
+        prev_col, page_col, next_col = st.columns([1, 4, 1])
+        if prev_col.button("◀ Newer", disabled=len(pages) == 1, key="page_prev"):
+            pages.pop()
+            rerun_panel()
+        page_col.caption(f"Page {len(pages)}")
+        if next_col.button("Older ▶", disabled=not next_cursor, key="page_next"):
+            pages.append(next_cursor)
+            rerun_panel()
+
+@st.fragment
+def search_panel(user_id, cat_options):
+    with render_timer("search"):
+        st.subheader("🔍 Search expenses")
+        search_q = st.text_input("Search descriptions", key="search_q", placeholder="e.g. netflix")
+        if search_q.strip():
+            s_res = try_get(f"{API_URL}/expenses/{user_id}/search?q={requests.utils.quote(search_q)}", token=st.session_state["token"])
+            if not isinstance(s_res, dict) and s_res.status_code == 200 and s_res.json():
+                sdf = pd.DataFrame(s_res.json())
+                sdf["date"] = pd.to_datetime(sdf["date"]).dt.strftime("%Y-%m-%d")
+                sdf["category_name"] = sdf["category_ID"].map(cat_options)
+                st.dataframe(sdf[["expense_ID","date","amount","category_name","description"]], use_container_width=True)
+            else:
+                st.info("No matching expenses.")
+
+@st.fragment
+def archive_panel(user_id, cat_options):
+    with render_timer("archive"):
+        # older months live in cold storage; fetched only when asked for
+        arch_res = try_get(f"{API_URL}/expenses/{user_id}/archive", token=st.session_state["token"])
+        if not isinstance(arch_res, dict) and arch_res.status_code == 200 and arch_res.json():
+            with st.expander("🗄️ Archived expenses"):
+                months = {m["month"]: m for m in arch_res.json()}
+                month = st.selectbox("Month", options=list(months)[::-1],
+                                     format_func=lambda m: f"{m} ({months[m]['count']} expenses, ₹{months[m]['total']:.2f})")
+                if st.button("Load archived month"):
+                    m_res = try_get(f"{API_URL}/expenses/{user_id}/archive/{month}", token=st.session_state["token"])
+                    if not isinstance(m_res, dict) and m_res.status_code == 200:
+                        adf = pd.DataFrame(m_res.json())
+                        adf["date"] = pd.to_datetime(adf["date"]).dt.strftime("%Y-%m-%d")
+                        adf["category_name"] = adf["category_ID"].map(cat_options)
+                        st.dataframe(adf[["expense_ID","date","amount","category_name","description"]], use_container_width=True)
+
+@st.fragment
+def budgets_panel(user_id, cat_options):
+    with render_timer("budgets"):
+        st.subheader("Add / Manage Budgets")
+        with st.form("add_budget", clear_on_submit=True):
+            b_cat = st.selectbox("Category", options=list(cat_options.keys()), format_func=lambda k: cat_options[k])
+            b_amt = st.number_input("Amount limit", min_value=0.01, step=0.01)
+            b_start = st.date_input("Start date", value=date.today())
+            b_end = st.date_input("End date", value=date.today())
+            submitted = st.form_submit_button("Save Budget")
+            if submitted:
+                if b_end <= b_start:
+                    st.error("End date must be after start date.")
+                else:
+                    payload = {
+                        "user_ID": user_id,
+                        "category_ID": int(b_cat),
+                        "amount_limit": float(b_amt),
+                        "start_date": b_start.isoformat(),
+                        "end_date": b_end.isoformat()
+                    }
+                    res = try_post(f"{API_URL}/budgets/add", payload, token=st.session_state["token"])
+                    if not isinstance(res, dict) and res.status_code in (200,201):
+                        st.success("✅ Budget saved!")
+                        rerun_panel()
+                    else:
+                        st.error(f"Failed to create budget. {res.text if not isinstance(res, dict) else res['details']}")
+
+        st.markdown("----")
+        st.subheader("Your budgets")
+        # budgets: local copy kept current with deltas from /sync
+        synced = sync_user_data(user_id, st.session_state["token"])
+        if synced is None:
+            st.info("No budgets or couldn't fetch them.")
+            return
+        budgets = sorted(synced["budgets"].values(), key=lambda b: b["budget_ID"])
+        if budgets:
+            dfb = pd.DataFrame(budgets)
+            dfb["category_name"] = dfb["category_ID"].map(cat_options)
+            st.dataframe(dfb[["budget_ID","category_name","amount_limit","start_date","end_date"]], use_container_width=True)
+
+            sel_bid = st.selectbox("Select budget_ID to edit/delete", dfb["budget_ID"])
+            row = dfb[dfb["budget_ID"] == sel_bid].iloc[0]
+            new_limit = st.number_input("New amount limit", value=float(row["amount_limit"]))
+            new_start = st.date_input("New start date", value=pd.to_datetime(row["start_date"]).date())
+            new_end = st.date_input("New end date", value=pd.to_datetime(row["end_date"]).date())
+            if st.button("Update Budget"):
+                payload = {
+                    "amount_limit": float(new_limit),
+                    "start_date": new_start.isoformat(),
+                    "end_date": new_end.isoformat()
+                }
+                r = try_put(f"{API_URL}/budgets/{int(sel_bid)}", payload, token=st.session_state["token"])
+                if not isinstance(r, dict) and r.status_code == 200:
+                    st.success("✅ Budget updated!")
+                    rerun_panel()
+            if st.button("Delete Budget"):
+                r = try_delete(f"{API_URL}/budgets/{int(sel_bid)}", token=st.session_state["token"])
+                if not isinstance(r, dict) and r.status_code == 200:
+                    st.success("🗑️ Budget deleted!")
+                    rerun_panel()
+
+def _monthly_frame(mdf):
+    # Convert to datetime safely
+    mdf["month_dt"] = pd.to_datetime(mdf["month"], format="%Y-%m", errors="coerce")
+    # Sort by datetime
+    mdf = mdf.sort_values("month_dt")
+    # Create readable month labels
+    mdf["month_label"] = mdf["month_dt"].dt.strftime("%b %Y")
+    return mdf
+
+def _rolling_frame(rodf):
+    rodf["date"] = pd.to_datetime(rodf["date"])
+    return rodf.set_index("date")[["avg_7d", "avg_30d", "avg_90d"]]
+
+def _report_urls(user_id):
+    """The GETs reports_panel makes on every render, by report."""
+    return {
+        report: f"{API_URL}/reports/{report}/{user_id}"
+        for report in ("total-spending", "spending-by-category", "monthly-spending", "rolling", "period-over-period", "anomalies")
+    }
+
+# expenses change in other panels: re-poll; the conditional GETs make an unchanged refresh cheap
+@st.fragment(run_every=REPORTS_REFRESH)
+def reports_panel(user_id):
+    with render_timer("reports"):
+        urls = _report_urls(user_id)
+        prefetch(urls.values(), token=st.session_state["token"], label="reports")
+        st.subheader("📊 Total Spending")
+        total_res = try_get(urls["total-spending"], token=st.session_state["token"])
+        if not isinstance(total_res, dict) and total_res.status_code == 200:
+            st.metric("Total Spending", f"₹{total_res.json().get('total_spending',0):.2f}")
+
+        st.markdown("----")
+        st.subheader("Spending by category")
+        rep_res = try_get(urls["spending-by-category"], token=st.session_state["token"])
+        if not isinstance(rep_res, dict) and rep_res.status_code == 200:
+            rdf = cached_frame(rep_res, lambda df: df.astype({"total": float}))
+            if not rdf.empty:
+                st.bar_chart(rdf.set_index("category_name")["total"])
+            else:
+                st.info("No data for reports.")
+        else:
+            st.info("No report data or endpoint not available.")
+
+        st.markdown("----")
+        st.subheader("📆 Monthly Spending Trend")
+
+        monthly_res = try_get(urls["monthly-spending"], token=st.session_state["token"])
+        if not isinstance(monthly_res, dict) and monthly_res.status_code == 200:
+            mdf = cached_frame(monthly_res, _monthly_frame)
+            if not mdf.empty:
+                # ✅ Ensure x-axis is ordered by datetime
+                st.bar_chart(data=mdf, x="month_label", y="total", use_container_width=True)
+            else:
+                st.info("No monthly data yet.")
+        else:
+            st.warning("Couldn't fetch monthly report.")
+
+        st.markdown("----")
+        st.subheader("📉 Rolling Averages")
+        rolling_res = try_get(urls["rolling"], token=st.session_state["token"])
+        if not isinstance(rolling_res, dict) and rolling_res.status_code == 200:
+            rodf = cached_frame(rolling_res, _rolling_frame)
+            if not rodf.empty:
+                st.line_chart(rodf, use_container_width=True)
+            else:
+                st.info("No spending history yet.")
+
+        pop_res = try_get(urls["period-over-period"], token=st.session_state["token"])
+        pdf = cached_frame(pop_res) if not isinstance(pop_res, dict) and pop_res.status_code == 200 else None
+        if pdf is not None and not pdf.empty:
+            st.dataframe(pdf[["month", "total", "mom_change", "mom_pct", "yoy_change", "yoy_pct"]], use_container_width=True)
+
+        anomalies_res = try_get(urls["anomalies"], token=st.session_state["token"])
+        adf = cached_frame(anomalies_res) if not isinstance(anomalies_res, dict) and anomalies_res.status_code == 200 else None
+        if adf is not None and not adf.empty:
+            st.markdown("----")
+            st.subheader("🚨 Unusual Spending")
+            st.caption("Months where a category ran well above its usual level (checked nightly).")
+            st.dataframe(adf[["month", "category_name", "amount", "baseline", "ratio"]], use_container_width=True)
+
+@st.fragment
+def recurring_panel(user_id, cat_options, pm_options):
+    with render_timer("recurring"):
+        st.subheader("Add Recurring Expense")
+        st.caption("Rent, subscriptions and EMIs are added automatically on each due date.")
+        with st.form("add_recurring", clear_on_submit=True):
+            col1, col2 = st.columns(2)
+            with col1:
+                r_amount = st.number_input("Amount", min_value=0.01, step=0.01, key="r_amount")
+                r_cat = st.selectbox("Category", options=list(cat_options.keys()), format_func=lambda k: cat_options[k], key="r_cat")
+                r_pm = st.selectbox("Payment Method", options=list(pm_options.keys()), format_func=lambda k: pm_options[k], key="r_pm")
+            with col2:
+                r_freq = st.selectbox("Repeats", ["monthly", "weekly", "daily", "yearly"])
+                r_interval = st.number_input("Every N periods", min_value=1, value=1, step=1)
+                r_start = st.date_input("First due date", value=date.today(), key="r_start")
+            r_desc = st.text_input("Description", key="r_desc")
+            submitted = st.form_submit_button("Save Recurring Expense")
+            if submitted:
+                payload = {
+                    "user_ID": user_id,
+                    "category_ID": int(r_cat),
+                    "payment_ID": int(r_pm),
+                    "amount": float(r_amount),
+                    "description": r_desc,
+                    "frequency": r_freq,
+                    "interval": int(r_interval),
+                    "start_date": r_start.isoformat(),
+                }
+                res = try_post(f"{API_URL}/recurring/add", payload, token=st.session_state["token"])
+                if not isinstance(res, dict) and res.status_code in (200, 201):
+                    st.success("✅ Recurring expense saved!")
+                    rerun_panel()
+                else:
+                    st.error(f"Failed to save recurring expense. {res.text if not isinstance(res, dict) else res['details']}")
+
+        st.markdown("----")
+        st.subheader("Your recurring expenses")
+        rec_res = try_get(f"{API_URL}/recurring/{user_id}", token=st.session_state["token"])
+        if not isinstance(rec_res, dict) and rec_res.status_code == 200 and rec_res.json():
+            rdf = pd.DataFrame(rec_res.json())
+            rdf["category_name"] = rdf["category_ID"].map(cat_options)
+            rdf["next_due_at"] = pd.to_datetime(rdf["next_due_at"]).dt.strftime("%Y-%m-%d")
+            st.dataframe(rdf[["recurring_ID","description","amount","category_name","frequency","interval","next_due_at","active"]], use_container_width=True)
+            sel_rid = st.selectbox("Select recurring_ID to delete", rdf["recurring_ID"])
+            if st.button("Delete Recurring Expense"):
+                r = try_delete(f"{API_URL}/recurring/{int(sel_rid)}", token=st.session_state["token"])
+                if not isinstance(r, dict) and r.status_code == 200:
+                    st.success("🗑️ Recurring expense deleted!")
+                    rerun_panel()
+        else:
+            st.info("No recurring expenses yet.")
+
+def debug_panel():
+    """Render times of the last full run; fragment reruns show theirs inline."""
+    if not st.session_state.get("debug_timings"):
+        return
+    timings = st.session_state.get("render_ms", {})
+    timings["page"] = (time.perf_counter() - PAGE_START) * 1000
+    with st.sidebar.expander("🐞 Render times", expanded=True):
+        for panel, ms in timings.items():
+            st.text(f"{panel:<10} {ms:7.0f} ms")
+        st.text(f"{'circuit':<10} {backend()[1].state:>10}")
+        fetched = _fetch_summary("page")
+        if fetched:
+            st.caption(f"page: {fetched}")
+
+# -------------------------
+# Dashboard
+# -------------------------
+def dashboard_page():
+    user_id = st.session_state.get("user_id")
+    if not user_id:
+        st.warning("User ID not found in session. Please log in again.")
+        return
+
+    st.sidebar.title(f"👋 {st.session_state['username']}")
+    if st.sidebar.button("🚪 Logout"):
+        clear_session()
+        st.rerun()
+
+    # Delete account
+    with st.sidebar.expander("⚠️ Danger zone"):
+        st.markdown("### Delete Account")
+        st.warning("This will permanently delete your account and all related data!")
+        confirm = st.text_input("Type DELETE to confirm account deletion", key="delete_confirm")
+        if st.button("🗑️ Delete my account", key="delete_btn"):
+            if confirm == "DELETE":
+                res = try_delete(f"{API_URL}/users/{user_id}", token=st.session_state["token"])
+                if not isinstance(res, dict) and res.status_code == 200:
+                    st.success("✅ Account deleted successfully. Logging out...")
+                    clear_session()
+                    st.rerun()
+                else:
+                    st.error(f"❌ Failed to delete account: {res.text if not isinstance(res, dict) else res['details']}")
+            else:
+                st.warning("Please type DELETE in the box above to confirm.")
+    st.sidebar.toggle("🐞 Debug timings", key="debug_timings")
+
+    # everything the panels below GET on a full run, as one concurrent wave;
+    # categories & payment methods are reference data: fetched once per login
+    reference = {"categories": f"{API_URL}/categories", "payment_methods": f"{API_URL}/payment-methods"}
+    prefetch(
+        [
+            *(url for key, url in reference.items() if not st.session_state[key]),
+            *_expense_urls(user_id).values(),
+            f"{API_URL}/expenses/{user_id}/archive",
+            _sync_url(user_id),
+            *_report_urls(user_id).values(),
+            f"{API_URL}/recurring/{user_id}",
+        ],
+        token=st.session_state["token"],
+    )
+    if not st.session_state["categories"]:
+        cat_res = try_get(reference["categories"], token=st.session_state["token"])
+        if not isinstance(cat_res, dict) and cat_res.status_code == 200:
+            st.session_state["categories"] = cat_res.json()
+    if not st.session_state["payment_methods"]:
+        pm_res = try_get(reference["payment_methods"], token=st.session_state["token"])
+        if not isinstance(pm_res, dict) and pm_res.status_code == 200:
+            st.session_state["payment_methods"] = pm_res.json()
+
+    cat_options = {c["category_ID"]: c["category_name"] for c in st.session_state["categories"]}
+    pm_options = {p["payment_ID"]: p["payment_type"] for p in st.session_state["payment_methods"]}
+
+    tab1, tab2, tab3, tab4 = st.tabs(["➕ Add / Manage Expenses", "💰 Budgets", "📈 Reports", "🔁 Recurring"])
+
+    with tab1:
+        expenses_panel(user_id, cat_options, pm_options)
+        st.markdown("----")
+        search_panel(user_id, cat_options)
+        st.markdown("----")
+        archive_panel(user_id, cat_options)
+    with tab2:
+        budgets_panel(user_id, cat_options)
+    with tab3:
+        reports_panel(user_id)
+    with tab4:
+        recurring_panel(user_id, cat_options, pm_options)
+
+    debug_panel()
+
+
+# -------------------------
+# Run app
+# -------------------------
+if st.session_state["token"]:
+    with latency_budget(PAGE_BUDGET):
+        dashboard_page()
+else:
+    login_signup_page()
\ No newline at end of file